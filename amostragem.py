@@ -0,0 +1,119 @@
+# amostragem.py
+"""
+Redução de séries longas antes de mandar o gráfico para o navegador.
+
+Com o histórico inteiro no modo Diário e uma linha por conta, o `px.line`
+serializa milhares de pontos por série no websocket do Streamlit e o
+navegador demora segundos para desenhar. Acima de um orçamento de pontos
+(`GRAFICO_MAX_PONTOS`, padrão 1500), as séries são reduzidas com LTTB
+(Largest-Triangle-Three-Buckets), que preserva picos e vales, e o gráfico
+passa a usar WebGL (`Scattergl`).
+
+O JSON das figuras usa o orjson quando ele está instalado.
+"""
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import plotly.io as pio
+
+    pio.json.config.default_engine = "orjson"
+except Exception:
+    # Sem orjson o plotly continua com o encoder padrão
+    pass
+
+# Acima deste total de pontos o gráfico é desenhado com WebGL
+LIMITE_WEBGL = 1000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, limite: int) -> np.ndarray:
+    """
+    Índices (crescentes) dos `limite` pontos escolhidos pelo LTTB. O primeiro
+    e o último ponto são sempre mantidos; séries menores que o limite voltam
+    inteiras.
+    """
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.nan_to_num(np.asarray(y, dtype="float64"))
+
+    # limite - 2 baldes entre o primeiro e o último ponto
+    bordas = np.linspace(1, n - 1, limite - 1).astype("int64")
+    escolhidos = np.empty(limite, dtype="int64")
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+
+    a = 0
+    for i in range(limite - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        # Média do próximo balde (o último balde usa o ponto final)
+        prox_inicio, prox_fim = (bordas[i + 1], bordas[i + 2]) if i + 2 < len(bordas) else (n - 1, n)
+        mx, my = x[prox_inicio:prox_fim].mean(), y[prox_inicio:prox_fim].mean()
+
+        area = np.abs(
+            (x[a] - mx) * (y[inicio:fim] - y[a])
+            - (x[a] - x[inicio:fim]) * (my - y[a])
+        )
+        a = inicio + int(np.argmax(area))
+        escolhidos[i + 1] = a
+    return escolhidos
+
+
+def reduzir_series(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    limite: int,
+    por: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Aplica o LTTB a cada série de `df` (uma por valor de `por`), dividindo o
+    orçamento de `limite` pontos entre as séries. `df` deve estar ordenado por `x`.
+    """
+    if len(df) <= limite:
+        return df
+    if por is None:
+        grupos = [np.arange(len(df))]
+    else:
+        codigos = pd.Categorical(df[por]).codes
+        grupos = [np.flatnonzero(codigos == c) for c in np.unique(codigos)]
+
+    por_serie = max(limite // len(grupos), 3)
+    if pd.api.types.is_datetime64_any_dtype(df[x]):
+        xs = df[x].to_numpy(dtype="datetime64[ns]").view("int64").astype("float64")
+    else:
+        xs = pd.to_numeric(df[x]).to_numpy(dtype="float64")
+    ys = df[y].to_numpy(dtype="float64", na_value=np.nan)
+
+    manter = np.concatenate([g[lttb(xs[g], ys[g], por_serie)] for g in grupos])
+    return df.iloc[np.sort(manter)]
+
+
+class MedidorFigura:
+    """
+    Cronometra a montagem de uma figura. O relatório é guardado junto com a
+    figura em cache, então `montagem_ms` é o tempo da montagem original; o
+    envio ao navegador é medido por `cronometrar_envio`, a cada exibição.
+    """
+
+    def __init__(self):
+        self._inicio = time.perf_counter()
+
+    def relatorio(self, pontos_originais: int, pontos: int) -> Dict[str, object]:
+        return {
+            "pontos_originais": pontos_originais,
+            "pontos": pontos,
+            "webgl": pontos > LIMITE_WEBGL,
+            "montagem_ms": (time.perf_counter() - self._inicio) * 1000,
+        }
+
+
+def cronometrar_envio(enviar: Callable[[], object]) -> float:
+    """Milissegundos gastos em `enviar()` (serialização e envio da figura pelo Streamlit)."""
+    inicio = time.perf_counter()
+    enviar()
+    return (time.perf_counter() - inicio) * 1000
@@ -1,17 +1,15 @@
-import os
 from fastapi import FastAPI, HTTPException, Query, Body
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
 
 from oauth import get_auth_url, exchange_code, renovar_access_token
 from sales import get_full_sales as get_sales
+from settings import get_settings
 
-# Carrega variáveis de ambiente
-load_dotenv()
-FRONTEND_URL = os.getenv("FRONTEND_URL")
-if not FRONTEND_URL:
-    raise RuntimeError("❌ FRONTEND_URL deve estar definido no .env")
+# Configuração do processo (o .env é lido uma única vez)
+settings = get_settings()
+settings.exigir("frontend_url")
+FRONTEND_URL = settings.frontend_url
 
 app = FastAPI()
 
@@ -10,16 +10,15 @@ import logging
 logging.getLogger("streamlit").setLevel(logging.ERROR)
 
 
-from dotenv import load_dotenv
+from settings import get_settings
 import locale
 
-# 1) Carrega .env antes de tudo
-load_dotenv()
-COOKIE_SECRET = os.getenv("COOKIE_SECRET")
-BACKEND_URL    = os.getenv("BACKEND_URL")
-FRONTEND_URL   = os.getenv("FRONTEND_URL")
-DB_URL         = os.getenv("DB_URL")
-ML_CLIENT_ID   = os.getenv("ML_CLIENT_ID")
+# 1) Carrega .env antes de tudo (uma única vez por processo)
+settings = get_settings()
+COOKIE_SECRET = settings.cookie_secret
+BACKEND_URL    = settings.backend_url
+FRONTEND_URL   = settings.frontend_url
+ML_CLIENT_ID   = settings.ml_client_id
 
 # 2) Agora sim importe o Streamlit e configure a página _antes_ de qualquer outra chamada st.*
 import streamlit as st
@@ -33,20 +32,39 @@ st.set_page_config(
 # 3) Depois de set_page_config, importe tudo o mais que precisar
 from sales import sync_all_accounts, get_full_sales, revisar_banco_de_dados, get_incremental_sales, traduzir_status
 from streamlit_cookies_manager import EncryptedCookieManager
+import numpy as np
 import pandas as pd
-import plotly.express as px
+
+# As páginas recebem visões sem cópia do snapshot de vendas (snapshot.py) e
+# podem criar colunas nelas: o Copy-on-Write impede que isso altere o
+# snapshot compartilhado. É o padrão no pandas 3; no 2.x é ligado aqui, só
+# no processo do Streamlit.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 import requests
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from streamlit_option_menu import option_menu
-from typing import Optional
-from wordcloud import WordCloud
-import altair as alt
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from textblob import TextBlob
+from typing import Callable, Dict, Optional, Tuple
+from dataclasses import dataclass
 import io
 from datetime import datetime, timedelta
-from utils import engine, DATA_INICIO, buscar_ml_fee
+from db import get_engine
+from utils import DATA_INICIO, buscar_ml_fee
+from schema import assinatura_frame, mapear_categorias
+from amostragem import LIMITE_WEBGL, MedidorFigura, cronometrar_envio, reduzir_series
+from periodos import (
+    agregar_por_periodo, data_do_dia, dia_int, entre_dias, formatar_dias, matriz_dia_hora, media_acumulada_por_hora,
+)
+from snapshot import obter_snapshot, estado_snapshot
+from indice import IndiceFiltros
+from titulos import faturamento_por_comprimento, faturamento_por_palavra, frequencia_palavras
+from nuvem import gerador_nuvens
+from familias import faturamento_por_familia, familias_por_titulo
+from catalogo import sincronizar_catalogo
+from cadastro_sku import alteracoes, importar_planilha, ler_planilha, salvar_skus
+from loaders import carregar_anuncios_sem_venda, carregar_nicknames, carregar_resumo_skus
+from prewarm import iniciar_aquecimento
+from versions import incrementar_versao, registro_versoes
 import time
 
 
@@ -69,8 +87,9 @@ if not COOKIE_SECRET:
     st.error("⚠️ Defina COOKIE_SECRET no seu .env")
     st.stop()
 
-if not all([BACKEND_URL, FRONTEND_URL, DB_URL, ML_CLIENT_ID]):
-    st.error("❌ Defina BACKEND_URL, FRONTEND_URL, DB_URL e ML_CLIENT_ID em seu .env")
+faltando = settings.faltando("backend_url", "frontend_url", "db_url", "ml_client_id")
+if faltando:
+    st.error(f"❌ Defina {', '.join(faltando)} em seu .env")
     st.stop()
 
 # 6) Gerenciador de cookies e autenticação
@@ -139,7 +158,8 @@ def ml_callback():
     if resp.ok:
         data = resp.json()                   # {"user_id": "...", ...}
         salvar_tokens_no_banco(data)
-        st.cache_data.clear()             # limpa cache para puxar vendas novas
+        registro_versoes().recarregar()   # puxa as versões novas sem esperar o NOTIFY
+        obter_snapshot(aguardar=True)
         st.experimental_set_query_params(account=data["user_id"])
         st.session_state["conta"] = data["user_id"]
         st.success("✅ Conta ML autenticada com sucesso!")
@@ -150,7 +170,7 @@ def ml_callback():
 # ----------------- Salvando Tokens -----------------
 def salvar_tokens_no_banco(data: dict):
     try:
-        with engine.connect() as conn:
+        with get_engine().connect() as conn:
             query = text("""
                 INSERT INTO user_tokens (ml_user_id, access_token, refresh_token, expires_at)
                 VALUES (:user_id, :access_token, :refresh_token, NOW() + interval '6 hours')
@@ -168,85 +188,13 @@ def salvar_tokens_no_banco(data: dict):
         st.error(f"❌ Erro ao salvar tokens no banco: {e}")
 
 # ----------------- Carregamento de Vendas -----------------
-@st.cache_data(ttl=300)
 def carregar_vendas(conta_id: Optional[str] = None) -> pd.DataFrame:
-    if conta_id:
-        sql = text("""
-            SELECT s.order_id,
-                   s.date_adjusted,
-                   s.item_id,
-                   s.item_title,
-                   s.status,
-                   s.quantity,
-                   s.unit_price,
-                   s.total_amount,
-                   s.ml_user_id,
-                   s.buyer_nickname,
-                   s.seller_sku,
-                   s.custo_unitario,
-                   s.quantity_sku,
-                   s.ml_fee,
-                   s.level1,
-                   s.level2,
-                   s.ads,
-                   s.payment_id,
-                   s.shipment_status,
-                   s.shipment_substatus,
-                   s.shipment_last_updated,
-                   s.shipment_first_printed,
-                   s.shipment_mode,
-                   s.shipment_logistic_type,
-                   s.shipment_list_cost,
-                   s.shipment_delivery_type,
-                   s.shipment_delivery_limit,
-                   s.shipment_delivery_final,
-                   s.shipment_receiver_name,
-                   s.shipment_delivery_sla,
-                   u.nickname
-              FROM sales s
-              LEFT JOIN user_tokens u ON s.ml_user_id = u.ml_user_id
-             WHERE s.ml_user_id = :uid
-        """)
-        df = pd.read_sql(sql, engine, params={"uid": conta_id})
-    else:
-        sql = text("""
-            SELECT s.order_id,
-                   s.date_adjusted,
-                   s.item_id,
-                   s.item_title,
-                   s.status,
-                   s.quantity,
-                   s.unit_price,
-                   s.total_amount,
-                   s.ml_user_id,
-                   s.buyer_nickname,
-                   s.seller_sku,
-                   s.custo_unitario,
-                   s.quantity_sku,
-                   s.ml_fee,
-                   s.level1,
-                   s.level2,
-                   s.ads,
-                   s.payment_id,
-                   s.shipment_status,
-                   s.shipment_substatus,
-                   s.shipment_last_updated,
-                   s.shipment_first_printed,
-                   s.shipment_mode,
-                   s.shipment_logistic_type,
-                   s.shipment_list_cost,
-                   s.shipment_delivery_type,
-                   s.shipment_delivery_limit,
-                   s.shipment_delivery_final,
-                   s.shipment_receiver_name,
-                   s.shipment_delivery_sla,
-                   u.nickname
-              FROM sales s
-              LEFT JOIN user_tokens u ON s.ml_user_id = u.ml_user_id
-        """)
-        df = pd.read_sql(sql, engine)
-
-    return df
+    """Visão do snapshot de vendas compartilhado pelo processo (sem cópia)."""
+    return obter_snapshot().vendas(conta_id)
+
+def carregar_indice() -> IndiceFiltros:
+    """Índice de filtros do snapshot atual (montado uma vez por snapshot)."""
+    return obter_snapshot().indice()
 
 # ----------------- Componentes de Interface -----------------
 def render_add_account_button():
@@ -276,42 +224,13 @@ from streamlit_option_menu import option_menu
 def render_sidebar():
     with st.sidebar:
         # Menu de navegação sem título
+        nomes = list(PAGINAS)
         selected = option_menu(
             menu_title=None,
-            options=[
-                "Dashboard",
-                "Contas Cadastradas",
-                "Relatórios",
-                "Expedição",
-                "Gestão de SKU",
-                "Gestão de Despesas",
-                "Painel de Metas",
-                "Gestão de Anúncios",
-                "Configurações"  # 🔧 Nova tela adicionada
-            ],
-            icons=[
-                "house",
-                "person-up",
-                "file-earmark-text",
-                "collection-fill",
-                "box-seam",
-                "currency-dollar",
-                "bar-chart-line",
-                "bullseye",
-                "gear"  # ícone para Configurações
-            ],
+            options=nomes,
+            icons=[PAGINAS[n].icone for n in nomes],
             menu_icon="list",
-            default_index=[
-                "Dashboard",
-                "Contas Cadastradas",
-                "Relatórios",
-                "Expedição",
-                "Gestão de SKU",
-                "Gestão de Despesas",
-                "Painel de Metas",
-                "Gestão de Anúncios",
-                "Configurações"
-            ].index(st.session_state.get("page", "Dashboard")),
+            default_index=nomes.index(st.session_state.get("page", "Dashboard")),
             orientation="vertical",
             styles={
                 "container": {
@@ -339,8 +258,23 @@ def render_sidebar():
             },
         )
 
+        render_idade_dados()
+
     st.session_state["page"] = selected
     return selected
+
+def render_idade_dados():
+    """Mostra há quanto tempo o snapshot de vendas servido foi atualizado."""
+    estado = estado_snapshot()
+    if estado["idade"] is None:
+        return
+    idade = int(estado["idade"])
+    texto = f"🕒 Dados de {idade}s atrás" if idade < 120 else f"🕒 Dados de {idade // 60} min atrás"
+    if estado["atualizando"]:
+        texto += " · 🔄 atualizando..."
+    st.caption(texto)
+    if estado["erro"]:
+        st.caption(f"⚠️ Última atualização falhou: {estado['erro']}")
 # ----------------- Telas -----------------
 import io  # no topo do seu script
 
@@ -348,14 +282,15 @@ def format_currency(value):
     """Formata valores para o padrão brasileiro."""
     return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
-def mostrar_dashboard():
+def mostrar_dashboard(indice: IndiceFiltros):
     import time
 
     # --- sincroniza as vendas automaticamente apenas 1x ao carregar ---
     if "vendas_sincronizadas" not in st.session_state:
         with st.spinner("🔄 Sincronizando vendas..."):
             count = sync_all_accounts()
-            st.cache_data.clear()
+            registro_versoes().recarregar()
+            obter_snapshot(aguardar=True)
         placeholder = st.empty()
         with placeholder:
             st.success(f"{count} vendas novas sincronizadas com sucesso!")
@@ -363,15 +298,15 @@ def mostrar_dashboard():
         placeholder.empty()
         st.session_state["vendas_sincronizadas"] = True
 
-    # --- carrega todos os dados ---
-    df_full = carregar_vendas(None)
-    if df_full.empty:
+        # --- recarrega o índice com as vendas recém-sincronizadas ---
+        indice = carregar_indice()
+
+    if not len(indice):
         st.warning("Nenhuma venda cadastrada.")
         return
         
-    # ✅ TRADUZ STATUS AQUI
+    # ✅ TRADUZ STATUS AQUI (no frame filtrado; o índice guarda o status original)
     from sales import traduzir_status
-    df_full["status"] = df_full["status"].map(traduzir_status)
 
     # --- CSS para compactar inputs e remover espaços ---
     st.markdown(
@@ -395,8 +330,7 @@ def mostrar_dashboard():
     )
 
     # --- Filtro de contas fixo com checkboxes lado a lado + botão selecionar todos ---
-    contas_df = pd.read_sql(text("SELECT nickname FROM user_tokens ORDER BY nickname"), engine)
-    contas_lst = contas_df["nickname"].astype(str).tolist()
+    contas_lst = carregar_nicknames(registro_versoes().chave())
     
     st.markdown("**🧾 Contas Mercado Livre:**")
 
@@ -417,9 +351,9 @@ def mostrar_dashboard():
         if colunas_contas[i % 8].checkbox(conta, key=key):
             selecionadas.append(conta)
     
-    # Aplica filtro
-    if selecionadas:
-        df_full = df_full[df_full["nickname"].isin(selecionadas)]
+    # Filtros resolvidos pelo índice (posições pré-calculadas + fatia por data)
+    filtros = {"nickname": selecionadas or None}
+    posicoes_contas = indice.selecionar(**filtros)
 
 
     # --- Linha única de filtros: Rápido | De | Até | Status ---
@@ -442,8 +376,7 @@ def mostrar_dashboard():
         )
 
     hoje = pd.Timestamp.now().date()
-    data_min = df_full["date_adjusted"].dt.date.min()
-    data_max = df_full["date_adjusted"].dt.date.max()
+    data_min, data_max = indice.datas(posicoes_contas)
     
     if filtro_rapido == "Hoje":
         de = ate = min(hoje, data_max)
@@ -469,24 +402,23 @@ def mostrar_dashboard():
         ate = st.date_input("Até", value=ate, min_value=data_min, max_value=data_max, disabled=not custom, key="ate_q")
     
     with col4:
-        status_options = df_full["status"].dropna().unique().tolist()
+        # status original -> traduzido, só para os status presentes nas contas escolhidas
+        status_traducao = {s: traduzir_status(s) for s in indice.valores("status", posicoes_contas)}
+        status_options = list(dict.fromkeys(status_traducao.values()))
         status_opcoes = ["Todos"] + status_options
         index_padrao = status_opcoes.index("Pago") if "Pago" in status_opcoes else 0
         status_selecionado = st.selectbox("Status", status_opcoes, index=index_padrao)
     
     # Aplica filtros finais
-    df = df_full[
-        (df_full["date_adjusted"].dt.date >= de) &
-        (df_full["date_adjusted"].dt.date <= ate)
-    ]
     if status_selecionado != "Todos":
-        df = df[df["status"] == status_selecionado]
+        filtros["status"] = [s for s, t in status_traducao.items() if t == status_selecionado]
+    posicoes = indice.selecionar(de, ate, **filtros)
 
     
     # --- Filtros Avançados com checkbox dentro de Expander ---
     with st.expander("🔍 Filtros Avançados", expanded=False):
         # Atualiza as opções com base nos dados filtrados até aqui
-        level1_opcoes = sorted(df["level1"].dropna().unique().tolist())
+        level1_opcoes = sorted(indice.valores("level1", posicoes))
         st.markdown("**📂 Hierarquia 1**")
         col_l1 = st.columns(4)
         level1_selecionados = []
@@ -494,10 +426,11 @@ def mostrar_dashboard():
             if col_l1[i % 4].checkbox(op, key=f"level1_{op}"):
                 level1_selecionados.append(op)
         if level1_selecionados:
-            df = df[df["level1"].isin(level1_selecionados)]
+            filtros["level1"] = level1_selecionados
+            posicoes = indice.selecionar(de, ate, **filtros)
     
         # Atualiza Level2 após Level1 aplicado
-        level2_opcoes = sorted(df["level2"].dropna().unique().tolist())
+        level2_opcoes = sorted(indice.valores("level2", posicoes))
         st.markdown("**📁 Hierarquia 2**")
         col_l2 = st.columns(4)
         level2_selecionados = []
@@ -505,7 +438,11 @@ def mostrar_dashboard():
             if col_l2[i % 4].checkbox(op, key=f"level2_{op}"):
                 level2_selecionados.append(op)
         if level2_selecionados:
-            df = df[df["level2"].isin(level2_selecionados)]
+            filtros["level2"] = level2_selecionados
+            posicoes = indice.selecionar(de, ate, **filtros)
+
+    df = indice.linhas(posicoes)
+    df["status"] = mapear_categorias(df["status"], traduzir_status)
     
     # Verifica se há dados após os filtros
     if df.empty:
@@ -583,15 +520,143 @@ def mostrar_dashboard():
     kpi_card(row2[3], "🎯 Tkt Médio p/ Unid.", format_currency(ticket_unidade))
     kpi_card(row2[4], "❌ SKU Incompleto", str(sem_sku))
     
+    # Cada seção é um fragmento: mexer nos controles de uma delas reexecuta só ela
+    secao_total_por_periodo(df, de, ate)
+    secao_vendas_por_dia_semana(df)
+    secao_curva_horaria(df)
+
+
+# =================== Seções do dashboard ===================
+# As figuras ficam em st.cache_data com chave na assinatura do frame filtrado
+# (o frame entra como `_df` para o Streamlit não hashear de novo).
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _fig_total_por_periodo(
+    _df: pd.DataFrame, assinatura: str, granularidade: str, periodo_label: str, por_conta: bool, max_pontos: int
+):
     import plotly.express as px
 
+    medidor = MedidorFigura()
+
+    if por_conta:
+        vendas_por_data = agregar_por_periodo(
+            _df, granularidade, {"Valor Total": "total_amount"}, por="nickname"
+        )
+        color_dim = "nickname"
+    
+        total_por_conta = (
+            _df.groupby("nickname", observed=True)["total_amount"]
+            .sum()
+            .reset_index(name="total")
+            .sort_values("total", ascending=False)
+        )
+    
+        color_palette = px.colors.sequential.Agsunset
+        nicknames = total_por_conta["nickname"].tolist()
+        color_map = {nick: color_palette[i % len(color_palette)] for i, nick in enumerate(nicknames)}
+    else:
+        vendas_por_data = agregar_por_periodo(
+            _df, granularidade, {"Valor Total": "total_amount"}
+        )
+        color_dim = None
+        color_map = None  # Não será usado
+
+    # Séries longas: LTTB até o orçamento de pontos e WebGL acima de LIMITE_WEBGL
+    pontos_originais = len(vendas_por_data)
+    vendas_por_data = reduzir_series(vendas_por_data, "periodo", "Valor Total", max_pontos, por=color_dim)
+    webgl = len(vendas_por_data) > LIMITE_WEBGL
+
+    fig = px.line(
+        vendas_por_data,
+        x="periodo",
+        y="Valor Total",
+        color=color_dim,
+        labels={"periodo": periodo_label, "Valor Total": "Valor Total", "nickname": "Conta"},
+        color_discrete_map=color_map,
+        render_mode="webgl" if webgl else "svg",
+    )
+    fig.update_traces(mode="lines" if webgl else "lines+markers", marker=dict(size=5))
+    fig.update_layout(
+        margin=dict(t=20, b=20, l=40, r=10),
+        showlegend=True
+    )
+    return fig, color_map, medidor.relatorio(pontos_originais, len(vendas_por_data))
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _fig_proporcao_contas(_df: pd.DataFrame, assinatura: str, metrica_barra: str, color_map: Dict[str, str]):
+    import plotly.express as px
+
+    if metrica_barra == "Faturamento":
+        base = (
+            _df.groupby("nickname", observed=True)["total_amount"]
+            .sum()
+            .reset_index(name="valor")
+        )
+    elif metrica_barra == "Qtd. Vendas":
+        base = (
+            _df.groupby("nickname", observed=True)
+            .size()
+            .reset_index(name="valor")
+        )
+    else:  # Qtd. Unidades
+        base = (
+            (_df["quantity_sku"] * _df["quantity"])
+            .groupby(_df["nickname"], observed=True)
+            .sum()
+            .reset_index(name="valor")
+        )
+
+    base = base.sort_values("valor", ascending=False)
+    base["percentual"] = base["valor"] / base["valor"].sum()
+
+    # 🏷️ Texto das barras
+    def formatar_valor(v):
+        if metrica_barra == "Faturamento":
+            return f"R$ {v:,.0f}".replace(",", "v").replace(".", ",").replace("v", ".")
+        elif metrica_barra == "Qtd. Vendas":
+            return f"{int(v)} vendas"
+        else:
+            return f"{int(v)} unid."
+
+    base["texto"] = base.apply(
+        lambda row: f"{row['percentual']:.0%} ({formatar_valor(row['valor'])})", axis=1
+    )
+    base["grupo"] = "Contas"
+
+    fig_bar = px.bar(
+        base,
+        x="grupo",
+        y="percentual",
+        color="nickname",
+        text="texto",
+        color_discrete_map=color_map,
+    )
+
+    fig_bar.update_layout(
+        yaxis=dict(title=None, tickformat=".0%", range=[0, 1]),
+        xaxis=dict(title=None),
+        showlegend=False,
+        margin=dict(t=20, b=20, l=10, r=10),
+        height=400
+    )
+
+    fig_bar.update_traces(
+        textposition="inside",
+        insidetextanchor="middle",
+        textfont=dict(color="white", size=12)
+    )
+    return fig_bar
+
+
+@st.fragment
+def secao_total_por_periodo(df: pd.DataFrame, de, ate):
     # =================== Gráfico de Linha + Barra de Proporção ===================
     st.markdown("### 💵 Total Vendido por Período")
     
     # 🔘 Seletor de período + agrupamento + métrica lado a lado
     colsel1, colsel2, colsel3 = st.columns([1.2, 1.2, 1.6])
 
-    
     with colsel1:
         st.markdown("**📆 Período**")
         tipo_visualizacao = st.radio(
@@ -619,63 +684,25 @@ def mostrar_dashboard():
             key="metrica_barra"
         )
 
-
-    
-    df_plot = df.copy()
-    
-    # Define bucket de datas
+    # Define bucket de datas (chaves int64 vetorizadas, ver periodos.py)
     if de == ate:
-        df_plot["date_bucket"] = df_plot["date_adjusted"].dt.floor("h")
-        periodo_label = "Hora"
+        granularidade, periodo_label = "hora", "Hora"
     else:
-        if tipo_visualizacao == "Diário":
-            df_plot["date_bucket"] = df_plot["date_adjusted"].dt.date
-            periodo_label = "Dia"
-        elif tipo_visualizacao == "Semanal":
-            df_plot["date_bucket"] = df_plot["date_adjusted"].dt.to_period("W").apply(lambda p: p.start_time.date())
-            periodo_label = "Semana"
-        elif tipo_visualizacao == "Quinzenal":
-            df_plot["quinzena"] = df_plot["date_adjusted"].apply(
-                lambda d: f"{d.year}-Q{(d.month-1)*2//30 + 1}-{1 if d.day <= 15 else 2}"
-            )
-            df_plot["date_bucket"] = df_plot["quinzena"]
-            periodo_label = "Quinzena"
-        else:
-            df_plot["date_bucket"] = df_plot["date_adjusted"].dt.to_period("M").astype(str)
-            periodo_label = "Mês"
-    
-    # Agrupamento e definição de cores
-    if modo_agregacao == "Por Conta":
-        vendas_por_data = (
-            df_plot.groupby(["date_bucket", "nickname"])["total_amount"]
-            .sum()
-            .reset_index(name="Valor Total")
-        )
-        color_dim = "nickname"
-    
-        total_por_conta = (
-            df_plot.groupby("nickname")["total_amount"]
-            .sum()
-            .reset_index(name="total")
-            .sort_values("total", ascending=False)
-        )
-    
-        color_palette = px.colors.sequential.Agsunset
-        nicknames = total_por_conta["nickname"].tolist()
-        color_map = {nick: color_palette[i % len(color_palette)] for i, nick in enumerate(nicknames)}
-    
-    else:
-        vendas_por_data = (
-            df_plot.groupby("date_bucket")["total_amount"]
-            .sum()
-            .reset_index(name="Valor Total")
-        )
-        color_dim = None
-        color_map = None  # Não será usado
-        total_por_conta = None
-    
+        granularidade, periodo_label = {
+            "Diário":    ("dia", "Dia"),
+            "Semanal":   ("semana", "Semana"),
+            "Quinzenal": ("quinzena", "Quinzena"),
+            "Mensal":    ("mes", "Mês"),
+        }[tipo_visualizacao]
+
+    por_conta = modo_agregacao == "Por Conta"
+    assinatura = assinatura_frame(df, ["date_adjusted", "nickname", "total_amount", "quantity", "quantity_sku"])
+    fig, color_map, medicao = _fig_total_por_periodo(
+        df, assinatura, granularidade, periodo_label, por_conta, settings.grafico_max_pontos
+    )
+
     # 🔢 Gráfico(s)
-    if modo_agregacao == "Por Conta":
+    if por_conta:
         col1, col2 = st.columns([4, 1])
     else:
         col1 = st.container()
@@ -683,113 +710,37 @@ def mostrar_dashboard():
     
     # 📈 Gráfico de Linha
     with col1:
-        fig = px.line(
-            vendas_por_data,
-            x="date_bucket",
-            y="Valor Total",
-            color=color_dim,
-            labels={"date_bucket": periodo_label, "Valor Total": "Valor Total", "nickname": "Conta"},
-            color_discrete_map=color_map,
-        )
-        fig.update_traces(mode="lines+markers", marker=dict(size=5))
-        fig.update_layout(
-            margin=dict(t=20, b=20, l=40, r=10),
-            showlegend=True
+        envio_ms = cronometrar_envio(lambda: st.plotly_chart(fig, use_container_width=True))
+        st.caption(
+            f"{medicao['pontos']:,} de {medicao['pontos_originais']:,} pontos"
+            f" · montagem {medicao['montagem_ms']:.0f} ms (quando a figura entrou no cache)"
+            f" · envio {envio_ms:.0f} ms"
+            + (" · WebGL" if medicao["webgl"] else "")
         )
-        st.plotly_chart(fig, use_container_width=True)
     
     # 📊 Gráfico de barra proporcional (somente se Por Conta)
-    if modo_agregacao == "Por Conta" and not total_por_conta.empty:
-
-    
-        if metrica_barra == "Faturamento":
-            base = (
-                df_plot.groupby("nickname")["total_amount"]
-                .sum()
-                .reset_index(name="valor")
-            )
-        elif metrica_barra == "Qtd. Vendas":
-            base = (
-                df_plot.groupby("nickname")
-                .size()
-                .reset_index(name="valor")
-            )
-        else:  # Qtd. Unidades
-            base = (
-                df_plot.groupby("nickname")
-                .apply(lambda x: (x["quantity_sku"] * x["quantity"]).sum())
-                .reset_index(name="valor")
-            )
-    
-        base = base.sort_values("valor", ascending=False)
-        base["percentual"] = base["valor"] / base["valor"].sum()
-    
-        # 🏷️ Texto das barras
-        def formatar_valor(v):
-            if metrica_barra == "Faturamento":
-                return f"R$ {v:,.0f}".replace(",", "v").replace(".", ",").replace("v", ".")
-            elif metrica_barra == "Qtd. Vendas":
-                return f"{int(v)} vendas"
-            else:
-                return f"{int(v)} unid."
-    
-        base["texto"] = base.apply(
-            lambda row: f"{row['percentual']:.0%} ({formatar_valor(row['valor'])})", axis=1
-        )
-        base["grupo"] = "Contas"
-    
-        fig_bar = px.bar(
-            base,
-            x="grupo",
-            y="percentual",
-            color="nickname",
-            text="texto",
-            color_discrete_map=color_map,
-        )
-    
-        fig_bar.update_layout(
-            yaxis=dict(title=None, tickformat=".0%", range=[0, 1]),
-            xaxis=dict(title=None),
-            showlegend=False,
-            margin=dict(t=20, b=20, l=10, r=10),
-            height=400
-        )
-    
-        fig_bar.update_traces(
-            textposition="inside",
-            insidetextanchor="middle",
-            textfont=dict(color="white", size=12)
-        )
-    
+    if por_conta and color_map:
+        fig_bar = _fig_proporcao_contas(df, assinatura, metrica_barra, color_map)
         with col2:
             st.plotly_chart(fig_bar, use_container_width=True)
 
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def _fig_vendas_por_dia_semana(_df: pd.DataFrame, assinatura: str):
+    import plotly.express as px
 
-
-    # === Gráfico de barras: Média por dia da semana ===
-    st.markdown('<div class="section-title">📅 Vendas por Dia da Semana</div>', unsafe_allow_html=True)
-    
-    # Nome dos dias na ordem certa
+    # Nome dos dias na ordem certa (sale_weekday: 0 = segunda ... 6 = domingo)
     dias = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
     
-    # Extrai dia da semana em português
-    df["dia_semana"] = df["date_adjusted"].dt.day_name().map({
-        "Monday": "Segunda", "Tuesday": "Terça", "Wednesday": "Quarta",
-        "Thursday": "Quinta", "Friday": "Sexta", "Saturday": "Sábado", "Sunday": "Domingo"
-    })
-    
-    # Extrai a data (sem hora)
-    df["data"] = df["date_adjusted"].dt.date
-    
-    # Soma o total vendido por dia (independente da hora)
-    total_por_data = df.groupby(["dia_semana", "data"])["total_amount"].sum().reset_index()
+    # Soma o total vendido por dia (sale_day, independente da hora)
+    total_por_data = _df.groupby(["sale_weekday", "sale_day"])["total_amount"].sum().reset_index()
     
     # Agora calcula a média por dia da semana
-    media_por_dia = total_por_data.groupby("dia_semana")["total_amount"].mean().reindex(dias).reset_index()
+    media_por_dia = total_por_data.groupby("sale_weekday")["total_amount"].mean().reindex(range(7))
+    media_por_dia = pd.DataFrame({"dia_semana": dias, "total_amount": media_por_dia.to_numpy()})
     
     # Plota o gráfico de barras
-    fig_bar = px.bar(
+    return px.bar(
         media_por_dia,
         x="dia_semana",
         y="total_amount",
@@ -797,71 +748,31 @@ def mostrar_dashboard():
         labels={"dia_semana": "Dia da Semana", "total_amount": "Média Vendida (R$)"},
         color_discrete_sequence=["#27ae60"]
     )
-    
-    st.plotly_chart(fig_bar, use_container_width=True, theme="streamlit")
 
 
+@st.fragment
+def secao_vendas_por_dia_semana(df: pd.DataFrame):
+    # === Gráfico de barras: Média por dia da semana ===
+    st.markdown('<div class="section-title">📅 Vendas por Dia da Semana</div>', unsafe_allow_html=True)
+    assinatura = assinatura_frame(df, ["sale_weekday", "sale_day", "total_amount"])
+    st.plotly_chart(_fig_vendas_por_dia_semana(df, assinatura), use_container_width=True, theme="streamlit")
 
 
-    # =================== Gráfico de Linha - Faturamento Acumulado por Hora ===================
-    st.markdown("### ⏰ Faturamento Acumulado por Hora do Dia (Média)")
-    
-    # Extrai hora e data
-    df["hora"] = df["date_adjusted"].dt.hour
-    df["data"] = df["date_adjusted"].dt.date
-    
-    # Soma o total vendido por hora e por dia
-    vendas_por_dia_e_hora = df.groupby(["data", "hora"])["total_amount"].sum().reset_index()
-    
-    # Garante que todas as horas estejam presentes para todos os dias
-    todos_dias = vendas_por_dia_e_hora["data"].unique()
-    todas_horas = list(range(0, 24))
-    malha_completa = pd.MultiIndex.from_product([todos_dias, todas_horas], names=["data", "hora"])
-    vendas_completa = vendas_por_dia_e_hora.set_index(["data", "hora"]).reindex(malha_completa, fill_value=0).reset_index()
-    
-    # Acumula por hora dentro de cada dia
-    vendas_completa["acumulado_dia"] = vendas_completa.groupby("data")["total_amount"].cumsum()
-    
-    # Agora calcula a média acumulada por hora (entre os dias)
-    media_acumulada_por_hora = (
-        vendas_completa
-        .groupby("hora")["acumulado_dia"]
-        .mean()
-        .reset_index(name="Valor Médio Acumulado")
-    )
-    
-    # Verifica se é filtro de hoje
-    hoje = pd.Timestamp.now(tz="America/Sao_Paulo").date()
-    filtro_hoje = (de == ate) and (de == hoje)
-    
-    if filtro_hoje:
-        hora_atual = pd.Timestamp.now(tz="America/Sao_Paulo").hour
-        df_hoje = df[df["data"] == hoje]
-        vendas_hoje_por_hora = (
-            df_hoje.groupby("hora")["total_amount"].sum().reindex(range(24), fill_value=0)
-            .cumsum()
-            .reset_index(name="Valor Médio Acumulado")
-            .rename(columns={"index": "hora"})
-        )
-        # Traz o ponto até hora atual
-        ponto_extra = pd.DataFrame([{
-            "hora": hora_atual,
-            "Valor Médio Acumulado": vendas_hoje_por_hora.loc[hora_atual, "Valor Médio Acumulado"]
-        }])
-        media_acumulada_por_hora = pd.concat([media_acumulada_por_hora, ponto_extra]).groupby("hora").last().reset_index()
-    
-    else:
-        # Para histórico, adiciona o ponto final às 23h com média total diária
-        media_final = df.groupby("data")["total_amount"].sum().mean()
-        ponto_final = pd.DataFrame([{
-            "hora": 23,
-            "Valor Médio Acumulado": media_final
-        }])
-        media_acumulada_por_hora = pd.concat([media_acumulada_por_hora, ponto_final]).groupby("hora").last().reset_index()
+@st.cache_data(max_entries=32, show_spinner=False)
+def _fig_curva_horaria(_df: pd.DataFrame, assinatura: str):
+    import plotly.express as px
+
+    # Rollup denso (dias × 24 horas): acumula ao longo das horas e tira a média entre os dias.
+    # A hora 23 já é a média do total diário e, no filtro de hoje, a curva é a do próprio dia.
+    _, matriz_horas = matriz_dia_hora(_df["date_adjusted"], _df["total_amount"])
+    curva_por_hora = pd.DataFrame({
+        "hora": range(24),
+        "Valor Médio Acumulado": media_acumulada_por_hora(matriz_horas),
+    })
     
     # Plota o gráfico
     fig_hora = px.line(
-        media_acumulada_por_hora,
+        curva_por_hora,
         x="hora",
         y="Valor Médio Acumulado",
         title="⏰ Faturamento Acumulado por Hora (Média por Dia)",
@@ -873,8 +784,15 @@ def mostrar_dashboard():
         markers=True
     )
     fig_hora.update_layout(xaxis=dict(dtick=1))
-    
-    st.plotly_chart(fig_hora, use_container_width=True)
+    return fig_hora
+
+
+@st.fragment
+def secao_curva_horaria(df: pd.DataFrame):
+    # =================== Gráfico de Linha - Faturamento Acumulado por Hora ===================
+    st.markdown("### ⏰ Faturamento Acumulado por Hora do Dia (Média)")
+    assinatura = assinatura_frame(df, ["date_adjusted", "total_amount"])
+    st.plotly_chart(_fig_curva_horaria(df, assinatura), use_container_width=True)
 
 
 def mostrar_contas_cadastradas():
@@ -891,14 +809,14 @@ def mostrar_contas_cadastradas():
     st.header("🏷️ Contas Cadastradas")
     render_add_account_button()
 
-    df = pd.read_sql(text("SELECT ml_user_id, nickname, access_token, refresh_token FROM user_tokens ORDER BY nickname"), engine)
+    df = pd.read_sql(text("SELECT ml_user_id, nickname, access_token, refresh_token FROM user_tokens ORDER BY nickname"), get_engine())
 
     if df.empty:
         st.warning("Nenhuma conta cadastrada.")
         return
 
     # --- Botões globais ---
-    col_a, col_b = st.columns(2)
+    col_a, col_b, col_c = st.columns(3)
     
     with col_a:
         if st.button("🔄 Atualizar Vendas Recentes (Todas)", use_container_width=True):
@@ -937,7 +855,19 @@ def mostrar_contas_cadastradas():
 
 
                 st.success("✅ Todos os status foram padronizados com sucesso.")
-                    
+
+    with col_c:
+        if st.button("📚 Sincronizar Catálogo de Anúncios (Todas)", use_container_width=True):
+            with st.spinner("📚 Sincronizando catálogos..."):
+                for row in df.itertuples(index=False):
+                    try:
+                        resumo = sincronizar_catalogo(str(row.ml_user_id), row.access_token)
+                        st.success(
+                            f"✅ {row.nickname}: {resumo['anuncios']} anúncios "
+                            f"({resumo['alterados']} novos/alterados, {resumo['removidos']} fora do catálogo ativo)."
+                        )
+                    except Exception as e:
+                        st.error(f"❌ Erro ao sincronizar catálogo de {row.nickname}: {e}")
 
 
     # --- Seção por conta individual ---
@@ -974,8 +904,23 @@ def mostrar_contas_cadastradas():
                         atualizadas, _ = revisar_banco_de_dados(ml_user_id, access_token, return_changes=False)
                         st.info(f"♻️ {atualizadas} vendas com status alterados.")
 
+            # Catálogo de anúncios (somente da conta)
+            with col3:
+                if st.button("📚 Sincronizar Catálogo", key=f"catalogo_{ml_user_id}"):
+                    with st.spinner("📚 Sincronizando catálogo de anúncios..."):
+                        try:
+                            resumo = sincronizar_catalogo(ml_user_id, access_token, forcar=True)
+                            st.info(
+                                f"📚 {resumo['anuncios']} anúncios · {resumo['hidratados']} hidratados · "
+                                f"{resumo['chamadas']} chamadas à API."
+                            )
+                        except Exception as e:
+                            st.error(f"❌ Erro ao sincronizar catálogo: {e}")
+
+
+def mostrar_anuncios(df: pd.DataFrame):
+    import plotly.express as px
 
-def mostrar_anuncios():
     st.markdown(
         """
         <style>
@@ -988,7 +933,6 @@ def mostrar_anuncios():
     )
 
     st.header("🎯 Análise de Anúncios")
-    df = carregar_vendas()
 
     if df.empty:
         st.warning("Nenhum dado para exibir.")
@@ -1000,10 +944,7 @@ def mostrar_anuncios():
     data_ini = st.date_input("De:",  value=df['date_adjusted'].min().date())
     data_fim = st.date_input("Até:", value=df['date_adjusted'].max().date())
 
-    df_filt = df.loc[
-    (df['date_adjusted'].dt.date >= data_ini) &
-    (df['date_adjusted'].dt.date <= data_fim)
-    ]
+    df_filt = df.loc[entre_dias(df['sale_day'], data_ini, data_fim)]
 
     if df_filt.empty:
         st.warning("Sem registros para os filtros escolhidos.")
@@ -1014,11 +955,15 @@ def mostrar_anuncios():
 
     # 1️⃣ Nuvem de Palavras
     st.subheader("1️⃣ 🔍 Nuvem de Palavras dos Títulos")
-    text = " ".join(df_filt[title_col])
-    wc = WordCloud(width=600, height=300, background_color="white").generate(text)
+    # A imagem é gerada em segundo plano; o espaço é preenchido no fim da página
+    contas = tuple(sorted(df_filt['ml_user_id'].dropna().unique().tolist()))
+    chave_nuvem = (data_ini, data_fim, registro_versoes().chave(contas))
+    nuvem = gerador_nuvens().solicitar(chave_nuvem, lambda: frequencia_palavras(df_filt, title_col))
     c1, c2, c3 = st.columns([1, 2, 1])
     with c2:
-        st.image(wc.to_array(), use_column_width=True)
+        espaco_nuvem = st.empty()
+        espaco_nuvem.caption("Gerando nuvem de palavras...")
+        legenda_nuvem = st.empty()
 
     # 2️⃣ Top 10 Títulos por Faturamento
     st.subheader("2️⃣ 🌟 Top 10 Títulos por Faturamento")
@@ -1040,17 +985,9 @@ def mostrar_anuncios():
     )
     st.plotly_chart(fig_top10, use_container_width=True)
 
-    # 4️⃣ Faturamento por Palavra
+    # 3️⃣ Faturamento por Palavra
     st.subheader("3️⃣ 🧠 Palavras que mais faturam nos Títulos")
-    from collections import Counter
-    word_faturamento = Counter()
-    for _, row in df_filt.iterrows():
-        palavras = str(row[title_col]).lower().split()
-        for p in palavras:
-            word_faturamento[p] += row[faturamento_col]
-
-    df_words = pd.DataFrame(word_faturamento.items(), columns=['palavra', 'faturamento'])
-    df_words = df_words.sort_values(by='faturamento', ascending=False).head(15)
+    df_words = faturamento_por_palavra(df_filt, title_col, faturamento_col, top=15)
     fig_words = px.bar(
         df_words,
         x='palavra',
@@ -1061,16 +998,9 @@ def mostrar_anuncios():
     )
     st.plotly_chart(fig_words, use_container_width=True)
 
-    # 5️⃣ Faturamento por Comprimento de Título
+    # 4️⃣ Faturamento por Comprimento de Título
     st.subheader("4️⃣ 📏 Faturamento por Comprimento de Título (nº de palavras)")
-    df['title_len'] = df[title_col].str.split().apply(len)
-    df_len_fat = (
-        df
-        .groupby('title_len')[faturamento_col]
-        .sum()
-        .reset_index()
-        .sort_values('title_len')
-    )
+    df_len_fat = faturamento_por_comprimento(df_filt, title_col, faturamento_col)
     fig_len = px.bar(
         df_len_fat,
         x='title_len',
@@ -1081,27 +1011,35 @@ def mostrar_anuncios():
     )
     st.plotly_chart(fig_len, use_container_width=True)
 
-    # 6️⃣ Títulos com 0 vendas no período filtrado
+    # 5️⃣ Títulos com 0 vendas no período filtrado
     st.subheader("5️⃣ 🚨 Títulos sem Vendas no Período")
-    df_sem_venda = (
-        df_filt[df_filt['quantity'] == 0]
-        .groupby(['item_id', 'item_title'])
-        .agg(total_amount=('total_amount', 'sum'), quantidade=('quantity', 'sum'))
-        .reset_index()
-    )
-    df_sem_venda['link'] = df_sem_venda['item_id'].apply(
-        lambda x: f"https://www.mercadolivre.com.br/anuncio/{x}"
+    # Catálogo (tabela items) sem nenhuma venda no período: anti-join no banco
+    df_sem_venda = carregar_anuncios_sem_venda(
+        registro_versoes().chave(), dia_int(data_ini), dia_int(data_fim)
     )
-    df_sem_venda['link'] = df_sem_venda['link'].apply(
-        lambda url: f"[🔗 Ver Anúncio]({url})"
-    )
-    df_sem_venda['total_amount'] = df_sem_venda['total_amount'].apply(
-        lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    )
-    df_sem_venda['quantidade'] = df_sem_venda['quantidade'].astype(int)
-    st.dataframe(df_sem_venda, use_container_width=True)
+    if df_sem_venda.empty:
+        st.info(
+            "Nenhum anúncio ativo sem vendas no período. "
+            "Se o catálogo ainda não foi sincronizado, use 📚 Sincronizar Catálogo em Contas Cadastradas."
+        )
+    else:
+        st.caption(f"{len(df_sem_venda)} anúncios ativos sem vendas no período.")
+        df_sem_venda['link'] = df_sem_venda['permalink'].apply(
+            lambda url: f"[🔗 Ver Anúncio]({url})"
+        )
+        df_sem_venda['price'] = df_sem_venda['price'].apply(
+            lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else "—"
+        )
+        st.dataframe(
+            df_sem_venda.drop(columns=['permalink']).rename(columns={
+                'title': 'Título', 'nickname': 'Conta', 'price': 'Preço',
+                'available_quantity': 'Estoque', 'sold_quantity': 'Vendidos (total)',
+                'date_created': 'Criado em',
+            }),
+            use_container_width=True,
+        )
 
-    # 7️⃣ Faturamento por item_id com link
+    # 6️⃣ Faturamento por item_id com link
     st.subheader("6️⃣ 📊 Faturamento por MLB (item_id, Título e Link)")
 
     df_mlb = (
@@ -1132,7 +1070,53 @@ def mostrar_anuncios():
         mime="text/csv"
     )
 
-def mostrar_relatorios():
+    # 7️⃣ Famílias de produtos (agrupamento dos títulos)
+    st.subheader("7️⃣ 🧩 Faturamento por Família de Produtos")
+    try:
+        df_familias = faturamento_por_familia(
+            df_filt, familias_por_titulo(registro_versoes().chave()), faturamento_col
+        )
+    except Exception as e:
+        df_familias = None
+        st.error(f"❌ Erro ao agrupar os títulos: {e}")
+    if df_familias is not None and not df_familias.empty:
+        df_familias['familia_label'] = (
+            df_familias['nome_familia'] + " (#" + df_familias['familia'].astype(str) + ")"
+        )
+        fig_familias = px.bar(
+            df_familias.head(15),
+            x='familia_label',
+            y='faturamento',
+            text_auto='.2s',
+            hover_data={'pedidos': True, 'titulos': True, 'familia_label': False},
+            labels={'familia_label': 'Família (termos principais)', 'faturamento': 'Faturamento (R$)'},
+            color_discrete_sequence=["#3498db"]
+        )
+        st.plotly_chart(fig_familias, use_container_width=True)
+        st.dataframe(
+            df_familias[['nome_familia', 'titulos', 'pedidos', 'faturamento']],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    # Nuvem de palavras: espera a thread só depois do resto da página desenhado
+    try:
+        png = nuvem.result()
+    except Exception as e:
+        espaco_nuvem.warning(f"⚠️ Não foi possível gerar a nuvem de palavras: {e}")
+    else:
+        if png is None:
+            espaco_nuvem.info("Sem palavras para a nuvem no período.")
+        else:
+            espaco_nuvem.image(png, use_column_width=True)
+    est = gerador_nuvens().estatisticas()
+    tempo = f" · geração média {est['media_ms']:.0f} ms" if est["media_ms"] is not None else ""
+    legenda_nuvem.caption(
+        f"Cache de nuvens: {est['taxa_acerto']:.0%} de acerto "
+        f"({est['acertos']} acertos, {est['geradas']} geradas){tempo}"
+    )
+
+def mostrar_relatorios(df: pd.DataFrame):
     # Remove o espaçamento superior
     st.markdown(
         """
@@ -1147,8 +1131,6 @@ def mostrar_relatorios():
 
     st.header("📋 Relatórios de Vendas")
 
-    df = carregar_vendas()
-
     if df.empty:
         st.warning("Nenhum dado encontrado.")
         return
@@ -1173,10 +1155,7 @@ def mostrar_relatorios():
         data_ini = col2.date_input("De:", value=df['date_adjusted'].min().date())
         data_fim = col3.date_input("Até:", value=df['date_adjusted'].max().date())
 
-    df_filt = df.loc[
-        (df['date_adjusted'].dt.date >= data_ini) & 
-        (df['date_adjusted'].dt.date <= data_fim)
-    ]
+    df_filt = df.loc[entre_dias(df['sale_day'], data_ini, data_fim)]
 
     if df_filt.empty:
         st.warning("Nenhuma venda no período selecionado.")
@@ -1192,7 +1171,7 @@ def mostrar_relatorios():
     df_filt['Total da Venda'] = df_filt['total_amount'].apply(
         lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     )
-    df_filt['Data da Venda'] = df_filt['date_adjusted'].dt.strftime('%d/%m/%Y')
+    df_filt['Data da Venda'] = formatar_dias(df_filt['sale_day'])
 
     df_filt['link'] = df_filt['item_id'].apply(
         lambda x: f"[🔗 Ver Anúncio](https://www.mercadolivre.com.br/anuncio/{x})"
@@ -1252,32 +1231,22 @@ def mostrar_gestao_sku():
 
     # === Consulta de SKUs únicos ===
     if st.session_state.get("atualizar_gestao_sku", False) or "df_gestao_sku" not in st.session_state:
-        df = pd.read_sql(text("""
-            SELECT
-                seller_sku,
-                MAX(level1) AS level1,
-                MAX(level2) AS level2,
-                MAX(custo_unitario) AS custo_unitario,
-                MAX(quantity_sku) AS quantity_sku,
-                COUNT(DISTINCT item_id) AS qtde_vendas
-            FROM sales
-            WHERE seller_sku IS NOT NULL
-            GROUP BY seller_sku
-        """), engine)
+        df = carregar_resumo_skus(registro_versoes().chave())
         st.session_state["df_gestao_sku"] = df
         st.session_state["atualizar_gestao_sku"] = False
     else:
         df = st.session_state["df_gestao_sku"]
 
     # === Métricas ===
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         vendas_sem_sku = conn.execute(text("SELECT COUNT(*) FROM sales WHERE seller_sku IS NULL")).scalar()
         mlbs_sem_sku = conn.execute(text("SELECT COUNT(DISTINCT item_id) FROM sales WHERE seller_sku IS NULL")).scalar()
         sku_incompleto = conn.execute(text("""
-            SELECT COUNT(DISTINCT seller_sku)
-            FROM sales
-            WHERE seller_sku IS NOT NULL AND (
-                level1 IS NULL OR level2 IS NULL OR custo_unitario IS NULL OR quantity_sku IS NULL
+            SELECT COUNT(DISTINCT s.seller_sku)
+            FROM sales s
+            LEFT JOIN sku k ON k.sku = s.seller_sku AND upper_inf(k.valid_during)
+            WHERE s.seller_sku IS NOT NULL AND (
+                k.level1 IS NULL OR k.level2 IS NULL OR k.custo_unitario IS NULL OR k.quantity IS NULL
             )
         """)).scalar()
 
@@ -1333,45 +1302,26 @@ def mostrar_gestao_sku():
         key="editor_sku"
     )
 
-    # === Salvar alterações ===
+    # === Salvar alterações (só os SKUs que mudaram em relação ao carregado) ===
+    corrigir_sku = st.checkbox(
+        "✏️ Corrigir o cadastro vigente (o valor passa a valer também para as vendas passadas)",
+        key="corrigir_sku",
+        help="Sem esta opção, cada alteração vale a partir de agora. Cadastros incompletos são sempre corrigidos.",
+    )
     if st.button("💾 Salvar Alterações"):
         try:
-            with engine.begin() as conn:
-                for _, row in df_editado.iterrows():
-                    conn.execute(text("""
-                        INSERT INTO sku (sku, level1, level2, custo_unitario, quantity, date_created)
-                        VALUES (:sku, :level1, :level2, :custo, :quantidade, NOW())
-                        ON CONFLICT (sku) DO UPDATE
-                        SET
-                            level1 = EXCLUDED.level1,
-                            level2 = EXCLUDED.level2,
-                            custo_unitario = EXCLUDED.custo_unitario,
-                            quantity = EXCLUDED.quantity
-                    """), {
-                        "sku": row["seller_sku"],
-                        "level1": row["level1"],
-                        "level2": row["level2"],
-                        "custo": row["custo_unitario"],
-                        "quantidade": row["quantity_sku"]
-                    })
-
-                conn.execute(text("""
-                    UPDATE sales s
-                    SET
-                        level1 = sku.level1,
-                        level2 = sku.level2,
-                        custo_unitario = sku.custo_unitario,
-                        quantity_sku = sku.quantity
-                    FROM (
-                        SELECT DISTINCT ON (sku) * FROM sku
-                        ORDER BY sku, date_created DESC
-                    ) sku
-                    WHERE s.seller_sku = sku.sku
-                """))
-
-            st.success("✅ Alterações salvas com sucesso!")
-            st.session_state["atualizar_gestao_sku"] = True
-            st.rerun()
+            alterados = alteracoes(df, df_editado)
+            if alterados.empty:
+                st.info("Nenhuma alteração para salvar.")
+            else:
+                with get_engine().begin() as conn:
+                    contas = salvar_skus(conn, alterados, corrigir=corrigir_sku)
+                    for conta in contas:
+                        incrementar_versao(conn, conta)
+
+                st.success(f"✅ {len(alterados)} SKU(s) salvo(s) com sucesso!")
+                st.session_state["atualizar_gestao_sku"] = True
+                st.rerun()
 
         except Exception as e:
             st.error(f"❌ Erro ao salvar alterações: {e}")
@@ -1392,65 +1342,36 @@ def mostrar_gestao_sku():
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    arquivo = st.file_uploader("Selecione um arquivo Excel (.xlsx)", type=["xlsx"])
+    arquivo = st.file_uploader("Selecione um arquivo Excel (.xlsx) ou CSV", type=["xlsx", "csv"])
     if arquivo is not None:
-        df_novo = pd.read_excel(arquivo)
-        colunas_esperadas = {"seller_sku", "level1", "level2", "custo_unitario", "quantity"}
-        if not colunas_esperadas.issubset(df_novo.columns):
-            st.error("❌ A planilha deve conter: seller_sku, level1, level2, custo_unitario, quantity.")
-        else:
-            if st.button("✅ Processar Planilha e Atualizar"):
-                try:
-                    df_novo["quantity"] = df_novo["quantity"].fillna(0).astype(int)
-                    df_novo["custo_unitario"] = df_novo["custo_unitario"].fillna(0).astype(float)
-                    df_novo["seller_sku"] = df_novo["seller_sku"].astype(str).str.strip()
-                    df_novo["level1"] = df_novo["level1"].astype(str).str.strip()
-                    df_novo["level2"] = df_novo["level2"].astype(str).str.strip()
-
-                    with engine.begin() as conn:
-                        for _, row in df_novo.iterrows():
-                            row_dict = row.to_dict()
-                            result = conn.execute(text("""
-                                SELECT 1 FROM sku
-                                WHERE sku = :seller_sku
-                                  AND TRIM(level1) = :level1
-                                  AND TRIM(level2) = :level2
-                                  AND ROUND(CAST(custo_unitario AS numeric), 2) = ROUND(CAST(:custo_unitario AS numeric), 2)
-                                  AND quantity = :quantity
-                                LIMIT 1
-                            """), row_dict).fetchone()
-
-                            if result is None:
-                                conn.execute(text("""
-                                    INSERT INTO sku (sku, level1, level2, custo_unitario, quantity, date_created)
-                                    VALUES (:seller_sku, :level1, :level2, :custo_unitario, :quantity, NOW())
-                                """), row_dict)
-
-                        # Atualizar tabela de vendas
-                        conn.execute(text("""
-                            UPDATE sales s
-                            SET
-                                level1 = sku.level1,
-                                level2 = sku.level2,
-                                custo_unitario = sku.custo_unitario,
-                                quantity_sku = sku.quantity
-                            FROM (
-                                SELECT DISTINCT ON (sku) *
-                                FROM sku
-                                ORDER BY sku, date_created DESC
-                            ) sku
-                            WHERE s.seller_sku = sku.sku
-                        """))
-
-                    # Recarregar métricas e dados
-                    st.session_state["atualizar_gestao_sku"] = True
-                    st.success("✅ Planilha importada, vendas atualizadas, métricas e tabela recarregadas!")
-                    st.rerun()
-
-                except Exception as e:
-                    st.error(f"❌ Erro ao processar: {e}")
-
-def mostrar_expedicao_logistica(df: pd.DataFrame):
+        corrigir_planilha = st.checkbox(
+            "✏️ Corrigir o cadastro vigente (o valor passa a valer também para as vendas passadas)",
+            key="corrigir_planilha",
+        )
+        if st.button("✅ Processar Planilha e Atualizar"):
+            try:
+                inicio = time.perf_counter()
+                with st.spinner("📥 Importando planilha..."):
+                    with get_engine().begin() as conn:
+                        lidas, contas, alterados = importar_planilha(
+                            conn, ler_planilha(arquivo, arquivo.name), corrigir=corrigir_planilha
+                        )
+                        for conta in contas:
+                            incrementar_versao(conn, conta)
+
+                # Recarregar métricas e dados
+                st.session_state["atualizar_gestao_sku"] = True
+                st.success(
+                    f"✅ Planilha importada: {lidas} linhas lidas, {alterados} SKU(s) novos ou alterados "
+                    f"em {time.perf_counter() - inicio:.1f}s."
+                )
+                time.sleep(2)
+                st.rerun()
+
+            except Exception as e:
+                st.error(f"❌ Erro ao processar: {e}")
+
+def mostrar_expedicao_logistica(indice: IndiceFiltros):
     import streamlit as st
     import plotly.express as px
     import pandas as pd
@@ -1477,7 +1398,7 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
     )
     st.header("🚚 Expedição e Logística")
 
-    if df.empty:
+    if not len(indice):
         st.warning("Nenhum dado encontrado.")
         return
 
@@ -1492,46 +1413,20 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
             case 'me2': return 'Envio Padrão'
             case _: return 'outros'
 
-    df["Tipo de Envio"] = df["shipment_logistic_type"].apply(mapear_tipo)
-
-    # Garantir que 'shipment_delivery_sla' esteja em datetime
-    if "shipment_delivery_sla" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["shipment_delivery_sla"]):
-        df["shipment_delivery_sla"] = pd.to_datetime(df["shipment_delivery_sla"], errors="coerce")
-
-    # Cálculo de quantidade
-    if "quantity" in df.columns and "quantity_sku" in df.columns:
-        df["quantidade"] = df["quantity"] * df["quantity_sku"]
-    else:
+    base = indice.frame
+    if "quantity" not in base.columns or "quantity_sku" not in base.columns:
         st.error("Colunas 'quantity' e/ou 'quantity_sku' não encontradas.")
         st.stop()
 
-    # Data da venda
-    if "date_adjusted" not in df.columns:
-        st.error("Coluna 'date_adjusted' não encontrada.")
-        st.stop()
-    df["data_venda"] = pd.to_datetime(df["date_adjusted"]).dt.date
-
-    # Conversão para fuso de SP
-    def _to_sp_date(x):
-        if pd.isna(x):
-            return pd.NaT
-        ts = pd.to_datetime(x, utc=True)
-        return ts.tz_convert("America/Sao_Paulo").date()
-
-    if "shipment_delivery_sla" in df.columns:
-        df["shipment_delivery_sla"] = pd.to_datetime(df["shipment_delivery_sla"], utc=True, errors="coerce")
-        df["data_limite"] = df["shipment_delivery_sla"].apply(
-            lambda x: x.tz_convert("America/Sao_Paulo").date() if pd.notnull(x) else pd.NaT
-        )
-    else:
-        df["data_limite"] = pd.NaT
-
+    # Limites dos seletores de data, sem materializar o frame
+    # (sla_day: dia limite de despacho yyyymmdd no horário de SP, gravado na ingestão)
     hoje = pd.Timestamp.now().date()
-    data_min_venda = df["data_venda"].dropna().min()
-    data_max_venda = df["data_venda"].dropna().max()
+    data_min_venda, data_max_venda = indice.datas()
 
-    data_min_limite = df["data_limite"].dropna().min()
-    data_max_limite = df["data_limite"].dropna().max()
+    data_min_limite = data_max_limite = pd.NaT
+    if base["sla_day"].notna().any():
+        data_min_limite = data_do_dia(base["sla_day"].min())
+        data_max_limite = data_do_dia(base["sla_day"].max())
     if pd.isna(data_min_limite):
         data_min_limite = hoje
     if pd.isna(data_max_limite) or data_max_limite < data_min_limite:
@@ -1621,14 +1516,14 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
             key="data_venda_ate"
         )
 
-    # --- Aplicar filtro por data de venda e expedição no DataFrame base ---
-    df = df[
-        (df["data_venda"] >= de_venda) & (df["data_venda"] <= ate_venda) &
-        (df["data_limite"].isna() |
-         ((df["data_limite"] >= de_limite) & (df["data_limite"] <= ate_limite)))
-    ]
-
-    df_filtrado = df.copy()
+    # --- Aplicar filtro por data de venda (fatia do índice) e expedição ---
+    posicoes = indice.selecionar(de_venda, ate_venda)
+    df = indice.linhas(posicoes)
+    df["Tipo de Envio"] = mapear_categorias(df["shipment_logistic_type"], mapear_tipo)
+    df["quantidade"] = df["quantity"] * df["quantity_sku"]
+    no_prazo = df["sla_day"].isna().to_numpy() | entre_dias(df["sla_day"], de_limite, ate_limite)
+    df = df[no_prazo]
+    posicoes = posicoes[no_prazo]
     
     # --- Linha 3: Conta, Status, Status Envio, Tipo de Envio ---
     col6, col7, col8, col11 = st.columns(4)
@@ -1656,18 +1551,26 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
             ["Todos"] + sorted(df["Tipo de Envio"].dropna().unique().tolist())
         )
 
-    # --- Aplicar filtros restantes ---
-
+    # --- Aplicar filtros restantes (posições do índice intersectadas com as linhas acima) ---
+    filtros = {}
     if conta != "Todos":
-        df_filtrado = df_filtrado[df_filtrado["nickname"] == conta]
+        filtros["nickname"] = [conta]
     if status != "Todos":
-        df_filtrado = df_filtrado[df_filtrado["status"] == status]
-    if status_data_envio == "Com Data de Envio":
-        df_filtrado = df_filtrado[df_filtrado["data_limite"].notna()]
-    elif status_data_envio == "Sem Data de Envio":
-        df_filtrado = df_filtrado[df_filtrado["data_limite"].isna()]
+        filtros["status"] = [status]
     if tipo_envio != "Todos":
-        df_filtrado = df_filtrado[df_filtrado["Tipo de Envio"] == tipo_envio]
+        filtros["shipment_logistic_type"] = [
+            t for t in indice.valores("shipment_logistic_type") + [None] if mapear_tipo(t) == tipo_envio
+        ]
+    if status_data_envio != "Todos":
+        com_data = df["sla_day"].notna().to_numpy()
+        manter = com_data if status_data_envio == "Com Data de Envio" else ~com_data
+        df, posicoes = df[manter], posicoes[manter]
+
+    def _filtrar():
+        manter = np.isin(posicoes, indice.selecionar(de_venda, ate_venda, **filtros), assume_unique=True)
+        return df[manter]
+
+    df_filtrado = _filtrar()
     
     
     # Aqui entra o bloco com os filtros de hierarquia
@@ -1681,7 +1584,8 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
             if col_l1[i % 4].checkbox(op, key=f"filtros_level1_{op}"):
                 level1_selecionados.append(op)
         if level1_selecionados:
-            df_filtrado = df_filtrado[df_filtrado["level1"].isin(level1_selecionados)]
+            filtros["level1"] = level1_selecionados
+            df_filtrado = _filtrar()
     
         # Hierarquia 2
         level2_opcoes = sorted(df_filtrado["level2"].dropna().unique().tolist())
@@ -1692,7 +1596,8 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
             if col_l2[i % 4].checkbox(op, key=f"filtros_level2_{op}"):
                 level2_selecionados.append(op)
         if level2_selecionados:
-            df_filtrado = df_filtrado[df_filtrado["level2"].isin(level2_selecionados)]
+            filtros["level2"] = level2_selecionados
+            df_filtrado = _filtrar()
 
 
     # Verificação final
@@ -1704,9 +1609,7 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
     df_filtrado = df_filtrado.copy()
     df_filtrado["Canal de Venda"] = "MERCADO LIVRE"
     
-    df_filtrado["Data Limite do Envio"] = df_filtrado["data_limite"].apply(
-        lambda d: d.strftime("%d/%m/%Y") if pd.notna(d) else "—"
-    )
+    df_filtrado["Data Limite do Envio"] = formatar_dias(df_filtrado["sla_day"])
 
 
     tabela = df_filtrado[[
@@ -1734,7 +1637,7 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
     st.markdown("### 📋 Tabela de Expedição por Venda")
     st.dataframe(tabela, use_container_width=True, height=500)
 
-    df_grouped = df_filtrado.groupby("level1", as_index=False).agg({"quantidade": "sum"})
+    df_grouped = df_filtrado.groupby("level1", as_index=False, observed=True).agg({"quantidade": "sum"})
     df_grouped = df_grouped.rename(columns={"level1": "Hierarquia 1", "quantidade": "Quantidade"})
     
     # Ordenar do maior para o menor
@@ -1767,21 +1670,21 @@ def mostrar_expedicao_logistica(df: pd.DataFrame):
     
     # Tabela 1: Hierarquia 1
     with col_r1:
-        df_h1 = df_filtrado.groupby("level1", as_index=False)["quantidade"].sum().rename(columns={
+        df_h1 = df_filtrado.groupby("level1", as_index=False, observed=True)["quantidade"].sum().rename(columns={
             "level1": "Hierarquia 1", "quantidade": "Quantidade"
         })
         st.dataframe(df_h1, use_container_width=True, hide_index=True)
     
     # Tabela 2: Hierarquia 2
     with col_r2:
-        df_h2 = df_filtrado.groupby("level2", as_index=False)["quantidade"].sum().rename(columns={
+        df_h2 = df_filtrado.groupby("level2", as_index=False, observed=True)["quantidade"].sum().rename(columns={
             "level2": "Hierarquia 2", "quantidade": "Quantidade"
         })
         st.dataframe(df_h2, use_container_width=True, hide_index=True)
     
     # Tabela 3: Tipo de Envio
     with col_r3:
-        df_tipo = df_filtrado.groupby("Tipo de Envio", as_index=False)["quantidade"].sum().rename(columns={
+        df_tipo = df_filtrado.groupby("Tipo de Envio", as_index=False, observed=True)["quantidade"].sum().rename(columns={
             "Tipo de Envio": "Tipo de Envio", "quantidade": "Quantidade"
         })
         st.dataframe(df_tipo, use_container_width=True, hide_index=True)
@@ -1941,28 +1844,58 @@ def mostrar_painel_metas():
     st.info("Em breve...")
     
 
+def mostrar_configuracoes():
+    st.markdown(
+        """
+        <style>
+        .block-container {
+            padding-top: 0rem;
+        }
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.header("🔧 Configurações")
+    st.info("Em breve...")
+
+
+# ----------------- Registro de Páginas -----------------
+@dataclass(frozen=True)
+class Pagina:
+    """Tela do menu: função de renderização, ícone e dados de que depende."""
+    render: Callable[..., None]
+    icone: str
+    dados: Tuple[str, ...] = ()
+
+# Carregadores de dados, chamados só quando a página ativa declara o nome
+CARREGADORES: Dict[str, Callable[[], object]] = {
+    "vendas": carregar_vendas,
+    "indice": carregar_indice,
+}
+
+PAGINAS: Dict[str, Pagina] = {
+    "Dashboard":          Pagina(mostrar_dashboard, "house", dados=("indice",)),
+    "Contas Cadastradas": Pagina(mostrar_contas_cadastradas, "person-up"),
+    "Relatórios":         Pagina(mostrar_relatorios, "file-earmark-text", dados=("vendas",)),
+    "Expedição":          Pagina(mostrar_expedicao_logistica, "collection-fill", dados=("indice",)),
+    "Gestão de SKU":      Pagina(mostrar_gestao_sku, "box-seam"),
+    "Gestão de Despesas": Pagina(mostrar_gestao_despesas, "currency-dollar"),
+    "Painel de Metas":    Pagina(mostrar_painel_metas, "bar-chart-line"),
+    "Gestão de Anúncios": Pagina(mostrar_anuncios, "bullseye", dados=("vendas",)),
+    "Configurações":      Pagina(mostrar_configuracoes, "gear"),
+}
+
+def renderizar_pagina(nome: str):
+    """Carrega apenas os dados declarados pela página e a renderiza."""
+    pagina = PAGINAS[nome]
+    pagina.render(*(CARREGADORES[d]() for d in pagina.dados))
+
+
 # ----------------- Fluxo Principal -----------------
+iniciar_aquecimento()
+
 if "code" in st.query_params:
     ml_callback()
 
-df_vendas = carregar_vendas()
-
 pagina = render_sidebar()
-if pagina == "Dashboard":
-    mostrar_dashboard()
-elif pagina == "Contas Cadastradas":
-    mostrar_contas_cadastradas()
-elif pagina == "Relatórios":
-    mostrar_relatorios()
-elif pagina == "Expedição":
-    mostrar_expedicao_logistica(df_vendas)
-elif pagina == "Gestão de SKU":
-    mostrar_gestao_sku()
-elif pagina == "Gestão de Despesas":
-    mostrar_gestao_despesas()
-elif pagina == "Painel de Metas":
-    mostrar_painel_metas()
-elif pagina == "Gestão de Anúncios":
-    mostrar_anuncios()
-elif pagina == "Configurações":
-    mostrar_configuracoes()
+renderizar_pagina(pagina)
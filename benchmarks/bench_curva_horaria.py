@@ -0,0 +1,77 @@
+# benchmarks/bench_curva_horaria.py
+"""
+Curva de faturamento acumulado por hora: implementação antiga (MultiIndex
+dias × 24 + reindex + groupby cumsum/mean) contra o rollup denso de
+periodos.py, sobre vendas sintéticas de vários anos.
+
+Uso:
+    python benchmarks/bench_curva_horaria.py [--anos 3.5] [--vendas-por-dia 800] [--runs 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from periodos import matriz_dia_hora, media_acumulada_por_hora  # noqa: E402
+
+
+def gerar_vendas(anos: float, vendas_por_dia: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    segundos = int(anos * 365 * 86_400)
+    n = int(anos * 365 * vendas_por_dia)
+    return pd.DataFrame({
+        "date_adjusted": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, segundos, n), unit="s"),
+        "total_amount": rng.gamma(2.0, 60.0, n),
+    })
+
+
+def curva_antiga(df: pd.DataFrame) -> np.ndarray:
+    df = df.assign(hora=df["date_adjusted"].dt.hour, data=df["date_adjusted"].dt.date)
+    por_dia_hora = df.groupby(["data", "hora"])["total_amount"].sum().reset_index()
+    malha = pd.MultiIndex.from_product([por_dia_hora["data"].unique(), range(24)], names=["data", "hora"])
+    completa = por_dia_hora.set_index(["data", "hora"]).reindex(malha, fill_value=0).reset_index()
+    completa["acumulado_dia"] = completa.groupby("data")["total_amount"].cumsum()
+    media = completa.groupby("hora")["acumulado_dia"].mean().reset_index(name="v")
+    media_final = df.groupby("data")["total_amount"].sum().mean()
+    media = pd.concat([media, pd.DataFrame([{"hora": 23, "v": media_final}])]).groupby("hora").last()
+    return media["v"].to_numpy()
+
+
+def curva_nova(df: pd.DataFrame) -> np.ndarray:
+    _, matriz = matriz_dia_hora(df["date_adjusted"], df["total_amount"])
+    return media_acumulada_por_hora(matriz)
+
+
+def cronometrar(func, df: pd.DataFrame, runs: int) -> float:
+    melhor = float("inf")
+    for _ in range(runs):
+        inicio = time.perf_counter()
+        func(df)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anos", type=float, default=3.5)
+    parser.add_argument("--vendas-por-dia", type=int, default=800)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    df = gerar_vendas(args.anos, args.vendas_por_dia)
+    assert np.allclose(curva_antiga(df), curva_nova(df)), "As duas implementações divergem"
+
+    antiga = cronometrar(curva_antiga, df, args.runs)
+    nova = cronometrar(curva_nova, df, args.runs)
+    print(f"{len(df):,} vendas em {args.anos} anos (melhor de {args.runs})")
+    print(f"  antiga (MultiIndex + groupby): {antiga * 1000:8.1f} ms")
+    print(f"  nova (matriz dias × 24):       {nova * 1000:8.1f} ms  ({antiga / nova:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_importtime.py
+"""
+Orçamento de tempo de import a frio do app.py.
+
+Lê os imports de nível de módulo do app.py, importa todos eles num
+interpretador novo com `python -X importtime` e soma o tempo cumulativo dos
+módulos de topo, descontando o custo fixo de subir o interpretador. Repete
+algumas vezes e fica com a menor medição. Sai com código 1 se o tempo
+passar do orçamento.
+
+Uso:
+    python benchmarks/bench_importtime.py [--budget-ms 2500] [--runs 3] [--top 15]
+
+O orçamento também pode vir de IMPORT_BUDGET_MS.
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+
+
+def modulos_de_topo(caminho: str) -> List[str]:
+    """Módulos importados no nível de módulo do arquivo (imports dentro de funções ficam de fora)."""
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read())
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos.extend(alias.name for alias in no.names)
+        elif isinstance(no, ast.ImportFrom) and no.module and not no.level:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+
+def medir(codigo: str) -> Tuple[int, Dict[str, int]]:
+    """Roda `codigo` com -X importtime e devolve (total em µs, cumulativo por módulo de topo)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    por_modulo: Dict[str, int] = {}
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        # "import time:   self |  cumulativo | <recuo>nome"
+        _, cumulativo, nome = linha.split("|", 2)
+        nome = nome[1:]
+        if nome.startswith(" "):
+            continue  # submódulo: já está no cumulativo do pai
+        por_modulo[nome] = int(cumulativo)
+    return sum(por_modulo.values()), por_modulo
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "2500")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    modulos = modulos_de_topo(APP)
+    codigo = "; ".join(f"import {m}" for m in modulos)
+
+    base = min(medir("pass")[0] for _ in range(args.runs))
+    medicoes = [medir(codigo) for _ in range(args.runs)]
+    total, por_modulo = min(medicoes, key=lambda m: m[0])
+    total_ms = (total - base) / 1000
+
+    print(f"Módulos importados pelo app.py: {len(modulos)}")
+    print(f"Mais lentos (cumulativo, melhor de {args.runs}):")
+    for nome, us in sorted(por_modulo.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {nome}")
+    print(f"Total de import a frio: {total_ms:.1f} ms (orçamento {args.budget_ms:.0f} ms)")
+
+    if total_ms > args.budget_ms:
+        print("❌ Tempo de import acima do orçamento.")
+        return 1
+    print("✅ Dentro do orçamento.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+# cache_store.py
+"""
+Cache persistente compartilhado entre processos.
+
+O `st.cache_data`/`st.cache_resource` vivem dentro de um único processo do
+Streamlit: todo deploy, restart ou réplica nova começa frio. Este módulo
+guarda resultados já calculados fora do processo, em um de dois backends:
+
+- `DiscoCache`: arquivos no disco local (DataFrames em Arrow IPC, demais
+  valores em pickle) com um índice SQLite;
+- `RedisCache`: um servidor Redis, para réplicas em máquinas diferentes.
+
+Os dois comprimem os valores e respeitam um limite total de bytes,
+descartando as entradas acessadas há mais tempo (LRU).
+
+Funções decoradas com `@persistente` também guardam o resultado em memória
+(LRU de `MEMORIA_MAX_ENTRADAS` entradas por processo): um rerun que pede o
+mesmo valor não consulta o índice nem desserializa o arquivo de novo.
+
+Configuração por variáveis de ambiente:
+    CACHE_BACKEND  "disk" (padrão) ou "redis"
+    CACHE_DIR      diretório do cache em disco (padrão ".cache/nexus")
+    CACHE_MAX_MB   limite total em MB (padrão 512)
+    REDIS_URL      URL do Redis quando CACHE_BACKEND=redis
+"""
+import functools
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import pandas as pd
+
+from settings import get_settings
+
+# Prefixo de 1 byte que identifica o formato serializado
+_ARROW = b"A"
+_PICKLE = b"P"
+
+# Marca "não está no cache": um valor guardado pode ser None
+AUSENTE = object()
+
+# Entradas mantidas em memória pelo decorador `persistente`
+MEMORIA_MAX_ENTRADAS = 128
+
+
+def serializar(valor: Any) -> bytes:
+    """DataFrames viram Arrow IPC (zstd); o resto vira pickle comprimido."""
+    if isinstance(valor, pd.DataFrame):
+        import pyarrow as pa
+
+        tabela = pa.Table.from_pandas(valor, preserve_index=False)
+        sink = io.BytesIO()
+        opcoes = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, tabela.schema, options=opcoes) as writer:
+            writer.write_table(tabela)
+        return _ARROW + sink.getvalue()
+    return _PICKLE + zlib.compress(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), 3)
+
+
+def desserializar(dados: bytes) -> Any:
+    formato, corpo = dados[:1], dados[1:]
+    if formato == _ARROW:
+        import pyarrow as pa
+
+        with pa.ipc.open_stream(corpo) as reader:
+            return reader.read_all().to_pandas()
+    return pickle.loads(zlib.decompress(corpo))
+
+
+class DiscoCache:
+    """Um arquivo por entrada; o índice SQLite guarda tamanho, último acesso e expiração."""
+
+    def __init__(self, diretorio: str, max_bytes: int):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._indice = os.path.join(diretorio, "index.sqlite")
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entradas (
+                    chave   TEXT PRIMARY KEY,
+                    arquivo TEXT NOT NULL,
+                    bytes   INTEGER NOT NULL,
+                    acesso  REAL NOT NULL,
+                    expira  REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entradas_acesso ON entradas (acesso)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self._indice, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, hashlib.sha1(chave.encode()).hexdigest() + ".bin")
+
+    def get(self, chave: str) -> Optional[bytes]:
+        agora = time.time()
+        with self._conectar() as conn:
+            row = conn.execute(
+                "SELECT arquivo, expira FROM entradas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if row is None:
+                return None
+            arquivo, expira = row
+            if expira is not None and expira < agora:
+                self._remover(conn, chave, arquivo)
+                return None
+            conn.execute("UPDATE entradas SET acesso = ? WHERE chave = ?", (agora, chave))
+        try:
+            with open(arquivo, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, chave: str, dados: bytes, ttl: Optional[float] = None) -> None:
+        if len(dados) > self.max_bytes:
+            return
+        arquivo = self._caminho(chave)
+        temporario = f"{arquivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, arquivo)
+
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entradas (chave, arquivo, bytes, acesso, expira) VALUES (?, ?, ?, ?, ?)",
+                (chave, arquivo, len(dados), agora, agora + ttl if ttl else None),
+            )
+            self._evict(conn)
+
+    def delete(self, chave: str) -> None:
+        with self._conectar() as conn:
+            row = conn.execute("SELECT arquivo FROM entradas WHERE chave = ?", (chave,)).fetchone()
+            if row:
+                self._remover(conn, chave, row[0])
+
+    def _remover(self, conn: sqlite3.Connection, chave: str, arquivo: str) -> None:
+        conn.execute("DELETE FROM entradas WHERE chave = ?", (chave,))
+        try:
+            os.remove(arquivo)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entradas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for chave, arquivo, tamanho in conn.execute(
+            "SELECT chave, arquivo, bytes FROM entradas ORDER BY acesso"
+        ).fetchall():
+            self._remover(conn, chave, arquivo)
+            total -= tamanho
+            if total <= self.max_bytes:
+                break
+
+
+class RedisCache:
+    """
+    Mesmo contrato do `DiscoCache` sobre um cliente com a API do redis-py
+    (o `redis.Redis` real ou qualquer substituto local compatível).
+    O limite de bytes é controlado pelo próprio cliente com um ZSET de
+    último acesso e um contador de tamanho total.
+    """
+
+    def __init__(self, cliente, max_bytes: int, prefixo: str = "nexus:cache:"):
+        self.cliente = cliente
+        self.max_bytes = max_bytes
+        self.prefixo = prefixo
+        self._lru = prefixo + "__lru__"
+        self._tamanhos = prefixo + "__bytes__"
+        self._total = prefixo + "__total__"
+
+    def get(self, chave: str) -> Optional[bytes]:
+        dados = self.cliente.get(self.prefixo + chave)
+        if dados is None:
+            # Expirou pelo TTL do Redis: limpa a contabilidade
+            self._esquecer(chave)
+            return None
+        self.cliente.zadd(self._lru, {chave: time.time()})
+        return dados
+
+    def set(self, chave: str, dados: bytes, ttl: Optional[float] = None) -> None:
+        if len(dados) > self.max_bytes:
+            return
+        anterior = int(self.cliente.hget(self._tamanhos, chave) or 0)
+        pipe = self.cliente.pipeline()
+        pipe.set(self.prefixo + chave, dados, ex=int(ttl) if ttl else None)
+        pipe.zadd(self._lru, {chave: time.time()})
+        pipe.hset(self._tamanhos, chave, len(dados))
+        pipe.incrby(self._total, len(dados) - anterior)
+        pipe.execute()
+        self._evict()
+
+    def delete(self, chave: str) -> None:
+        self.cliente.delete(self.prefixo + chave)
+        self._esquecer(chave)
+
+    def _esquecer(self, chave: str) -> None:
+        tamanho = self.cliente.hget(self._tamanhos, chave)
+        if tamanho is None:
+            return
+        pipe = self.cliente.pipeline()
+        pipe.zrem(self._lru, chave)
+        pipe.hdel(self._tamanhos, chave)
+        pipe.incrby(self._total, -int(tamanho))
+        pipe.execute()
+
+    def _evict(self) -> None:
+        while int(self.cliente.get(self._total) or 0) > self.max_bytes:
+            mais_antigas = self.cliente.zrange(self._lru, 0, 0)
+            if not mais_antigas:
+                break
+            chave = mais_antigas[0]
+            chave = chave.decode() if isinstance(chave, bytes) else chave
+            self.delete(chave)
+
+
+class CachePersistente:
+    """Fachada sobre o backend: serializa valores e conta acertos/erros."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = 0
+        self.erros = 0
+
+    def carregar(self, chave: str, padrao: Any = None) -> Any:
+        """Valor guardado em `chave`, ou `padrao` se não houver (use AUSENTE para distinguir None)."""
+        try:
+            dados = self.backend.get(chave)
+        except Exception as e:
+            print(f"⚠️ Falha ao ler cache '{chave}': {e}")
+            dados = None
+        if dados is None:
+            self.erros += 1
+            return padrao
+        self.acertos += 1
+        return desserializar(dados)
+
+    def salvar(self, chave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self.backend.set(chave, serializar(valor), ttl)
+        except Exception as e:
+            print(f"⚠️ Falha ao gravar cache '{chave}': {e}")
+
+    def remover(self, chave: str) -> None:
+        self.backend.delete(chave)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.acertos + self.erros
+        return {
+            "backend": type(self.backend).__name__,
+            "acertos": self.acertos,
+            "erros": self.erros,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+        }
+
+
+def _criar_backend():
+    settings = get_settings()
+    max_bytes = int(settings.cache_max_mb * 1024 ** 2)
+    if settings.cache_backend == "redis":
+        try:
+            import redis
+
+            cliente = redis.Redis.from_url(settings.redis_url)
+            cliente.ping()
+            return RedisCache(cliente, max_bytes)
+        except Exception as e:
+            print(f"⚠️ Redis indisponível ({e}); usando cache em disco.")
+    return DiscoCache(settings.cache_dir, max_bytes)
+
+
+_cache: Optional[CachePersistente] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache() -> CachePersistente:
+    """Cache persistente único do processo."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CachePersistente(_criar_backend())
+    return _cache
+
+
+class _Memoria:
+    """LRU em memória de (chave, expiração, valor), à frente do cache persistente."""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str) -> Any:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return AUSENTE
+            expira, valor = entrada
+            if expira is not None and expira < time.time():
+                del self._entradas[chave]
+                return AUSENTE
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entradas[chave] = (time.time() + ttl if ttl else None, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+_memoria = _Memoria(MEMORIA_MAX_ENTRADAS)
+
+
+def _entregar(valor: Any) -> Any:
+    # Visão sem cópia: quem recebe pode criar colunas sem alterar o valor guardado
+    return valor.copy(deep=False) if isinstance(valor, pd.DataFrame) else valor
+
+
+def persistente(prefixo: str, ttl: Optional[float] = None) -> Callable:
+    """
+    Decorador: guarda o resultado da função em memória e no cache
+    persistente, com chave formada por `prefixo` e um hash dos argumentos.
+    Os argumentos devem ser picklable e determinar o resultado (por exemplo,
+    incluir a chave de versões de dados), de modo que uma versão nova gera
+    uma chave nova nas duas camadas.
+    """
+    def decorador(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            assinatura = hashlib.sha1(pickle.dumps((args, sorted(kwargs.items())))).hexdigest()
+            chave = f"{prefixo}:{assinatura}"
+            valor = _memoria.obter(chave)
+            if valor is not AUSENTE:
+                return _entregar(valor)
+
+            cache = obter_cache()
+            valor = cache.carregar(chave, AUSENTE)
+            if valor is AUSENTE:
+                valor = func(*args, **kwargs)
+                cache.salvar(chave, valor, ttl)
+            _memoria.guardar(chave, valor, ttl)
+            return _entregar(valor)
+        return wrapper
+    return decorador
@@ -0,0 +1,273 @@
+# cadastro_sku.py
+"""
+Gravação do cadastro de SKUs (tabela `sku`).
+
+O cadastro guarda histórico: cada alteração insere uma versão nova do SKU e
+o trigger da migração 008 fecha a vigência (`valid_during`) da anterior. As
+vendas não são reescritas; o custo de cada venda é o da versão vigente na
+data dela (ver `custos.py`). Só o que mudou é gravado:
+
+- `alteracoes` compara a grade editada com o que foi carregado e devolve
+  só os SKUs novos ou com algum campo diferente;
+- `salvar_skus` insere as versões novas desses SKUs num único comando
+  (arrays + `unnest`).
+
+Uma correção não abre versão nova: altera a versão vigente, e o valor
+corrigido passa a valer para todas as vendas do período dela. Isso acontece
+quando pedido (`corrigir=True`) e sempre que a versão vigente está
+incompleta (algum campo nulo), para que completar um cadastro valha também
+para as vendas passadas.
+
+A importação por planilha (`importar_planilha`) segue a mesma ideia para
+dezenas de milhares de linhas: o arquivo (xlsx ou CSV) é lido em blocos,
+cada bloco vai por COPY para uma tabela temporária e um único comando insere
+versões só para os SKUs com algum campo diferente da versão vigente.
+"""
+import csv
+import io
+from typing import IO, Dict, Iterator, List, Sequence, Set, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+# Coluna da grade -> coluna da tabela sku
+COLUNAS_SKU = {
+    "level1": "level1",
+    "level2": "level2",
+    "custo_unitario": "custo_unitario",
+    "quantity_sku": "quantity",
+}
+
+NUMERICAS = ("custo_unitario", "quantity_sku")
+
+
+def _normalizar(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[["seller_sku", *COLUNAS_SKU]].copy()
+    df["seller_sku"] = df["seller_sku"].astype("string").str.strip()
+    for coluna in NUMERICAS:
+        df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+    for coluna in ("level1", "level2"):
+        df[coluna] = df[coluna].astype("string")
+    return df[df["seller_sku"].notna() & (df["seller_sku"] != "")]
+
+
+def alteracoes(original: pd.DataFrame, editado: pd.DataFrame) -> pd.DataFrame:
+    """
+    SKUs de `editado` que não existem em `original` ou que têm algum campo
+    editável diferente (nulos são considerados iguais entre si).
+    """
+    antes = _normalizar(original).drop_duplicates("seller_sku").set_index("seller_sku")
+    depois = _normalizar(editado).drop_duplicates("seller_sku", keep="last").set_index("seller_sku")
+
+    comum = depois.index.intersection(antes.index)
+    a, d = antes.loc[comum], depois.loc[comum]
+    iguais = pd.DataFrame(index=comum)
+    for coluna in COLUNAS_SKU:
+        if coluna == "custo_unitario":
+            # custo_unitario é NUMERIC(10, 2) no banco
+            mesmo = (a[coluna].round(2) == d[coluna].round(2))
+        else:
+            mesmo = (a[coluna] == d[coluna])
+        iguais[coluna] = mesmo.fillna(False).astype(bool) | (a[coluna].isna() & d[coluna].isna())
+
+    alterados = comum[~iguais.all(axis=1).to_numpy()]
+    novos = depois.index.difference(antes.index)
+    return depois.loc[alterados.append(novos)].reset_index()
+
+
+def _lista(serie: pd.Series) -> List:
+    return [None if pd.isna(v) else v for v in serie.tolist()]
+
+
+# Versão vigente que pode ser alterada em vez de ganhar uma versão nova
+SQL_CORRIGIVEL = """
+    upper_inf(k.valid_during)
+    AND (CAST(:corrigir AS boolean)
+         OR k.level1 IS NULL OR k.level2 IS NULL OR k.custo_unitario IS NULL OR k.quantity IS NULL)
+"""
+
+
+def salvar_skus(conn, alterados: pd.DataFrame, corrigir: bool = False) -> Set[int]:
+    """
+    Grava os SKUs em `alterados`: corrige a versão vigente quando ela está
+    incompleta (ou sempre, com `corrigir`) e insere uma versão nova dos
+    demais. Devolve as contas (ml_user_id) com vendas desses SKUs.
+    """
+    if alterados.empty:
+        return set()
+
+    params: Dict[str, Sequence] = {
+        "skus": _lista(alterados["seller_sku"]),
+        "level1": _lista(alterados["level1"]),
+        "level2": _lista(alterados["level2"]),
+        "custo": _lista(alterados["custo_unitario"]),
+        "quantidade": [None if pd.isna(v) else int(v) for v in alterados["quantity_sku"].tolist()],
+        "corrigir": corrigir,
+    }
+    valores = """
+        unnest(
+            CAST(:skus AS text[]),
+            CAST(:level1 AS text[]),
+            CAST(:level2 AS text[]),
+            CAST(:custo AS numeric[]),
+            CAST(:quantidade AS integer[])
+        ) AS v(sku, level1, level2, custo, quantidade)
+    """
+    corrigidos = [r[0] for r in conn.execute(text(f"""
+        UPDATE sku k
+        SET level1 = v.level1, level2 = v.level2, custo_unitario = v.custo, quantity = v.quantidade
+        FROM {valores}
+        WHERE k.sku = v.sku AND {SQL_CORRIGIVEL}
+        RETURNING k.sku
+    """), params)]
+    conn.execute(text(f"""
+        INSERT INTO sku (sku, level1, level2, custo_unitario, quantity, date_created)
+        SELECT v.sku, v.level1, v.level2, v.custo, v.quantidade, NOW()
+        FROM {valores}
+        WHERE NOT (v.sku = ANY(CAST(:corrigidos AS text[])))
+    """), {**params, "corrigidos": corrigidos})
+
+    return contas_dos_skus(conn, params["skus"])
+
+
+def contas_dos_skus(conn, skus: Sequence[str]) -> Set[int]:
+    """Contas com vendas de algum SKU em `skus` (pelo índice de `sales.seller_sku`)."""
+    if not skus:
+        return set()
+    rows = conn.execute(text("""
+        SELECT DISTINCT ml_user_id FROM sales
+        WHERE seller_sku = ANY(CAST(:skus AS text[]))
+    """), {"skus": list(skus)}).fetchall()
+    return {int(r[0]) for r in rows}
+
+
+# Planilha de importação
+COLUNAS_PLANILHA = ("seller_sku", "level1", "level2", "custo_unitario", "quantity")
+LOTE_PLANILHA = 5_000
+
+
+def _blocos_xlsx(arquivo: IO[bytes]) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas, ())]
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) >= LOTE_PLANILHA:
+                yield pd.DataFrame(bloco, columns=cabecalho)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        livro.close()
+
+
+def _blocos_csv(arquivo: IO[bytes]) -> Iterator[pd.DataFrame]:
+    # Separador detectado (planilhas exportadas em pt-BR costumam usar ";")
+    amostra = arquivo.read(64 * 1024).decode("utf-8-sig", errors="ignore")
+    arquivo.seek(0)
+    try:
+        separador = csv.Sniffer().sniff(amostra, delimiters=",;\t").delimiter
+    except csv.Error:
+        separador = ","
+    yield from pd.read_csv(
+        arquivo, sep=separador, dtype=str, chunksize=LOTE_PLANILHA, encoding="utf-8-sig"
+    )
+
+
+def ler_planilha(arquivo: IO[bytes], nome: str) -> Iterator[pd.DataFrame]:
+    """Blocos de até LOTE_PLANILHA linhas do arquivo (.xlsx ou .csv), já normalizados."""
+    blocos = _blocos_csv(arquivo) if nome.lower().endswith(".csv") else _blocos_xlsx(arquivo)
+    for bloco in blocos:
+        bloco.columns = [str(c).strip() for c in bloco.columns]
+        faltando = [c for c in COLUNAS_PLANILHA if c not in bloco.columns]
+        if faltando:
+            raise ValueError(f"A planilha deve conter: {', '.join(COLUNAS_PLANILHA)} (faltando: {', '.join(faltando)})")
+        yield _normalizar_planilha(bloco)
+
+
+def _numero(serie: pd.Series) -> pd.Series:
+    """
+    Converte números vindos da planilha: valores já numéricos (xlsx) ficam
+    como estão; textos aceitam o formato brasileiro ("1.234,56", "1.234")
+    e o com ponto decimal ("1234.56"). Vazios e inválidos viram nulo.
+    """
+    texto = serie.astype("string").str.strip().str.replace(r"\s", "", regex=True)
+    com_virgula = texto.str.contains(",", regex=False, na=False)
+    milhar = texto.str.fullmatch(r"-?\d{1,3}(\.\d{3})+", na=False)
+    br = com_virgula | milhar
+    texto = texto.mask(br, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(texto.replace("", pd.NA), errors="coerce")
+
+
+def _normalizar_planilha(bloco: pd.DataFrame) -> pd.DataFrame:
+    # Custo ou quantidade em branco ficam nulos (cadastro incompleto), não zero
+    df = bloco[list(COLUNAS_PLANILHA)].copy()
+    for coluna in ("seller_sku", "level1", "level2"):
+        df[coluna] = df[coluna].astype("string").str.strip().replace("", pd.NA)
+    df["custo_unitario"] = _numero(df["custo_unitario"]).round(2)
+    df["quantity"] = _numero(df["quantity"]).round().astype("Int64")
+    return df[df["seller_sku"].notna()]
+
+
+def importar_planilha(conn, blocos: Iterator[pd.DataFrame], corrigir: bool = False) -> Tuple[int, Set[int], int]:
+    """
+    Copia os blocos para uma tabela temporária com COPY e grava os SKUs que
+    diferem da versão vigente (a última linha de cada SKU na planilha vale):
+    corrige a versão vigente incompleta (ou sempre, com `corrigir`) e insere
+    uma versão nova dos demais.
+    Devolve (linhas lidas, contas com vendas dos SKUs alterados, SKUs alterados).
+    """
+    conn.execute(text("""
+        CREATE TEMP TABLE sku_staging (
+            linha          BIGSERIAL,
+            sku            TEXT NOT NULL,
+            level1         TEXT,
+            level2         TEXT,
+            custo_unitario NUMERIC(10, 2),
+            quantity       INTEGER
+        ) ON COMMIT DROP
+    """))
+
+    cursor = conn.connection.cursor()
+    lidas = 0
+    for bloco in blocos:
+        buffer = io.StringIO()
+        bloco.to_csv(buffer, index=False, header=False, na_rep="")
+        buffer.seek(0)
+        cursor.copy_expert(
+            "COPY sku_staging (sku, level1, level2, custo_unitario, quantity) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        lidas += len(bloco)
+
+    conn.execute(text("""
+        DELETE FROM sku_staging st
+        USING sku_staging depois
+        WHERE depois.sku = st.sku AND depois.linha > st.linha
+    """))
+    corrigidos = [r[0] for r in conn.execute(text(f"""
+        UPDATE sku k
+        SET level1 = st.level1, level2 = st.level2, custo_unitario = st.custo_unitario, quantity = st.quantity
+        FROM sku_staging st
+        WHERE k.sku = st.sku AND {SQL_CORRIGIVEL}
+          AND (k.level1, k.level2, k.custo_unitario, k.quantity)
+              IS DISTINCT FROM (st.level1, st.level2, st.custo_unitario, st.quantity)
+        RETURNING k.sku
+    """), {"corrigir": corrigir})]
+    novos = [r[0] for r in conn.execute(text("""
+        INSERT INTO sku (sku, level1, level2, custo_unitario, quantity, date_created)
+        SELECT st.sku, st.level1, st.level2, st.custo_unitario, st.quantity, NOW()
+        FROM sku_staging st
+        LEFT JOIN sku k ON k.sku = st.sku AND upper_inf(k.valid_during)
+        WHERE NOT (st.sku = ANY(CAST(:corrigidos AS text[])))
+          AND (k.level1, k.level2, k.custo_unitario, k.quantity)
+              IS DISTINCT FROM (st.level1, st.level2, st.custo_unitario, st.quantity)
+        RETURNING sku
+    """), {"corrigidos": corrigidos})]
+
+    skus = corrigidos + novos
+    return lidas, contas_dos_skus(conn, skus), len(skus)
@@ -0,0 +1,300 @@
+# catalogo.py
+"""
+Sincronização do catálogo de anúncios do vendedor na tabela `items`.
+
+As vendas só mostram os anúncios que venderam; para saber quais anúncios
+ficaram sem venda num período é preciso o catálogo completo. A sincronização:
+
+1. lista os ids com `/users/{id}/items/search` em modo scan (`search_type=scan`
+   + `scroll_id`, 100 ids por página, sem o limite de offset da busca comum);
+2. hidrata só os anúncios novos ou com dados mais velhos que
+   `REVALIDAR_APOS`, pelo multiget `/items?ids=` (20 por chamada, com
+   `attributes` para trazer só os campos usados), em paralelo;
+3. grava com upsert. Anúncios que saíram do scan são rebuscados para o
+   status deixar de ser "active". A versão de dados da conta só é
+   incrementada quando algum anúncio entrou ou teve o `last_updated` alterado.
+
+A mesma tabela é o cache de metadados de anúncio de todo o sistema
+(`obter_itens`): importação de vendas e backfill de SKU leem dela e só vão à
+API, em lotes de multiget, para anúncios ausentes ou mais velhos que
+`ITENS_TTL`. Assim cada anúncio custa uma chamada por TTL, e não uma por venda.
+
+Um catálogo de 50 mil anúncios custa 500 chamadas de scan e, no máximo,
+2.500 de multiget; as chamadas passam por um limitador de taxa e repetem
+com espera em 429/5xx.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import requests
+from dateutil import parser
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from db import get_engine
+from models import Item
+from settings import get_settings
+from versions import publicar_alteracao
+
+API = "https://api.mercadolibre.com"
+SCAN_LIMITE = 100
+MULTIGET_LIMITE = 20
+WORKERS = 8
+REQUISICOES_POR_MINUTO = 1200
+TENTATIVAS = 5
+REVALIDAR_APOS = timedelta(hours=6)
+ITENS_TTL = timedelta(hours=24)
+LOTE_GRAVACAO = 500
+
+ATRIBUTOS = (
+    "id,seller_id,seller_custom_field,title,status,price,available_quantity,sold_quantity,"
+    "listing_type_id,category_id,permalink,date_created,last_updated"
+)
+
+# Colunas devolvidas por `obter_itens`
+CAMPOS_CACHE = ("ml_user_id", "seller_sku", "title", "category_id", "available_quantity", "status")
+
+
+class LimiteTaxa:
+    """Espaça as requisições de todas as threads para no máximo `por_minuto`."""
+
+    def __init__(self, por_minuto: int):
+        self.intervalo = 60.0 / por_minuto
+        self._proxima = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self) -> None:
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+# Um limitador por processo, compartilhado por todos os clientes
+_limite = LimiteTaxa(REQUISICOES_POR_MINUTO)
+
+
+class ClienteML:
+    """GET (autenticado quando há token) na API do Mercado Livre, com limite de taxa, retentativas e renovação do token."""
+
+    def __init__(self, ml_user_id: Optional[str] = None, access_token: Optional[str] = None):
+        self.ml_user_id = ml_user_id
+        self.access_token = access_token
+        self.sessao = requests.Session()
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    def _renovar_token(self, token_usado: str) -> None:
+        if not self.ml_user_id:
+            raise RuntimeError("Token expirado e sem conta para renová-lo")
+        with self._lock:
+            if self.access_token != token_usado:
+                return  # outra thread já renovou
+            print(f"🔐 Token expirado para {self.ml_user_id}, tentando renovar...")
+            r = requests.post(
+                f"{get_settings().backend_url}/auth/refresh",
+                json={"user_id": self.ml_user_id},
+                timeout=30,
+            )
+            r.raise_for_status()
+            self.access_token = r.json()["access_token"]
+
+    def get(self, caminho: str, params: Optional[dict] = None) -> requests.Response:
+        for tentativa in range(TENTATIVAS):
+            _limite.aguardar()
+            token = self.access_token
+            resp = self.sessao.get(
+                f"{API}{caminho}",
+                params=params,
+                headers={"Authorization": f"Bearer {token}"} if token else None,
+                timeout=30,
+            )
+            self.chamadas += 1
+            if resp.status_code == 401 and token and tentativa == 0:
+                self._renovar_token(token)
+                continue
+            if resp.status_code == 429 or resp.status_code >= 500:
+                espera = float(resp.headers.get("Retry-After") or 2 ** tentativa)
+                print(f"⏳ {resp.status_code} em {caminho}; nova tentativa em {espera:.0f}s")
+                time.sleep(espera)
+                continue
+            resp.raise_for_status()
+            return resp
+        resp.raise_for_status()
+        return resp
+
+
+def listar_ids(cliente: ClienteML) -> List[str]:
+    """Todos os ids de anúncio do vendedor, pelo modo scan."""
+    ids: List[str] = []
+    params = {"search_type": "scan", "limit": SCAN_LIMITE}
+    while True:
+        dados = cliente.get(f"/users/{cliente.ml_user_id}/items/search", params).json()
+        resultados = dados.get("results", [])
+        if not resultados:
+            break
+        ids.extend(resultados)
+        params = {"search_type": "scan", "limit": SCAN_LIMITE, "scroll_id": dados.get("scroll_id")}
+    return list(dict.fromkeys(ids))
+
+
+def _lotes(valores: Sequence[str], tamanho: int) -> Iterator[Sequence[str]]:
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+
+def _data(valor: Optional[str]) -> Optional[datetime]:
+    return parser.isoparse(valor) if valor else None
+
+
+def _para_linha(corpo: dict, ml_user_id: Optional[int]) -> dict:
+    return {
+        "item_id":            corpo["id"],
+        "ml_user_id":         ml_user_id if ml_user_id is not None else corpo.get("seller_id"),
+        "seller_sku":         corpo.get("seller_sku") or corpo.get("seller_custom_field"),
+        "title":              corpo.get("title"),
+        "status":             corpo.get("status"),
+        "price":              corpo.get("price"),
+        "available_quantity": corpo.get("available_quantity"),
+        "sold_quantity":      corpo.get("sold_quantity"),
+        "listing_type_id":    corpo.get("listing_type_id"),
+        "category_id":        corpo.get("category_id"),
+        "permalink":          corpo.get("permalink"),
+        "date_created":       _data(corpo.get("date_created")),
+        "last_updated":       _data(corpo.get("last_updated")),
+    }
+
+
+def hidratar(cliente: ClienteML, ids: Sequence[str]) -> List[dict]:
+    """Dados dos anúncios `ids` pelo multiget, em paralelo."""
+    def buscar(lote: Sequence[str]) -> List[dict]:
+        resp = cliente.get("/items", {"ids": ",".join(lote), "attributes": ATRIBUTOS})
+        linhas = []
+        for entrada in resp.json():
+            if entrada.get("code") == 200 and entrada.get("body"):
+                linhas.append(_para_linha(entrada["body"], int(cliente.ml_user_id) if cliente.ml_user_id else None))
+            else:
+                print(f"⚠️ Multiget sem dados para um anúncio: {entrada.get('code')}")
+        return linhas
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        return [linha for linhas in executor.map(buscar, _lotes(list(ids), MULTIGET_LIMITE)) for linha in linhas]
+
+
+def _upsert(conn, linhas: List[dict]) -> None:
+    """Insere ou atualiza os anúncios, renovando o fetched_at."""
+    for lote in _lotes(linhas, LOTE_GRAVACAO):
+        stmt = insert(Item.__table__).values(list(lote))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["item_id"],
+            set_={**{c: stmt.excluded[c] for c in lote[0] if c != "item_id"}, "fetched_at": func.now()},
+        )
+        conn.execute(stmt)
+
+
+def obter_itens(
+    item_ids: Iterable[str],
+    access_token: Optional[str] = None,
+    ml_user_id: Optional[str] = None,
+    ttl: timedelta = ITENS_TTL,
+) -> Dict[str, dict]:
+    """
+    Metadados dos anúncios `item_ids` (seller_sku, title, category_id,
+    available_quantity, status...), lidos da tabela `items`. Os ausentes ou
+    buscados há mais de `ttl` são buscados de uma vez pelo multiget e
+    gravados na tabela. Ids que a API não devolveu ficam de fora do resultado.
+    """
+    ids = list(dict.fromkeys(str(i) for i in item_ids if i))
+    if not ids:
+        return {}
+
+    with get_engine().connect() as conn:
+        encontrados = {
+            linha["item_id"]: dict(linha)
+            for linha in conn.execute(
+                text(f"SELECT item_id, {', '.join(CAMPOS_CACHE)}, fetched_at FROM items WHERE item_id = ANY(:ids)"),
+                {"ids": ids},
+            ).mappings()
+        }
+
+    limite = datetime.now(timezone.utc) - ttl
+    faltando = [i for i in ids if i not in encontrados or encontrados[i]["fetched_at"] < limite]
+    if faltando:
+        cliente = ClienteML(ml_user_id, access_token)
+        linhas = hidratar(cliente, faltando)
+        if linhas:
+            with get_engine().begin() as conn:
+                _upsert(conn, linhas)
+        encontrados.update((linha["item_id"], linha) for linha in linhas)
+        print(f"🏷️ Cache de anúncios: {len(ids) - len(faltando)} acertos, {len(faltando)} buscados ({cliente.chamadas} chamadas)")
+    return encontrados
+
+
+def sincronizar_catalogo(ml_user_id: str, access_token: str, forcar: bool = False) -> Dict[str, int]:
+    """
+    Atualiza os anúncios da conta na tabela `items`. Com `forcar`, hidrata
+    todos os anúncios em vez de só os novos e os desatualizados.
+    """
+    inicio = time.perf_counter()
+    cliente = ClienteML(ml_user_id, access_token)
+    uid = int(ml_user_id)
+
+    ids = listar_ids(cliente)
+    with get_engine().connect() as conn:
+        conhecidos = {
+            item_id: (fetched_at, last_updated, status)
+            for item_id, fetched_at, last_updated, status in conn.execute(
+                text("SELECT item_id, fetched_at, last_updated, status FROM items WHERE ml_user_id = :uid"),
+                {"uid": uid},
+            )
+        }
+
+    limite = datetime.now(timezone.utc) - REVALIDAR_APOS
+    hidratar_ids = [i for i in ids if forcar or i not in conhecidos or conhecidos[i][0] < limite]
+    # Anúncios que saíram do scan continuam na tabela (o cache de metadados
+    # também os usa); os que constavam como ativos são rebuscados para o status ficar certo
+    no_scan = set(ids)
+    sairam = [i for i, (_, _, status) in conhecidos.items() if i not in no_scan and status == "active"]
+    linhas = hidratar(cliente, hidratar_ids + sairam) if hidratar_ids or sairam else []
+    # Os que saíram e o multiget não devolveu já não existem para a conta
+    devolvidos = {linha["item_id"] for linha in linhas}
+    perdidos = [i for i in sairam if i not in devolvidos]
+    # Novos ou alterados na API desde a última hidratação, mais os perdidos
+    alterados = len(perdidos) + sum(
+        1 for linha in linhas
+        if linha["item_id"] not in conhecidos or conhecidos[linha["item_id"]][1] != linha["last_updated"]
+    )
+
+    if linhas or perdidos:
+        with get_engine().begin() as conn:
+            if linhas:
+                _upsert(conn, linhas)
+            if perdidos:
+                conn.execute(
+                    text("UPDATE items SET status = 'removed', fetched_at = NOW() WHERE item_id = ANY(:ids)"),
+                    {"ids": perdidos},
+                )
+
+    if alterados:
+        publicar_alteracao(uid)
+
+    resumo = {
+        "anuncios": len(ids),
+        "hidratados": len(linhas),
+        "alterados": alterados,
+        "removidos": len(sairam),
+        "perdidos": len(perdidos),
+        "chamadas": cliente.chamadas,
+    }
+    print(
+        f"📚 Catálogo {ml_user_id}: {resumo['anuncios']} anúncios, {resumo['hidratados']} hidratados, "
+        f"{resumo['alterados']} alterados, {resumo['removidos']} fora do catálogo ativo, "
+        f"{resumo['perdidos']} marcados como removidos "
+        f"({resumo['chamadas']} chamadas, {time.perf_counter() - inicio:.1f}s)"
+    )
+    return resumo
@@ -0,0 +1,110 @@
+# custos.py
+"""
+Custo do SKU vigente na data de cada venda.
+
+O cadastro de SKU guarda histórico: cada alteração insere uma versão nova em
+`sku`, com a vigência em `valid_during` (ver migração 008); uma correção
+altera a versão vigente. As vendas não
+guardam mais cópia do custo; o frame de vendas recebe `custo_unitario`,
+`quantity_sku`, `level1` e `level2` da versão vigente em `date_adjusted`,
+com um `merge_asof` vetorizado por `seller_sku`.
+
+Assim, alterar um custo não reescreve `sales` nem muda o CMV de vendas
+antigas. Em SQL, o mesmo resultado está na view `sales_custo_vigente`.
+"""
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db import get_engine
+from schema import aplicar_schema
+
+COLUNAS_CUSTO = ("custo_unitario", "quantity_sku", "level1", "level2")
+
+Marca = Tuple[int, Optional[str]]
+
+# A primeira versão de cada SKU vale desde sempre (-infinity no banco)
+_DESDE_SEMPRE = pd.Timestamp.min
+
+_cache: Tuple[Optional[Marca], Optional[pd.DataFrame]] = (None, None)
+_cache_lock = threading.Lock()
+
+
+def marca_custos() -> Marca:
+    """Identifica o estado do cadastro: muda a cada versão inserida, corrigida ou removida."""
+    with get_engine().connect() as conn:
+        total, ultima = conn.execute(text("SELECT COUNT(*), MAX(updated_at) FROM sku")).one()
+    return int(total), None if ultima is None else str(ultima)
+
+
+def ler_custos() -> pd.DataFrame:
+    """Versões do cadastro (seller_sku, valido_desde no horário de SP, colunas de custo), por data."""
+    df = pd.read_sql(text("""
+        SELECT sku AS seller_sku,
+               CASE WHEN lower_inf(valid_during) OR NOT isfinite(lower(valid_during)) THEN NULL
+                    ELSE lower(valid_during) AT TIME ZONE 'America/Sao_Paulo'
+               END AS valido_desde,
+               custo_unitario,
+               quantity AS quantity_sku,
+               level1,
+               level2
+          FROM sku
+         WHERE valid_during IS NOT NULL AND NOT isempty(valid_during)
+    """), get_engine())
+    df = aplicar_schema(df)
+    df["seller_sku"] = df["seller_sku"].astype(str)
+    df["valido_desde"] = pd.to_datetime(df["valido_desde"]).astype("datetime64[ns]").fillna(_DESDE_SEMPRE)
+    return df.sort_values("valido_desde", kind="stable").reset_index(drop=True)
+
+
+def custos_vigentes() -> Tuple[Marca, pd.DataFrame]:
+    """Marca e versões do cadastro; as versões só são relidas quando a marca muda."""
+    global _cache
+    marca = marca_custos()
+    with _cache_lock:
+        if _cache[0] != marca:
+            _cache = (marca, ler_custos())
+        return _cache
+
+
+def resolver_custos(frame: pd.DataFrame, custos: pd.DataFrame, coluna_data: str = "date_adjusted") -> pd.DataFrame:
+    """
+    Preenche as colunas de custo de `frame` com a versão do cadastro vigente
+    na data de cada venda (`merge_asof` para trás, por seller_sku). Vendas
+    sem SKU, sem data ou sem cadastro ficam nulas.
+    """
+    skus = frame["seller_sku"]
+    datas = frame[coluna_data]
+    posicoes = np.flatnonzero((skus.notna() & datas.notna()).to_numpy())
+
+    esquerda = pd.DataFrame({
+        "_posicao": posicoes,
+        "seller_sku": skus.to_numpy()[posicoes].astype(str),
+        "_data": datas.to_numpy(dtype="datetime64[ns]")[posicoes],
+    }).sort_values("_data", kind="stable")
+    resolvido = pd.merge_asof(
+        esquerda,
+        custos,
+        left_on="_data",
+        right_on="valido_desde",
+        by="seller_sku",
+        direction="backward",
+    )
+    destino = resolvido["_posicao"].to_numpy()
+
+    colunas = {}
+    for coluna in COLUNAS_CUSTO:
+        origem = resolvido[coluna]
+        tipo = custos[coluna].dtype
+        if isinstance(tipo, pd.CategoricalDtype):
+            codigos = np.full(len(frame), -1, dtype="int32")
+            codigos[destino] = pd.Categorical(origem, categories=tipo.categories).codes
+            colunas[coluna] = pd.Categorical.from_codes(codigos, dtype=tipo)
+        else:
+            valores = np.full(len(frame), np.nan)
+            valores[destino] = origem.to_numpy(dtype="float64", na_value=np.nan)
+            colunas[coluna] = pd.Series(valores, index=frame.index).astype(tipo)
+    return frame.assign(**colunas)
@@ -1,33 +1,42 @@
 # database/db.py (otimizado)
-import os
+import threading
+from typing import Optional
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-from dotenv import load_dotenv
-from models import Base
-
-# Carrega variáveis de ambiente
-load_dotenv()
-DATABASE_URL = os.getenv("DB_URL")
-if not DATABASE_URL:
-    raise RuntimeError("❌ A variável de ambiente DB_URL não está definida.")
-
-# Criação do engine com otimização de pool
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=20,            # Número máximo de conexões abertas
-    max_overflow=0,          # Número de conexões extras permitidas
-    pool_pre_ping=True,      # Verifica se a conexão está ativa antes de usá-la
-    pool_timeout=30          # Tempo máximo de espera por uma conexão (segundos)
-)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
 
-# SessionLocal agora é uma sessão "scoped" para melhor gerenciamento em multithreading
-SessionLocal = scoped_session(
-    sessionmaker(autocommit=False, autoflush=False, bind=engine)
-)
+from settings import get_settings
+
+# O engine é criado no primeiro uso: importar este módulo não abre conexão
+# nem exige DB_URL. O schema é criado/atualizado por migrations.py.
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Engine único do processo, compartilhado por ORM e SQL direto."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            settings = get_settings()
+            settings.exigir("db_url")
+            _engine = create_engine(
+                settings.db_url,
+                pool_size=20,            # Número máximo de conexões abertas
+                max_overflow=10,         # Conexões extras em picos (antes vinham do engine do utils.py)
+                pool_pre_ping=True,      # Verifica se a conexão está ativa antes de usá-la
+                pool_timeout=30          # Tempo máximo de espera por uma conexão (segundos)
+            )
+    return _engine
 
-def init_db():
-    """Cria as tabelas no banco de dados."""
-    Base.metadata.create_all(bind=engine)
 
-# Inicializa as tabelas ao importar
-init_db()
+_fabrica_sessoes = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _nova_sessao() -> Session:
+    return _fabrica_sessoes(bind=get_engine())
+
+
+# SessionLocal agora é uma sessão "scoped" para melhor gerenciamento em multithreading
+SessionLocal = scoped_session(_nova_sessao)
@@ -0,0 +1,44 @@
+# estado.py
+"""
+Estado durável da aplicação, na tabela `app_state`.
+
+O cache persistente (`cache_store.py`) tem limite de tamanho e descarta as
+entradas menos usadas: serve para resultados que podem ser recalculados.
+O que não pode sumir sem custo (o modelo de famílias já ajustado, o cursor
+de um backfill em andamento) fica aqui, uma linha por chave, com o valor
+serializado do mesmo jeito que no cache.
+"""
+from contextlib import nullcontext
+from typing import Any
+
+from sqlalchemy import text
+
+from cache_store import desserializar, serializar
+from db import get_engine
+
+
+def _transacao(conn):
+    # Usa a transação de quem chamou, se houver; senão abre uma própria
+    return nullcontext(conn) if conn is not None else get_engine().begin()
+
+
+def carregar_estado(chave: str, padrao: Any = None, conn=None) -> Any:
+    """Valor guardado em `chave`, ou `padrao` se não houver."""
+    with _transacao(conn) as c:
+        valor = c.execute(text("SELECT value FROM app_state WHERE key = :chave"), {"chave": chave}).scalar()
+    return padrao if valor is None else desserializar(bytes(valor))
+
+
+def salvar_estado(chave: str, valor: Any, conn=None) -> None:
+    """Grava `valor` em `chave`."""
+    with _transacao(conn) as c:
+        c.execute(text("""
+            INSERT INTO app_state (key, value, updated_at)
+            VALUES (:chave, :valor, NOW())
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+        """), {"chave": chave, "valor": serializar(valor)})
+
+
+def remover_estado(chave: str, conn=None) -> None:
+    with _transacao(conn) as c:
+        c.execute(text("DELETE FROM app_state WHERE key = :chave"), {"chave": chave})
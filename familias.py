@@ -0,0 +1,164 @@
+# familias.py
+"""
+Famílias de produtos: agrupamento dos títulos dos anúncios.
+
+Os títulos distintos são vetorizados com TF-IDF e agrupados com
+`MiniBatchKMeans`. O modelo não é refeito a cada visualização:
+
+- o vocabulário (e o IDF) do vetorizador é fixado no primeiro ajuste;
+- a cada versão nova dos dados, só os títulos ainda não vistos são
+  vetorizados, passam por um `partial_fit` e recebem sua família;
+- só são lidos do banco os títulos de vendas com `updated_at` posterior à
+  marca d'água guardada com o modelo (com uma margem, como no snapshot);
+- o modelo (vetorizador, k-means, família de cada título já visto e a marca
+  d'água) fica na tabela `app_state` (ver estado.py), não no cache LRU, então
+  não é descartado por falta de espaço e é compartilhado entre processos;
+- o resultado por versão de dados fica no cache persistente.
+
+Os títulos já classificados mantêm a família, mesmo que os centróides se
+desloquem com os títulos novos.
+"""
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from cache_store import persistente
+from db import get_engine
+from estado import carregar_estado, salvar_estado
+
+N_FAMILIAS = 30
+LOTE = 2048
+TERMOS_POR_NOME = 3
+
+CHAVE_MODELO = "familias:modelo"
+MARGEM_WATERMARK = pd.Timedelta(minutes=10)
+
+_lock = threading.Lock()
+
+
+@dataclass
+class ModeloFamilias:
+    vetorizador: Any = None
+    kmeans: Any = None
+    rotulos: Dict[str, int] = field(default_factory=dict)
+    watermark: Optional[pd.Timestamp] = None
+
+    def _ajustar_vetorizador(self, titulos: List[str]) -> None:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.cluster import MiniBatchKMeans
+
+        self.vetorizador = TfidfVectorizer(
+            strip_accents="unicode",
+            token_pattern=r"(?u)\b[^\W\d_]{2,}\b",
+            max_features=20_000,
+            sublinear_tf=True,
+        ).fit(titulos)
+        self.kmeans = MiniBatchKMeans(
+            n_clusters=min(N_FAMILIAS, len(titulos)),
+            batch_size=LOTE,
+            n_init=3,
+            random_state=0,
+        )
+
+    def atualizar(self, titulos: Iterable[str]) -> int:
+        """Classifica os títulos ainda não vistos, atualizando os centróides. Devolve quantos eram novos."""
+        novos = list(dict.fromkeys(t for t in titulos if t not in self.rotulos))
+        if not novos:
+            return 0
+        if self.vetorizador is None:
+            self._ajustar_vetorizador(novos)
+
+        matriz = self.vetorizador.transform(novos)
+        for inicio in range(0, matriz.shape[0], LOTE):
+            lote = matriz[inicio:inicio + LOTE]
+            # O primeiro partial_fit precisa de pelo menos n_clusters amostras
+            if hasattr(self.kmeans, "cluster_centers_") or lote.shape[0] >= self.kmeans.n_clusters:
+                self.kmeans.partial_fit(lote)
+        self.rotulos.update(zip(novos, self.kmeans.predict(matriz).tolist()))
+        return len(novos)
+
+    def nomes(self) -> List[str]:
+        """Nome de cada família: os termos de maior peso no centróide."""
+        termos = self.vetorizador.get_feature_names_out()
+        centros = self.kmeans.cluster_centers_
+        return [
+            " ".join(termos[np.argsort(-c)[:TERMOS_POR_NOME]])
+            for c in centros
+        ]
+
+
+def _carregar_modelo() -> ModeloFamilias:
+    return carregar_estado(CHAVE_MODELO) or ModeloFamilias()
+
+
+def _titulos_alterados(watermark: Optional[pd.Timestamp]) -> Tuple[List[str], Optional[pd.Timestamp]]:
+    """Títulos das vendas alteradas depois de `watermark` (todos, se None) e o maior updated_at lido."""
+    desde = None if watermark is None else watermark - MARGEM_WATERMARK
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT item_title, MAX(updated_at)
+              FROM sales
+             WHERE item_title IS NOT NULL
+               AND (CAST(:desde AS timestamptz) IS NULL OR updated_at > :desde)
+             GROUP BY item_title
+        """), {"desde": desde}).all()
+    titulos = [str(r[0]) for r in rows]
+    maior = max((pd.Timestamp(r[1]) for r in rows if r[1] is not None), default=None)
+    if maior is None or (watermark is not None and watermark >= maior):
+        return titulos, watermark
+    return titulos, maior
+
+
+@persistente("familias:titulos")
+def familias_por_titulo(versoes: tuple) -> pd.DataFrame:
+    """
+    Família de cada título já visto nas vendas (colunas item_title, familia,
+    nome_familia). `versoes` só compõe a chave do cache.
+    """
+    with _lock:
+        modelo = _carregar_modelo()
+        alterados, watermark = _titulos_alterados(modelo.watermark)
+        novos = modelo.atualizar(alterados)
+        if novos or watermark != modelo.watermark:
+            modelo.watermark = watermark
+            salvar_estado(CHAVE_MODELO, modelo)
+        if novos:
+            print(f"🧩 Famílias de produtos: {novos} título(s) novo(s) classificado(s)")
+        if modelo.kmeans is None:
+            return pd.DataFrame(columns=["item_title", "familia", "nome_familia"])
+        nomes = modelo.nomes()
+        titulos = list(modelo.rotulos)
+        familias = np.array(list(modelo.rotulos.values()), dtype="int32")
+
+    return pd.DataFrame({
+        "item_title": titulos,
+        "familia": familias,
+        "nome_familia": [nomes[f] for f in familias],
+    })
+
+
+def faturamento_por_familia(
+    df: pd.DataFrame,
+    familias: pd.DataFrame,
+    coluna_valor: str = "total_amount",
+) -> Optional[pd.DataFrame]:
+    """Faturamento, pedidos e nº de títulos por família nas vendas de `df`."""
+    if familias.empty:
+        return None
+    por_titulo = (
+        df.groupby("item_title", observed=True)
+        .agg(faturamento=(coluna_valor, "sum"), pedidos=(coluna_valor, "size"))
+        .reset_index()
+    )
+    por_titulo["item_title"] = por_titulo["item_title"].astype(str)
+    juntos = por_titulo.merge(familias, on="item_title", how="inner")
+    return (
+        juntos.groupby(["familia", "nome_familia"])
+        .agg(faturamento=("faturamento", "sum"), pedidos=("pedidos", "sum"), titulos=("item_title", "size"))
+        .reset_index()
+        .sort_values("faturamento", ascending=False)
+    )
@@ -0,0 +1,134 @@
+# indice.py
+"""
+Índice de filtros sobre o frame de vendas do snapshot.
+
+As páginas filtram sempre pelas mesmas colunas (conta, status, hierarquias,
+tipo logístico) e por intervalo de datas. Em vez de recalcular máscaras
+booleanas sobre o frame inteiro a cada rerun, o índice é montado uma vez
+por snapshot:
+
+- uma permutação que ordena as linhas por `date_adjusted`, de modo que um
+  intervalo de datas vira um `searchsorted` (fatia contígua);
+- para cada valor de cada coluna indexada, as posições (na ordem por data)
+  das linhas com esse valor.
+
+Um filtro combinado parte da fatia de datas e intersecta só as posições dos
+valores escolhidos que caem nela, sem varrer o frame.
+"""
+import datetime as dt
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_INDICE = ("nickname", "status", "level1", "level2", "shipment_logistic_type")
+
+Data = Union[dt.date, pd.Timestamp, None]
+
+_NAT = np.iinfo("int64").min
+_SEM_DATA = np.iinfo("int64").max
+
+
+def _dia_ns(data: Data, deslocamento: int = 0) -> int:
+    return int((np.datetime64(pd.Timestamp(data).date(), "D") + deslocamento).astype("datetime64[ns]").view("int64"))
+
+
+class IndiceFiltros:
+    """Posições por valor e ordem por data, montadas uma vez sobre `frame`."""
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        coluna_data: str = "date_adjusted",
+        colunas: Sequence[str] = COLUNAS_INDICE,
+    ):
+        self.frame = frame
+        datas = frame[coluna_data].to_numpy(dtype="datetime64[ns]").view("int64")
+        # NaT vai para o fim: nunca cai num intervalo de datas
+        datas = np.where(datas == _NAT, _SEM_DATA, datas)
+        self._ordem = np.argsort(datas, kind="stable")
+        self._datas = datas[self._ordem]
+        self._codigos: Dict[str, np.ndarray] = {}
+        self._categorias: Dict[str, pd.Index] = {}
+        self._posicoes: Dict[str, Dict[Any, np.ndarray]] = {}
+        for coluna in colunas:
+            if coluna in frame.columns:
+                self._indexar(coluna)
+
+    def _indexar(self, coluna: str) -> None:
+        serie = self.frame[coluna]
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype("category")
+        codigos = serie.cat.codes.to_numpy()[self._ordem]
+        categorias = serie.cat.categories
+
+        # Um argsort estável agrupa as posições por código, já em ordem crescente
+        agrupadas = np.argsort(codigos, kind="stable")
+        limites = np.cumsum(np.bincount(codigos + 1, minlength=len(categorias) + 1))
+        self._posicoes[coluna] = {
+            valor: agrupadas[limites[i]:limites[i + 1]]
+            for i, valor in enumerate(categorias)
+        }
+        # Linhas com valor nulo ficam sob a chave None
+        self._posicoes[coluna][None] = agrupadas[:limites[0]]
+        self._codigos[coluna] = codigos
+        self._categorias[coluna] = categorias
+
+    def __len__(self) -> int:
+        return len(self._ordem)
+
+    def intervalo(self, de: Data = None, ate: Data = None) -> slice:
+        """Fatia (na ordem por data) das vendas com data entre `de` e `ate`, inclusive."""
+        inicio = 0 if de is None else int(np.searchsorted(self._datas, _dia_ns(de), "left"))
+        fim = (
+            int(np.searchsorted(self._datas, _SEM_DATA, "left")) if ate is None
+            else int(np.searchsorted(self._datas, _dia_ns(ate, 1), "left"))
+        )
+        return slice(inicio, max(inicio, fim))
+
+    def selecionar(self, de: Data = None, ate: Data = None, **filtros: Optional[Iterable[Any]]) -> np.ndarray:
+        """
+        Posições (na ordem por data) das vendas entre `de` e `ate` cujo valor
+        em cada coluna de `filtros` está entre os valores informados (None
+        seleciona os nulos). Filtros None ou vazios são ignorados.
+        """
+        fatia = self.intervalo(de, ate)
+        tamanho = fatia.stop - fatia.start
+        manter: Optional[np.ndarray] = None
+        for coluna, valores in filtros.items():
+            if not valores:
+                continue
+            marcadas = np.zeros(tamanho, dtype=bool)
+            posicoes = self._posicoes[coluna]
+            for valor in valores:
+                pos = posicoes.get(valor)
+                if pos is None:
+                    continue
+                a, b = np.searchsorted(pos, [fatia.start, fatia.stop])
+                marcadas[pos[a:b] - fatia.start] = True
+            manter = marcadas if manter is None else manter & marcadas
+        if manter is None:
+            return np.arange(fatia.start, fatia.stop)
+        return np.flatnonzero(manter) + fatia.start
+
+    def filtrar(self, de: Data = None, ate: Data = None, **filtros: Optional[Iterable[Any]]) -> pd.DataFrame:
+        """Linhas selecionadas por `selecionar`, em ordem de data."""
+        return self.linhas(self.selecionar(de, ate, **filtros))
+
+    def linhas(self, posicoes: np.ndarray) -> pd.DataFrame:
+        return self.frame.take(self._ordem[posicoes])
+
+    def valores(self, coluna: str, posicoes: Optional[np.ndarray] = None) -> List[Any]:
+        """Valores de `coluna` presentes nas `posicoes` (todas, se None), em ordem de categoria."""
+        codigos = self._codigos[coluna] if posicoes is None else self._codigos[coluna][posicoes]
+        presentes = np.flatnonzero(np.bincount(codigos + 1, minlength=len(self._categorias[coluna]) + 1)[1:])
+        return self._categorias[coluna][presentes].tolist()
+
+    def datas(self, posicoes: Optional[np.ndarray] = None) -> Tuple[Optional[dt.date], Optional[dt.date]]:
+        """Primeira e última data (dt.date) entre as `posicoes`, ou (None, None)."""
+        datas = self._datas if posicoes is None else self._datas[posicoes]
+        datas = datas[datas != _SEM_DATA]
+        if not len(datas):
+            return None, None
+        # As posições estão em ordem de data
+        return pd.Timestamp(datas[0]).date(), pd.Timestamp(datas[-1]).date()
@@ -0,0 +1,66 @@
+# loaders.py
+"""
+Consultas auxiliares das telas, guardadas no cache persistente.
+
+O argumento `versoes` (ver `versions.py`) não entra nas consultas: ele só
+compõe a chave do cache, de modo que o resultado é recalculado quando os
+dados das contas mudam.
+"""
+from typing import List
+
+import pandas as pd
+from sqlalchemy import text
+
+from cache_store import persistente
+from db import get_engine
+
+
+@persistente("skus:resumo")
+def carregar_resumo_skus(versoes: tuple) -> pd.DataFrame:
+    """Resumo por SKU das vendas com o cadastro vigente de cada SKU (tela Gestão de SKU)."""
+    return pd.read_sql(text("""
+        SELECT
+            v.seller_sku,
+            k.level1,
+            k.level2,
+            k.custo_unitario,
+            k.quantity AS quantity_sku,
+            v.qtde_vendas
+        FROM (
+            SELECT seller_sku, COUNT(DISTINCT item_id) AS qtde_vendas
+            FROM sales
+            WHERE seller_sku IS NOT NULL
+            GROUP BY seller_sku
+        ) v
+        LEFT JOIN sku k ON k.sku = v.seller_sku AND upper_inf(k.valid_during)
+    """), get_engine())
+
+
+@persistente("contas:nicknames")
+def carregar_nicknames(versoes: tuple) -> List[str]:
+    """Apelidos das contas cadastradas, em ordem alfabética."""
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("SELECT nickname FROM user_tokens ORDER BY nickname")).fetchall()
+    return [str(r[0]) for r in rows]
+
+
+@persistente("anuncios:sem_venda")
+def carregar_anuncios_sem_venda(versoes: tuple, dia_ini: int, dia_fim: int) -> pd.DataFrame:
+    """
+    Anúncios ativos do catálogo (tabela items) sem nenhuma venda entre
+    `dia_ini` e `dia_fim` (yyyymmdd). O NOT EXISTS usa o índice
+    (item_id, sale_day) de sales.
+    """
+    return pd.read_sql(text("""
+        SELECT i.item_id, i.title, u.nickname, i.price, i.available_quantity,
+               i.sold_quantity, i.date_created, i.permalink
+        FROM items i
+        LEFT JOIN user_tokens u ON u.ml_user_id = i.ml_user_id
+        WHERE i.status = 'active'
+          AND NOT EXISTS (
+              SELECT 1 FROM sales s
+              WHERE s.item_id = i.item_id
+                AND s.sale_day BETWEEN :dia_ini AND :dia_fim
+          )
+        ORDER BY i.date_created
+    """), get_engine(), params={"dia_ini": dia_ini, "dia_fim": dia_fim})
@@ -0,0 +1,340 @@
+# migrations.py
+"""
+Migrações do schema do banco.
+
+Antes, importar `db.py` rodava `create_all` e o DDL complementar em todo
+processo (workers do Uvicorn, Streamlit, scripts). Agora o schema é
+atualizado só quando este script roda (`python migrations.py`, chamado pelo
+start.sh antes de subir os serviços).
+
+Cada migração tem um id ordenável e é aplicada uma única vez; os ids
+aplicados ficam na tabela `schema_migrations`. Tudo roda numa transação
+com advisory lock, então duas instâncias subindo juntas não disputam o DDL.
+Migrações novas entram no fim da lista com o decorador `@migracao`.
+"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from models import Base
+
+# Chave arbitrária do pg_advisory_xact_lock das migrações
+LOCK_MIGRACOES = 7_240_001
+
+
+@dataclass(frozen=True)
+class Migracao:
+    id: str
+    descricao: str
+    aplicar: Callable[[Connection], None]
+
+
+MIGRACOES: List[Migracao] = []
+
+
+def migracao(id: str, descricao: str) -> Callable:
+    def registrar(func: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        MIGRACOES.append(Migracao(id, descricao, func))
+        return func
+    return registrar
+
+
+def _executar(conn: Connection, *ddls: str) -> None:
+    for ddl in ddls:
+        conn.execute(text(ddl))
+
+
+@migracao("001", "Tabelas base (user_tokens, sales)")
+def _tabelas_base(conn: Connection) -> None:
+    Base.metadata.create_all(
+        bind=conn,
+        tables=[Base.metadata.tables["user_tokens"], Base.metadata.tables["sales"]],
+    )
+
+
+@migracao("002", "sales.updated_at mantido por trigger")
+def _sales_updated_at(conn: Connection) -> None:
+    _executar(
+        conn,
+        "ALTER TABLE sales ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()",
+        "CREATE INDEX IF NOT EXISTS ix_sales_updated_at ON sales (updated_at)",
+        """
+        CREATE OR REPLACE FUNCTION sales_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_sales_updated_at ON sales",
+        """
+        CREATE TRIGGER trg_sales_updated_at
+        BEFORE INSERT OR UPDATE ON sales
+        FOR EACH ROW EXECUTE FUNCTION sales_touch_updated_at()
+        """,
+    )
+
+
+@migracao("003", "Tabela data_versions")
+def _data_versions(conn: Connection) -> None:
+    Base.metadata.tables["data_versions"].create(bind=conn, checkfirst=True)
+
+
+@migracao("004", "Chaves locais de data (sale_day, sale_hour, sale_weekday, sla_day)")
+def _chaves_locais(conn: Connection) -> None:
+    # date_closed é gravado em UTC sem fuso (ver sales.py); o dashboard agrupa
+    # por date_adjusted, o mesmo instante no horário de São Paulo. As chaves
+    # saem de date_adjusted e, quando ele ainda não está preenchido na linha,
+    # da mesma conversão feita a partir de date_closed. O SLA é timestamptz.
+    # Dias no formato yyyymmdd e dia da semana 0 = segunda ... 6 = domingo.
+    _executar(
+        conn,
+        """
+        ALTER TABLE sales
+            ADD COLUMN IF NOT EXISTS sale_day     INTEGER,
+            ADD COLUMN IF NOT EXISTS sale_hour    SMALLINT,
+            ADD COLUMN IF NOT EXISTS sale_weekday SMALLINT,
+            ADD COLUMN IF NOT EXISTS sla_day      INTEGER
+        """,
+        """
+        CREATE OR REPLACE FUNCTION sales_chaves_locais() RETURNS trigger AS $$
+        DECLARE
+            local TIMESTAMP := COALESCE(
+                NEW.date_adjusted,
+                (NEW.date_closed AT TIME ZONE 'UTC') AT TIME ZONE 'America/Sao_Paulo'
+            );
+        BEGIN
+            NEW.sale_day     := to_char(local, 'YYYYMMDD')::int;
+            NEW.sale_hour    := EXTRACT(HOUR FROM local)::smallint;
+            NEW.sale_weekday := EXTRACT(ISODOW FROM local)::smallint - 1;
+            NEW.sla_day      := to_char(NEW.shipment_delivery_sla AT TIME ZONE 'America/Sao_Paulo', 'YYYYMMDD')::int;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_sales_chaves_locais ON sales",
+        """
+        CREATE TRIGGER trg_sales_chaves_locais
+        BEFORE INSERT OR UPDATE OF date_closed, shipment_delivery_sla ON sales
+        FOR EACH ROW EXECUTE FUNCTION sales_chaves_locais()
+        """,
+        # Preenche as linhas existentes com a mesma regra do trigger
+        """
+        UPDATE sales
+           SET sale_day     = to_char(l.local, 'YYYYMMDD')::int,
+               sale_hour    = EXTRACT(HOUR FROM l.local)::smallint,
+               sale_weekday = EXTRACT(ISODOW FROM l.local)::smallint - 1,
+               sla_day      = to_char(sales.shipment_delivery_sla AT TIME ZONE 'America/Sao_Paulo', 'YYYYMMDD')::int
+          FROM (
+              SELECT id,
+                     COALESCE(date_adjusted, (date_closed AT TIME ZONE 'UTC') AT TIME ZONE 'America/Sao_Paulo') AS local
+                FROM sales
+          ) l
+         WHERE sales.id = l.id
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_sales_user_sale_day ON sales (ml_user_id, sale_day)",
+        "CREATE INDEX IF NOT EXISTS ix_sales_sla_day ON sales (sla_day)",
+    )
+
+
+@migracao("005", "Tabela items (catálogo de anúncios)")
+def _items(conn: Connection) -> None:
+    Base.metadata.tables["items"].create(bind=conn, checkfirst=True)
+    _executar(
+        conn,
+        "CREATE INDEX IF NOT EXISTS ix_items_user_status ON items (ml_user_id, status)",
+        # Anti-join "anúncios sem venda no período" (ver loaders.carregar_anuncios_sem_venda)
+        "CREATE INDEX IF NOT EXISTS ix_sales_item_sale_day ON sales (item_id, sale_day)",
+    )
+
+
+@migracao("006", "items como cache de metadados (seller_sku, fetched_at)")
+def _items_cache(conn: Connection) -> None:
+    _executar(
+        conn,
+        "ALTER TABLE items ADD COLUMN IF NOT EXISTS seller_sku VARCHAR",
+        # A 005 já cria items com fetched_at; só bancos com a coluna antiga são renomeados
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = current_schema() AND table_name = 'items' AND column_name = 'synced_at'
+            ) THEN
+                ALTER TABLE items RENAME COLUMN synced_at TO fetched_at;
+            END IF;
+        END
+        $$
+        """,
+    )
+
+
+@migracao("007", "Índice de sales.seller_sku")
+def _sales_seller_sku(conn: Connection) -> None:
+    # Contas com vendas de um SKU alterado (ver cadastro_sku.contas_dos_skus)
+    _executar(conn, "CREATE INDEX IF NOT EXISTS ix_sales_seller_sku ON sales (seller_sku)")
+
+
+@migracao("008", "Vigência do cadastro de SKU (sku.valid_during tstzrange + GiST)")
+def _sku_vigencia(conn: Connection) -> None:
+    # Cada versão do cadastro vale de date_created até a próxima versão do
+    # mesmo SKU; a primeira versão vale desde sempre. Salvar um cadastro passa
+    # a inserir uma versão nova (o trigger fecha a anterior), sem tocar em
+    # sales; uma correção altera a versão vigente (ver cadastro_sku.salvar_skus).
+    _executar(
+        conn,
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        # Bancos novos ainda não têm o cadastro de SKU
+        """
+        CREATE TABLE IF NOT EXISTS sku (
+            id             BIGSERIAL PRIMARY KEY,
+            sku            VARCHAR NOT NULL,
+            level1         VARCHAR,
+            level2         VARCHAR,
+            custo_unitario NUMERIC(10, 2),
+            quantity       INTEGER,
+            date_created   TIMESTAMP DEFAULT NOW()
+        )
+        """,
+        # O histórico exige mais de uma linha por SKU: remove a unicidade de sku.sku
+        """
+        DO $$
+        DECLARE
+            r RECORD;
+            coluna SMALLINT := (
+                SELECT attnum FROM pg_attribute WHERE attrelid = 'sku'::regclass AND attname = 'sku'
+            );
+        BEGIN
+            FOR r IN
+                SELECT conname FROM pg_constraint
+                 WHERE conrelid = 'sku'::regclass AND contype = 'u' AND conkey = ARRAY[coluna]
+            LOOP
+                EXECUTE format('ALTER TABLE sku DROP CONSTRAINT %I', r.conname);
+            END LOOP;
+            FOR r IN
+                SELECT indexrelid::regclass::text AS nome FROM pg_index
+                 WHERE indrelid = 'sku'::regclass AND indisunique AND NOT indisprimary
+                   AND indnatts = 1 AND indkey[0] = coluna
+            LOOP
+                EXECUTE format('DROP INDEX %s', r.nome);
+            END LOOP;
+        END
+        $$
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_sku_sku_date_created ON sku (sku, date_created)",
+        "ALTER TABLE sku ADD COLUMN IF NOT EXISTS valid_during TSTZRANGE",
+        # Muda a cada versão inserida ou corrigida (ver custos.marca_custos)
+        "ALTER TABLE sku ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()",
+        "DROP TRIGGER IF EXISTS trg_sku_updated_at ON sku",
+        """
+        CREATE TRIGGER trg_sku_updated_at
+        BEFORE INSERT OR UPDATE ON sku
+        FOR EACH ROW EXECUTE FUNCTION sales_touch_updated_at()
+        """,
+        """
+        UPDATE sku k
+           SET valid_during = v.faixa
+          FROM (
+              SELECT ctid AS linha,
+                     tstzrange(
+                         CASE WHEN row_number() OVER w = 1 THEN '-infinity'::timestamptz
+                              ELSE COALESCE(date_created::timestamptz, '-infinity') END,
+                         lead(COALESCE(date_created::timestamptz, '-infinity')) OVER w
+                     ) AS faixa
+                FROM sku
+              WINDOW w AS (PARTITION BY sku ORDER BY date_created NULLS FIRST, ctid)
+          ) v
+         WHERE k.ctid = v.linha
+        """,
+        """
+        CREATE OR REPLACE FUNCTION sku_fecha_vigencia() RETURNS trigger AS $$
+        DECLARE
+            inicio TIMESTAMPTZ := COALESCE(NEW.date_created::timestamptz, clock_timestamp());
+        BEGIN
+            UPDATE sku
+               SET valid_during = tstzrange(lower(valid_during), GREATEST(lower(valid_during), inicio))
+             WHERE sku = NEW.sku AND upper_inf(valid_during);
+            IF FOUND THEN
+                NEW.valid_during := tstzrange(inicio, NULL);
+            ELSE
+                NEW.valid_during := tstzrange('-infinity', NULL);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_sku_vigencia ON sku",
+        """
+        CREATE TRIGGER trg_sku_vigencia
+        BEFORE INSERT ON sku
+        FOR EACH ROW EXECUTE FUNCTION sku_fecha_vigencia()
+        """,
+        # Também é o índice GiST das buscas "versão vigente na data da venda"
+        """
+        ALTER TABLE sku ADD CONSTRAINT sku_vigencia_sem_sobreposicao
+            EXCLUDE USING gist (sku WITH =, valid_during WITH &&)
+        """,
+        # Custo vigente na data de cada venda, para consultas em SQL; usa
+        # date_adjusted, como o dashboard (custos.resolver_custos)
+        """
+        CREATE OR REPLACE VIEW sales_custo_vigente AS
+        SELECT s.order_id,
+               k.custo_unitario,
+               k.quantity AS quantity_sku,
+               k.level1,
+               k.level2
+          FROM sales s
+          LEFT JOIN sku k
+            ON k.sku = s.seller_sku
+           AND k.valid_during @> (s.date_adjusted AT TIME ZONE 'America/Sao_Paulo')
+        """,
+    )
+
+
+@migracao("009", "Tabela app_state (estado durável: modelos, cursores de jobs)")
+def _app_state(conn: Connection) -> None:
+    # Fora do cache LRU, que pode descartar entradas (ver estado.py)
+    Base.metadata.tables["app_state"].create(bind=conn, checkfirst=True)
+
+
+def pendentes(conn: Connection) -> List[Migracao]:
+    aplicadas = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+    return [m for m in sorted(MIGRACOES, key=lambda m: m.id) if m.id not in aplicadas]
+
+
+def migrar(engine: Optional[Engine] = None) -> List[str]:
+    """Aplica as migrações pendentes e devolve os ids aplicados."""
+    if engine is None:
+        from db import get_engine
+        engine = get_engine()
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": LOCK_MIGRACOES})
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                id          TEXT PRIMARY KEY,
+                descricao   TEXT NOT NULL,
+                aplicada_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """))
+        aplicadas = []
+        for m in pendentes(conn):
+            print(f"🛠️ Migração {m.id}: {m.descricao}")
+            m.aplicar(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, descricao) VALUES (:id, :descricao)"),
+                {"id": m.id, "descricao": m.descricao},
+            )
+            aplicadas.append(m.id)
+
+    if aplicadas:
+        print(f"✅ {len(aplicadas)} migração(ões) aplicada(s).")
+    else:
+        print("✅ Schema já está atualizado.")
+    return aplicadas
+
+
+if __name__ == "__main__":
+    migrar()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger, Numeric
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Float, BigInteger, Numeric, LargeBinary, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -55,4 +55,48 @@ class Sale(Base):
     shipment_buffering_date = Column(DateTime, nullable=True)
     shipment_delivery_sla = Column(DateTime(timezone=True))
 
+    # 🔽 Chaves de data no horário local (mantidas por trigger no banco, ver migrations.py)
+    sale_day         = Column(Integer, nullable=True)       # yyyymmdd de date_adjusted (horário de SP)
+    sale_hour        = Column(SmallInteger, nullable=True)  # 0..23
+    sale_weekday     = Column(SmallInteger, nullable=True)  # 0 = segunda ... 6 = domingo
+    sla_day          = Column(Integer, nullable=True, index=True)  # yyyymmdd do SLA em São Paulo
 
+    # 🔽 Controle de alteração (mantido por trigger no banco)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    ml_user_id = Column(BigInteger, primary_key=True)
+    version    = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class Item(Base):
+    """Catálogo de anúncios do vendedor e cache de metadados de anúncio (ver catalogo.py)."""
+    __tablename__ = "items"
+
+    item_id            = Column(String, primary_key=True)
+    ml_user_id         = Column(BigInteger, index=True, nullable=False)
+    seller_sku         = Column(String, nullable=True)
+    title              = Column(String, nullable=True)
+    status             = Column(String, nullable=True)
+    price              = Column(Float, nullable=True)
+    available_quantity = Column(Integer, nullable=True)
+    sold_quantity      = Column(Integer, nullable=True)
+    listing_type_id    = Column(String, nullable=True)
+    category_id        = Column(String, nullable=True)
+    permalink          = Column(String, nullable=True)
+    date_created       = Column(DateTime(timezone=True), nullable=True)
+    last_updated       = Column(DateTime(timezone=True), nullable=True)  # da API; só muda quando o anúncio muda
+    fetched_at         = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # TTL do cache
+
+
+class AppState(Base):
+    """Estado durável de processos longos (modelos, cursores de jobs), fora do cache LRU (ver estado.py)."""
+    __tablename__ = "app_state"
+
+    key        = Column(String, primary_key=True)
+    value      = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
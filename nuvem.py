@@ -0,0 +1,128 @@
+# nuvem.py
+"""
+Nuvem de palavras dos títulos, gerada fora da thread da página.
+
+Antes, a cada rerun da Gestão de Anúncios todos os títulos eram juntados
+numa única string e o WordCloud tokenizava e rasterizava tudo de forma
+síncrona, mesmo quando só um widget sem relação tinha mudado. Agora:
+
+- a página passa uma função que calcula as frequências das palavras
+  (`titulos.frequencia_palavras`), chamada só quando o PNG não está no cache;
+- as frequências e a imagem (`generate_from_frequencies`) são calculadas
+  numa thread do pool `GeradorNuvens`, enquanto o resto da página é desenhado;
+- o PNG fica no cache persistente, com chave (período, contas, versões dos
+  dados), e só é refeito quando um desses muda.
+"""
+import hashlib
+import io
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from cache_store import obter_cache
+
+# Mesmo limite padrão do WordCloud
+MAX_PALAVRAS = 200
+
+
+def _palavras_visiveis(frequencias: Dict[str, float]) -> Dict[str, float]:
+    """Remove stopwords e números, como o `WordCloud.generate` fazia, e fica com as mais frequentes."""
+    from wordcloud import STOPWORDS
+
+    visiveis = {
+        p: f for p, f in frequencias.items()
+        if p not in STOPWORDS and not p.isdigit()
+    }
+    return dict(sorted(visiveis.items(), key=lambda item: item[1], reverse=True)[:MAX_PALAVRAS])
+
+
+def _renderizar(frequencias: Dict[str, float]) -> bytes:
+    from wordcloud import WordCloud
+
+    wc = WordCloud(width=600, height=300, background_color="white")
+    wc.generate_from_frequencies(frequencias)
+    buffer = io.BytesIO()
+    wc.to_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class GeradorNuvens:
+    """Gera nuvens em threads de fundo, com cache persistente dos PNGs e métricas de acerto/tempo."""
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nuvem")
+        self._pendentes: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.geradas = 0
+        self._tempos = deque(maxlen=50)
+
+    @staticmethod
+    def _chave(chave: Hashable) -> str:
+        return "nuvem:" + hashlib.sha1(repr(chave).encode()).hexdigest()
+
+    def solicitar(self, chave: Hashable, frequencias: Callable[[], Dict[str, float]]) -> Future:
+        """
+        Future com o PNG da nuvem de `chave`. Já vem resolvido quando o PNG
+        está no cache; senão a geração é agendada (uma vez por chave, mesmo
+        com várias sessões pedindo ao mesmo tempo) e só então `frequencias`
+        é chamada, na thread de fundo.
+        """
+        chave_cache = self._chave(chave)
+        png = obter_cache().carregar(chave_cache)
+        if png is not None:
+            with self._lock:
+                self.acertos += 1
+            futuro: Future = Future()
+            futuro.set_result(png)
+            return futuro
+
+        with self._lock:
+            futuro = self._pendentes.get(chave_cache)
+            if futuro is None:
+                futuro = self._executor.submit(self._gerar, chave_cache, frequencias)
+                self._pendentes[chave_cache] = futuro
+            return futuro
+
+    def _gerar(self, chave_cache: str, frequencias: Callable[[], Dict[str, float]]) -> Optional[bytes]:
+        inicio = time.perf_counter()
+        try:
+            visiveis = _palavras_visiveis(frequencias())
+            png = _renderizar(visiveis) if visiveis else None
+            if png is not None:
+                obter_cache().salvar(chave_cache, png)
+            return png
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self._pendentes.pop(chave_cache, None)
+                self.geradas += 1
+                self._tempos.append(duracao)
+            print(f"☁️ Nuvem de palavras gerada em {duracao:.2f}s")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.acertos + self.geradas
+            tempos = list(self._tempos)
+        return {
+            "acertos": self.acertos,
+            "geradas": self.geradas,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+            "ultima_ms": tempos[-1] * 1000 if tempos else None,
+            "media_ms": sum(tempos) / len(tempos) * 1000 if tempos else None,
+        }
+
+
+_gerador: Optional[GeradorNuvens] = None
+_gerador_lock = threading.Lock()
+
+
+def gerador_nuvens() -> GeradorNuvens:
+    """Gerador único do processo."""
+    global _gerador
+    with _gerador_lock:
+        if _gerador is None:
+            _gerador = GeradorNuvens()
+    return _gerador
@@ -1,26 +1,26 @@
 # oauth.py
 
-import os
 import requests
-from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
 from db import SessionLocal
 from models import UserToken
+from settings import Settings, get_settings
 
-# 1) Carregar .env e variáveis obrigatórias
-load_dotenv()
-CLIENT_ID     = os.getenv("ML_CLIENT_ID")
-CLIENT_SECRET = os.getenv("ML_CLIENT_SECRET")
-BACKEND_URL   = os.getenv("BACKEND_URL")
-if not all([CLIENT_ID, CLIENT_SECRET, BACKEND_URL]):
-    raise RuntimeError("⚠️ ML_CLIENT_ID, ML_CLIENT_SECRET e BACKEND_URL devem estar definidos no .env")
+# URL para trocar code por token
+TOKEN_URL = "https://api.mercadolibre.com/oauth/token"
 
-# 2) Seu endpoint de callback no backend
-REDIRECT_URI = f"{BACKEND_URL}/auth/callback"
 
-# 3) URL para trocar code por token
-TOKEN_URL = "https://api.mercadolibre.com/oauth/token"
+def _credenciais() -> Settings:
+    """Configuração com ML_CLIENT_ID, ML_CLIENT_SECRET e BACKEND_URL garantidos."""
+    settings = get_settings()
+    settings.exigir("ml_client_id", "ml_client_secret", "backend_url")
+    return settings
+
+
+def _redirect_uri(settings: Settings) -> str:
+    # Endpoint de callback no backend
+    return f"{settings.backend_url}/auth/callback"
 
 
 def get_auth_url() -> str:
@@ -28,11 +28,12 @@ def get_auth_url() -> str:
     Gera a URL de autorização do Mercado Livre,
     com redirect_uri apontando ao /auth/callback do backend.
     """
+    settings = _credenciais()
     return (
         "https://auth.mercadolivre.com.br/authorization"
         f"?response_type=code"
-        f"&client_id={CLIENT_ID}"
-        f"&redirect_uri={REDIRECT_URI}"
+        f"&client_id={settings.ml_client_id}"
+        f"&redirect_uri={_redirect_uri(settings)}"
     )
 
 
@@ -41,12 +42,13 @@ def exchange_code(code: str) -> dict:
     Troca o authorization_code por access_token e refresh_token,
     faz upsert em user_tokens e retorna o payload completo.
     """
+    settings = _credenciais()
     payload = {
         "grant_type":    "authorization_code",
-        "client_id":     CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
+        "client_id":     settings.ml_client_id,
+        "client_secret": settings.ml_client_secret,
         "code":          code,
-        "redirect_uri":  REDIRECT_URI,
+        "redirect_uri":  _redirect_uri(settings),
     }
     resp = requests.post(TOKEN_URL, data=payload)
     data = resp.json()
@@ -97,10 +99,11 @@ def renovar_access_token(ml_user_id: int) -> str | None:
             print(f"⚠️ Usuário {ml_user_id} não encontrado no banco.")
             return None
 
+        settings = _credenciais()
         payload = {
             "grant_type":    "refresh_token",
-            "client_id":     CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
+            "client_id":     settings.ml_client_id,
+            "client_secret": settings.ml_client_secret,
             "refresh_token": token.refresh_token,
         }
         resp = requests.post(TOKEN_URL, data=payload)
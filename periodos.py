@@ -0,0 +1,204 @@
+# periodos.py
+"""
+Agrupamento de vendas por período (hora, dia, semana, quinzena, mês).
+
+Cada data vira uma chave int64 calculada direto sobre o datetime64, sem
+`apply` linha a linha:
+
+    hora      horas desde 1970-01-01
+    dia       dias desde 1970-01-01
+    semana    dia (desde 1970-01-01) da segunda-feira da semana
+    quinzena  2 * mês + (0 para dias 1-15, 1 para 16 em diante)
+    mes       meses desde 1970-01
+
+As métricas são somadas com um único `np.bincount` por métrica sobre os
+índices densos das chaves, o que mantém o gráfico interativo mesmo com
+vários anos de vendas.
+"""
+import datetime as dt
+from typing import Dict, Literal, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+Granularidade = Literal["hora", "dia", "semana", "quinzena", "mes"]
+
+# Valor da métrica: nome de coluna, array já calculado ou None (contagem de linhas)
+Metrica = Union[str, np.ndarray, pd.Series, None]
+
+_NS_POR_HORA = 3_600 * 10 ** 9
+# 1970-01-01 foi uma quinta-feira: (dia + 3) % 7 dá 0 na segunda
+_DESLOCAMENTO_SEGUNDA = 3
+
+
+def _datas_ns(datas: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """datetime64[ns] sem fuso e máscara das datas válidas."""
+    if isinstance(datas.dtype, pd.DatetimeTZDtype):
+        datas = datas.dt.tz_localize(None)
+    valores = pd.to_datetime(datas, errors="coerce").to_numpy(dtype="datetime64[ns]")
+    return valores, ~np.isnat(valores)
+
+
+def chave_periodo(datas: pd.Series, granularidade: Granularidade) -> np.ndarray:
+    """
+    Chave int64 do período de cada data. Datas nulas recebem a chave de
+    1970-01-01; use `agregar_por_periodo`, que as descarta.
+    """
+    return _chaves(*_datas_ns(datas), granularidade)
+
+
+def _chaves(valores: np.ndarray, validas: np.ndarray, granularidade: Granularidade) -> np.ndarray:
+    valores = np.where(validas, valores, np.datetime64(0, "ns"))
+    if granularidade == "hora":
+        return valores.view("int64") // _NS_POR_HORA
+    dias = valores.astype("datetime64[D]").view("int64")
+    if granularidade == "dia":
+        return dias
+    if granularidade == "semana":
+        return dias - (dias + _DESLOCAMENTO_SEGUNDA) % 7
+    meses = valores.astype("datetime64[M]").view("int64")
+    if granularidade == "mes":
+        return meses
+    if granularidade == "quinzena":
+        dia_do_mes = dias - meses.astype("datetime64[M]").astype("datetime64[D]").view("int64") + 1
+        return meses * 2 + (dia_do_mes > 15)
+    raise ValueError(f"Granularidade desconhecida: {granularidade}")
+
+
+def inicio_periodo(chaves: np.ndarray, granularidade: Granularidade) -> pd.DatetimeIndex:
+    """Converte chaves de `chave_periodo` na data/hora de início de cada período."""
+    chaves = np.asarray(chaves, dtype="int64")
+    if granularidade == "hora":
+        inicio = (chaves * _NS_POR_HORA).astype("datetime64[ns]")
+    elif granularidade in ("dia", "semana"):
+        inicio = chaves.astype("datetime64[D]")
+    elif granularidade == "mes":
+        inicio = chaves.astype("datetime64[M]")
+    elif granularidade == "quinzena":
+        inicio = (chaves // 2).astype("datetime64[M]").astype("datetime64[D]") + (chaves % 2) * 15
+    else:
+        raise ValueError(f"Granularidade desconhecida: {granularidade}")
+    return pd.DatetimeIndex(inicio.astype("datetime64[ns]"))
+
+
+def _como_float(valores: Union[np.ndarray, pd.Series]) -> np.ndarray:
+    valores = pd.to_numeric(pd.Series(valores), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    # Nulos não somam, como no groupby().sum()
+    return np.nan_to_num(valores, nan=0.0)
+
+
+def _valores_metrica(df: pd.DataFrame, metrica: Metrica) -> Optional[np.ndarray]:
+    if metrica is None:
+        return None
+    return _como_float(df[metrica] if isinstance(metrica, str) else metrica)
+
+
+def agregar_por_periodo(
+    df: pd.DataFrame,
+    granularidade: Granularidade,
+    metricas: Dict[str, Metrica],
+    coluna_data: str = "date_adjusted",
+    por: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Soma as `metricas` de `df` por período (e por `por`, se informado).
+
+    Retorna um frame com `periodo` (início do período, datetime64), a coluna
+    `por` quando usada e uma coluna por métrica, só com as combinações que
+    têm vendas, ordenado por período.
+    """
+    colunas = ["periodo"] + ([por] if por else []) + list(metricas)
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+
+    datas, validas = _datas_ns(df[coluna_data])
+    chaves = _chaves(datas, validas, granularidade)
+
+    if por:
+        grupo = df[por]
+        if not isinstance(grupo.dtype, pd.CategoricalDtype):
+            grupo = grupo.astype("category")
+        codigos = grupo.cat.codes.to_numpy().astype("int64")
+        validas &= codigos >= 0
+        categorias = grupo.cat.categories
+    else:
+        codigos = np.zeros(len(df), dtype="int64")
+        categorias = None
+    n_grupos = len(categorias) if por else 1
+
+    chaves_unicas, posicao = np.unique(chaves[validas], return_inverse=True)
+    celula = posicao * n_grupos + codigos[validas]
+    tamanho = len(chaves_unicas) * n_grupos
+
+    linhas = np.bincount(celula, minlength=tamanho)
+    ocupadas = np.flatnonzero(linhas)
+
+    resultado = {"periodo": inicio_periodo(chaves_unicas[ocupadas // n_grupos], granularidade)}
+    if por:
+        resultado[por] = pd.Categorical.from_codes(ocupadas % n_grupos, categorias)
+    for nome, metrica in metricas.items():
+        valores = _valores_metrica(df, metrica)
+        if valores is None:
+            resultado[nome] = linhas[ocupadas]
+        else:
+            resultado[nome] = np.bincount(celula, weights=valores[validas], minlength=tamanho)[ocupadas]
+    return pd.DataFrame(resultado, columns=colunas)
+
+
+def matriz_dia_hora(datas: pd.Series, valores: Union[np.ndarray, pd.Series]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rollup horário denso: matriz (dias com venda × 24) com a soma de
+    `valores` em cada hora de cada dia, e o dia (desde 1970-01-01) de cada
+    linha da matriz. Custa O(linhas + dias × 24).
+    """
+    ns, validas = _datas_ns(datas)
+    pesos = _como_float(valores)
+    horas = ns[validas].view("int64") // _NS_POR_HORA
+    if not len(horas):
+        return np.empty(0, dtype="int64"), np.zeros((0, 24))
+
+    dia = horas // 24
+    primeiro = dia.min()
+    celula = (dia - primeiro) * 24 + horas % 24
+    n_dias = int(dia.max() - primeiro) + 1
+
+    matriz = np.bincount(celula, weights=pesos[validas], minlength=n_dias * 24).reshape(n_dias, 24)
+    com_venda = np.bincount(dia - primeiro, minlength=n_dias) > 0
+    return np.flatnonzero(com_venda) + primeiro, matriz[com_venda]
+
+
+def media_acumulada_por_hora(matriz: np.ndarray) -> np.ndarray:
+    """Média, entre os dias, do valor acumulado até cada hora (24 posições)."""
+    if not len(matriz):
+        return np.zeros(24)
+    return np.cumsum(matriz, axis=1).mean(axis=0)
+
+
+# ---------------- Chaves de dia yyyymmdd (sale_day / sla_day) ----------------
+
+def dia_int(data: Union[dt.date, pd.Timestamp]) -> int:
+    """Data -> inteiro yyyymmdd, no formato das colunas sale_day e sla_day."""
+    return data.year * 10_000 + data.month * 100 + data.day
+
+
+def data_do_dia(dia: int) -> dt.date:
+    """Inteiro yyyymmdd -> data."""
+    dia = int(dia)
+    return dt.date(dia // 10_000, dia // 100 % 100, dia % 100)
+
+
+def entre_dias(dias: pd.Series, de: Union[dt.date, pd.Timestamp], ate: Union[dt.date, pd.Timestamp]) -> np.ndarray:
+    """Máscara das linhas com dia entre `de` e `ate` (inclusive); dias nulos ficam de fora."""
+    valores = dias.to_numpy(dtype="int64", na_value=0)
+    return (valores >= dia_int(de)) & (valores <= dia_int(ate))
+
+
+def formatar_dias(dias: pd.Series, vazio: str = "—") -> pd.Series:
+    """Dias yyyymmdd como texto dd/mm/aaaa, sem converter linha a linha para date."""
+    valores = dias.to_numpy(dtype="int64", na_value=0)
+    texto = (
+        pd.Series(valores % 100, index=dias.index).astype(str).str.zfill(2) + "/"
+        + pd.Series(valores // 100 % 100, index=dias.index).astype(str).str.zfill(2) + "/"
+        + pd.Series(valores // 10_000, index=dias.index).astype(str)
+    )
+    return texto.where(valores > 0, vazio)
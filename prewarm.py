@@ -0,0 +1,86 @@
+# prewarm.py
+"""
+Aquecimento dos caches antes da chegada do tráfego.
+
+Rodado como script (`python prewarm.py`, chamado pelo start.sh antes de
+subir o Streamlit), monta o snapshot de vendas e as consultas auxiliares e
+grava tudo no cache persistente. Dentro do processo do Streamlit,
+`iniciar_aquecimento()` faz o mesmo numa thread em segundo plano, deixando o
+snapshot já carregado na memória do processo.
+
+Cada etapa é cronometrada; uma etapa que falha não impede as seguintes.
+"""
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from loaders import carregar_nicknames, carregar_resumo_skus
+
+Etapa = Tuple[str, Callable[[], object]]
+Resultado = Tuple[str, float, Optional[str]]
+
+_aquecimento: Optional[threading.Thread] = None
+_aquecimento_lock = threading.Lock()
+ultimos_tempos: List[Resultado] = []
+
+
+def _etapas(em_processo: bool) -> List[Etapa]:
+    from versions import RegistroVersoes, registro_versoes
+
+    if em_processo:
+        from snapshot import obter_snapshot
+
+        registro = registro_versoes()
+        snapshot = ("snapshot de vendas", obter_snapshot)
+    else:
+        from snapshot import gravar_snapshot, montar_snapshot
+
+        # Fora do Streamlit basta ler as versões uma vez, sem listener
+        registro = RegistroVersoes()
+        registro.recarregar()
+
+        snapshot = ("snapshot de vendas", lambda: gravar_snapshot(montar_snapshot(registro.versoes())))
+
+    return [
+        snapshot,
+        ("resumo de SKUs", lambda: carregar_resumo_skus(registro.chave())),
+        ("lista de contas", lambda: carregar_nicknames(registro.chave())),
+    ]
+
+
+def aquecer(em_processo: bool = False) -> List[Resultado]:
+    """Executa as etapas de aquecimento e devolve (etapa, segundos, erro) de cada uma."""
+    resultados: List[Resultado] = []
+    inicio_total = time.perf_counter()
+    for nome, etapa in _etapas(em_processo):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            etapa()
+        except Exception as e:
+            erro = str(e)
+        duracao = time.perf_counter() - inicio
+        resultados.append((nome, duracao, erro))
+        if erro:
+            print(f"🔥 Aquecimento '{nome}' falhou após {duracao:.2f}s: {erro}")
+        else:
+            print(f"🔥 Aquecimento '{nome}': {duracao:.2f}s")
+    print(f"🔥 Aquecimento concluído em {time.perf_counter() - inicio_total:.2f}s")
+
+    ultimos_tempos[:] = resultados
+    return resultados
+
+
+def iniciar_aquecimento() -> None:
+    """Dispara o aquecimento em segundo plano uma única vez por processo."""
+    global _aquecimento
+    with _aquecimento_lock:
+        if _aquecimento is None:
+            _aquecimento = threading.Thread(
+                target=aquecer, kwargs={"em_processo": True}, name="prewarm", daemon=True
+            )
+            _aquecimento.start()
+
+
+if __name__ == "__main__":
+    aquecer()
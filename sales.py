@@ -1,37 +1,73 @@
-import os
 import requests
 from dateutil import parser
-from db import SessionLocal
+from db import SessionLocal, get_engine
 from models import Sale
-from sqlalchemy import func, text, create_engine
-from dotenv import load_dotenv
+from sqlalchemy import func, text
 from dateutil.tz import tzutc
 from requests.exceptions import HTTPError
 from datetime import datetime
+from decimal import Decimal
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import time
-
-# Carrega variáveis de ambiente
-load_dotenv()
-BACKEND_URL = os.getenv("BACKEND_URL")
+from versions import publicar_alteracao
+from settings import get_settings
+from catalogo import obter_itens
 
 API_BASE = "https://api.mercadolibre.com/orders/search"
 FULL_PAGE_SIZE = 50
 
+
+def _mesmo_valor(antigo, novo) -> bool:
+    """
+    Compara o valor gravado com o vindo da API, ignorando diferenças só de
+    representação (datetime com/sem fuso, Decimal x float, id str x int).
+    """
+    if isinstance(antigo, datetime) and isinstance(novo, datetime):
+        if (antigo.tzinfo is None) != (novo.tzinfo is None):
+            antigo, novo = antigo.replace(tzinfo=None), novo.replace(tzinfo=None)
+        return antigo == novo
+    if isinstance(antigo, (int, float, Decimal)) and isinstance(novo, (int, float, Decimal, str)):
+        try:
+            return round(float(antigo), 2) == round(float(novo), 2)
+        except ValueError:
+            return False
+    return antigo == novo
+
+
+def _itens_sem_sku(orders: List[dict], access_token: str, ml_user_id: str) -> Dict[str, dict]:
+    """
+    Metadados (cache de anúncios) dos itens de uma página de orders que vêm
+    sem seller_sku, numa única consulta a `obter_itens` por página.
+    """
+    ids = set()
+    for o in orders:
+        item_inf = (o.get("order_items") or [{}])[0].get("item") or {}
+        if item_inf.get("id") and not item_inf.get("seller_sku"):
+            ids.add(str(item_inf["id"]))
+    if not ids:
+        return {}
+    try:
+        return obter_itens(ids, access_token, ml_user_id)
+    except Exception as e:
+        print(f"⚠️ Falha ao consultar cache de anúncios para {len(ids)} item(ns): {e}")
+        return {}
+
+
 def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
     from sales import get_full_sales, _order_to_sale
-    import os
     from concurrent.futures import ThreadPoolExecutor
-    from utils import buscar_ml_fee, engine, DATA_INICIO
+    from utils import buscar_ml_fee, DATA_INICIO
 
 
     API_BASE = "https://api.mercadolibre.com/orders/search"
     FULL_PAGE_SIZE = 50
-    BACKEND_URL = os.getenv("BACKEND_URL")
+    BACKEND_URL = get_settings().backend_url
 
     db = SessionLocal()
     total_saved = 0
+    alteradas = 0
+    atualizadas = 0
 
     try:
         # 🔁 Tenta renovar token inicialmente
@@ -89,6 +125,7 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
         if not orders:
             return 0
 
+        itens = _itens_sem_sku(orders, access_token, ml_user_id)
         for o in orders:
             oid = str(o["id"])
             existing_sale = db.query(Sale).filter_by(order_id=oid).first()
@@ -99,7 +136,7 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
                 continue
 
             full_order = full_resp.json()
-            nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db)
+            nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db, itens)
             buffering_info = nova_venda.shipment_buffering_date.isoformat() if nova_venda.shipment_buffering_date else "None"
             print(f"📦 shipment_buffering_date para {oid}: {buffering_info}")
 
@@ -107,10 +144,17 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
 
             if not existing_sale:
                 db.add(nova_venda)
+                alteradas += 1
             else:
+                houve_mudanca = False
                 for attr, value in nova_venda.__dict__.items():
-                    if attr != "_sa_instance_state":
+                    if attr in ["_sa_instance_state", "id"]:
+                        continue
+                    if not _mesmo_valor(getattr(existing_sale, attr, None), value):
                         setattr(existing_sale, attr, value)
+                        houve_mudanca = True
+                if houve_mudanca:
+                    alteradas += 1
 
             total_saved += 1
 
@@ -119,7 +163,7 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
         # ✅ Atualização complementar das taxas
         print(f"\n📊 Iniciando atualização de taxas pendentes para usuário {ml_user_id}...")
 
-        with engine.begin() as conn:
+        with get_engine().begin() as conn:
             pedidos = conn.execute(text("""
                 SELECT order_id FROM sales
                 WHERE ml_user_id = :uid AND ml_fee IS NULL AND date_closed >= :inicio
@@ -133,8 +177,7 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
             with ThreadPoolExecutor(max_workers=10) as executor:
                 resultados = list(executor.map(lambda oid: buscar_ml_fee(oid, access_token), pedidos_ids))
 
-            with engine.begin() as conn:
-                atualizadas = 0
+            with get_engine().begin() as conn:
                 for i, (order_id, fee) in enumerate(resultados, 1):
                     if fee is not None:
                         conn.execute(text("""
@@ -147,6 +190,10 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
 
             print(f"✅ Atualização de fees concluída: {atualizadas}/{len(pedidos_ids)} vendas.")
 
+        # Só publica nova versão quando alguma linha foi de fato inserida ou alterada
+        if alteradas or atualizadas:
+            publicar_alteracao(int(ml_user_id))
+
     except Exception as e:
         db.rollback()
         raise RuntimeError(f"❌ Erro no incremental: {e}")
@@ -156,8 +203,13 @@ def get_incremental_sales(ml_user_id: str, access_token: str) -> int:
     return total_saved
 
 
-def _order_to_sale(order: dict, ml_user_id: str, access_token: str, db: Optional[SessionLocal] = None) -> Sale:
-    from sqlalchemy import text
+def _order_to_sale(
+    order: dict,
+    ml_user_id: str,
+    access_token: str,
+    db: Optional[SessionLocal] = None,
+    itens: Optional[Dict[str, dict]] = None,
+) -> Sale:
     from dateutil import parser, tz
     def to_sp_datetime(value: Optional[str]):
         if not value:
@@ -206,19 +258,12 @@ def _order_to_sale(order: dict, ml_user_id: str, access_token: str, db: Optional
         ship = order.get("shipping") or {}
 
         seller_sku = item_inf.get("seller_sku")
-        quantity_sku = custo_unitario = level1 = level2 = None
-
-        if seller_sku:
-            sku_info = db.execute(text("""
-                SELECT quantity, custo_unitario, level1, level2
-                FROM sku
-                WHERE sku = :sku
-                ORDER BY date_created DESC
-                LIMIT 1
-            """), {"sku": seller_sku}).fetchone()
-
-            if sku_info:
-                quantity_sku, custo_unitario, level1, level2 = sku_info
+        if not seller_sku and item_inf.get("id"):
+            # 🏷️ SKU pelo cache de anúncios, consultado uma vez por página de
+            # orders (ver _itens_sem_sku); sem ele o backfill de sku.py preenche depois
+            seller_sku = (itens or {}).get(str(item_inf["id"]), {}).get("seller_sku")
+        # Custo, quantidade por SKU e níveis não são copiados para a venda:
+        # vêm da versão do cadastro vigente na data da venda (ver custos.py)
 
         payment_info = (order.get("payments") or [{}])[0]
         payment_id = payment_info.get("id")
@@ -279,10 +324,6 @@ def _order_to_sale(order: dict, ml_user_id: str, access_token: str, db: Optional
             unit_price       = item.get("unit_price"),
             shipping_id      = shipment_id,
             seller_sku       = seller_sku,
-            quantity_sku     = quantity_sku,
-            custo_unitario   = custo_unitario,
-            level1           = level1,
-            level2           = level2,
             ml_fee           = marketplace_fee,
             payment_id       = payment_id,
             
@@ -361,6 +402,7 @@ def revisar_banco_de_dados(ml_user_id: str, access_token: str, return_changes: b
                     break
 
                 commit_necessario = False
+                itens = _itens_sem_sku(orders, access_token, ml_user_id)
 
                 for order in orders:
                     oid = str(order["id"])
@@ -372,7 +414,7 @@ def revisar_banco_de_dados(ml_user_id: str, access_token: str, return_changes: b
                         continue
 
                     full_order = full_resp.json()
-                    nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db)
+                    nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db, itens)
 
                     if not existing_sale:
                         db.add(nova_venda)
@@ -411,6 +453,9 @@ def revisar_banco_de_dados(ml_user_id: str, access_token: str, return_changes: b
     finally:
         db.close()
 
+    if novas or atualizadas:
+        publicar_alteracao(int(ml_user_id))
+
     print(f"✅ Revisão finalizada. Novas: {novas}, Atualizadas: {atualizadas}")
     return {"novas": novas, "atualizadas": atualizadas}
 
@@ -500,6 +545,7 @@ def get_full_sales(ml_user_id: str, access_token: str) -> int:
                 if not orders:
                     break
 
+                itens = _itens_sem_sku(orders, access_token, ml_user_id)
                 for order in orders:
                     order_id = str(order["id"])
                     try:
@@ -509,7 +555,7 @@ def get_full_sales(ml_user_id: str, access_token: str) -> int:
                             continue
 
                         full_order = full_resp.json()
-                        nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db)
+                        nova_venda = _order_to_sale(full_order, ml_user_id, access_token, db, itens)
                         print(f"📦 FULL - ordem {order_id} processada | ml_fee: {nova_venda.ml_fee}")
 
                         existing_sale = db.query(Sale).filter_by(order_id=order_id).first()
@@ -540,6 +586,9 @@ def get_full_sales(ml_user_id: str, access_token: str) -> int:
     finally:
         db.close()
 
+    if total_saved:
+        publicar_alteracao(int(ml_user_id))
+
     return total_saved
 
 from typing import Optional
@@ -0,0 +1,169 @@
+# schema.py
+"""
+Esquema de tipos do DataFrame de vendas.
+
+O `pd.read_sql` devolve textos como objetos Python e colunas Numeric como
+`Decimal`, o que deixa o frame pesado e faz toda conta de dinheiro rodar
+objeto a objeto. Aqui fica o mapeamento coluna -> tipo compacto e a função
+que aplica esse mapeamento ao frame carregado.
+"""
+import hashlib
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional
+
+import numpy as np
+import pandas as pd
+
+# Tipos lógicos aceitos no esquema
+#   category  -> texto de baixa cardinalidade (pd.Categorical)
+#   money     -> valores em reais (float64 ou centavos Int64)
+#   Int8/16/32/64, int64 -> inteiros (maiúsculo = nullable)
+#   datetime  -> datetime64 sem fuso (horário local já ajustado no banco)
+#   datetime_utc -> datetime64 com fuso UTC (colunas timestamptz)
+SCHEMA_VENDAS: Dict[str, str] = {
+    # Identificadores
+    "order_id":                "int64",
+    "ml_user_id":              "int64",
+    "payment_id":              "Int64",
+
+    # Textos repetitivos
+    "nickname":                "category",
+    "status":                  "category",
+    "level1":                  "category",
+    "level2":                  "category",
+    "shipment_status":         "category",
+    "shipment_substatus":      "category",
+    "shipment_mode":           "category",
+    "shipment_logistic_type":  "category",
+    "shipment_delivery_type":  "category",
+
+    # Quantidades
+    "quantity":                "Int32",
+    "quantity_sku":            "Int16",
+
+    # Dinheiro
+    "total_amount":            "money",
+    "unit_price":              "money",
+    "custo_unitario":          "money",
+    "ml_fee":                  "money",
+    "ads":                     "money",
+    "shipment_list_cost":      "money",
+
+    # Datas
+    "date_adjusted":           "datetime",
+    "shipment_last_updated":   "datetime",
+    "shipment_first_printed":  "datetime",
+    "shipment_delivery_limit": "datetime",
+    "shipment_delivery_final": "datetime",
+    "shipment_delivery_sla":   "datetime_utc",
+    "updated_at":              "datetime_utc",
+
+    # Chaves de data no horário local (yyyymmdd, hora, dia da semana)
+    "sale_day":                "Int32",
+    "sale_hour":               "Int8",
+    "sale_weekday":            "Int8",
+    "sla_day":                 "Int32",
+}
+
+ModoDinheiro = Literal["float", "centavos"]
+
+
+def _converter_dinheiro(serie: pd.Series, modo: ModoDinheiro) -> pd.Series:
+    valores = pd.to_numeric(serie, errors="coerce").astype("float64")
+    if modo == "centavos":
+        return (valores * 100).round().astype("Int64")
+    return valores
+
+
+def _converter(serie: pd.Series, tipo: str, dinheiro: ModoDinheiro) -> pd.Series:
+    if tipo == "category":
+        return serie.astype("category")
+    if tipo == "money":
+        return _converter_dinheiro(serie, dinheiro)
+    if tipo == "datetime":
+        if isinstance(serie.dtype, pd.DatetimeTZDtype):
+            return serie.dt.tz_localize(None)
+        return pd.to_datetime(serie, errors="coerce")
+    if tipo == "datetime_utc":
+        return pd.to_datetime(serie, utc=True, errors="coerce")
+    if tipo[0].isupper():
+        # Inteiro nullable: passa por numeric para aceitar Decimal/float com NaN
+        return pd.to_numeric(serie, errors="coerce").round().astype(tipo)
+    return serie.astype(tipo)
+
+
+def aplicar_schema(
+    df: pd.DataFrame,
+    schema: Dict[str, str] = SCHEMA_VENDAS,
+    dinheiro: ModoDinheiro = "float",
+) -> pd.DataFrame:
+    """
+    Converte as colunas de `df` presentes no esquema para os tipos compactos.
+    Colunas fora do esquema são mantidas como vieram.
+    """
+    convertidas = {
+        col: _converter(df[col], tipo, dinheiro)
+        for col, tipo in schema.items()
+        if col in df.columns
+    }
+    return df.assign(**convertidas)
+
+
+def mapear_categorias(serie: pd.Series, func: Callable[[Any], Any]) -> pd.Series:
+    """
+    Aplica `func` uma única vez por categoria (e uma vez para o nulo) de uma
+    coluna categórica, em vez de uma vez por linha. O resultado continua
+    categórico.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype("category")
+    # O código -1 (nulo) cai no último elemento, que é func(None)
+    mapa = np.array([func(c) for c in serie.cat.categories] + [func(None)], dtype=object)
+    return pd.Series(
+        pd.Categorical(mapa[serie.cat.codes.to_numpy()]),
+        index=serie.index,
+        name=serie.name,
+    )
+
+
+def concatenar(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatena frames já tipados mantendo as colunas categóricas categóricas
+    (o `pd.concat` cai para object quando as categorias diferem).
+    """
+    categoricas = [
+        c for c in frames[0].columns
+        if isinstance(frames[0][c].dtype, pd.CategoricalDtype)
+    ]
+    categorias = {
+        c: pd.api.types.union_categoricals([f[c] for f in frames]).categories
+        for c in categoricas
+    }
+    alinhados = [
+        f.assign(**{c: f[c].cat.set_categories(categorias[c]) for c in categoricas})
+        for f in frames
+    ]
+    return pd.concat(alinhados, ignore_index=True)
+
+
+def memoria_por_coluna(df: pd.DataFrame) -> pd.DataFrame:
+    """Retorna o consumo de memória (deep) de cada coluna, do maior para o menor."""
+    uso = df.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame({
+        "coluna": uso.index,
+        "dtype":  [str(df[c].dtype) for c in uso.index],
+        "bytes":  uso.values,
+    })
+    relatorio["mb"] = relatorio["bytes"] / 1024 ** 2
+    return relatorio.sort_values("bytes", ascending=False, ignore_index=True)
+
+
+def assinatura_frame(df: pd.DataFrame, colunas: Optional[Iterable[str]] = None) -> str:
+    """
+    Hash do conteúdo de `df` (ou só de `colunas`), para usar como chave de
+    cache de resultados derivados do frame. Ignora o índice.
+    """
+    parte = df if colunas is None else df[[c for c in colunas if c in df.columns]]
+    linhas = pd.util.hash_pandas_object(parte, index=False).to_numpy()
+    h = hashlib.sha1(linhas.tobytes())
+    h.update(repr(list(parte.columns)).encode())
+    return h.hexdigest()
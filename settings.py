@@ -0,0 +1,76 @@
+# settings.py
+"""
+Configuração única da aplicação.
+
+O `.env` é lido uma vez por processo, na primeira chamada de
+`get_settings()`, e as variáveis ficam num objeto imutável. Nada aqui toca
+no banco nem na rede: a validação das variáveis obrigatórias é feita por
+quem precisa delas, com `Settings.exigir`.
+"""
+import functools
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Atributo -> variável de ambiente
+_VARIAVEIS = {
+    "db_url":           "DB_URL",
+    "ml_client_id":     "ML_CLIENT_ID",
+    "ml_client_secret": "ML_CLIENT_SECRET",
+    "backend_url":      "BACKEND_URL",
+    "frontend_url":     "FRONTEND_URL",
+    "cookie_secret":    "COOKIE_SECRET",
+    "cache_backend":    "CACHE_BACKEND",
+    "cache_dir":        "CACHE_DIR",
+    "cache_max_mb":     "CACHE_MAX_MB",
+    "redis_url":        "REDIS_URL",
+    "grafico_max_pontos": "GRAFICO_MAX_PONTOS",
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    db_url: Optional[str] = None
+    ml_client_id: Optional[str] = None
+    ml_client_secret: Optional[str] = None
+    backend_url: Optional[str] = None
+    frontend_url: Optional[str] = None
+    cookie_secret: Optional[str] = None
+
+    # Cache persistente (ver cache_store.py)
+    cache_backend: str = "disk"
+    cache_dir: str = ".cache/nexus"
+    cache_max_mb: float = 512
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Orçamento de pontos por gráfico de linha (ver amostragem.py)
+    grafico_max_pontos: int = 1500
+
+    def faltando(self, *campos: str) -> list:
+        """Nomes das variáveis de ambiente vazias entre os `campos` informados."""
+        return [_VARIAVEIS[c] for c in campos if not getattr(self, c)]
+
+    def exigir(self, *campos: str) -> None:
+        """Falha com RuntimeError se algum dos `campos` não estiver definido."""
+        faltando = self.faltando(*campos)
+        if faltando:
+            raise RuntimeError(f"❌ Defina {', '.join(faltando)} no .env")
+
+
+def _ler_ambiente() -> Settings:
+    valores = {}
+    for campo in fields(Settings):
+        bruto = os.getenv(_VARIAVEIS[campo.name])
+        if bruto is None or bruto == "":
+            continue
+        valores[campo.name] = campo.type(bruto) if campo.type in (int, float) else bruto
+    return Settings(**valores)
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Carrega o .env (sem sobrescrever o ambiente) e devolve a configuração do processo."""
+    load_dotenv()
+    return _ler_ambiente()
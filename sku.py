@@ -1,52 +1,145 @@
-import os
-import requests
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from models import Base, Sale
-from dotenv import load_dotenv
-from tqdm import tqdm  # opcional para barra de progresso
-
-# 1. Carrega variáveis de ambiente (.env)
-load_dotenv()
-DB_URL = os.getenv("DB_URL")
-
-# 2. Configura conexão com o banco
-engine = create_engine(DB_URL)
-Session = sessionmaker(bind=engine)
-
-# 3. Função principal para atualizar os SKUs
-def atualizar_skus_antigos():
-    session = Session()
-    try:
-        # Pega todas as vendas que ainda não têm SKU
-        vendas_sem_sku = session.query(Sale).filter(
-            Sale.seller_sku.is_(None),
-            Sale.item_id.isnot(None)
-        ).all()
-
-        print(f"🔍 {len(vendas_sem_sku)} vendas sem SKU encontradas...")
-
-        for venda in tqdm(vendas_sem_sku, desc="Atualizando SKUs"):
-            try:
-                resp = requests.get(f"https://api.mercadolibre.com/items/{venda.item_id}")
-                if resp.ok:
-                    item_data = resp.json()
-                    sku = item_data.get("seller_sku") or item_data.get("seller_custom_field")
-                    if sku:
-                        venda.seller_sku = sku
-            except Exception as e:
-                print(f"⚠️ Erro ao buscar SKU para {venda.item_id}: {e}")
-
-        session.commit()
-        print("✅ SKUs atualizados com sucesso!")
-
-    except Exception as e:
-        session.rollback()
-        print(f"❌ Erro geral: {e}")
-
-    finally:
-        session.close()
-
-# 4. Executa
+# sku.py
+"""
+Backfill do seller_sku nas vendas antigas que ficaram sem SKU.
+
+Em vez de carregar todas as vendas sem SKU no ORM e chamar /items/{id} uma
+vez por venda, o backfill:
+
+- percorre os pares `DISTINCT (item_id, ml_user_id)` das vendas sem SKU em
+  lotes, por ordem de chave (cursor por chave, não por offset);
+- resolve o SKU de cada lote pelo cache de anúncios (`catalogo.obter_itens`),
+  que só vai à API para os anúncios ausentes, em multigets paralelos, com o
+  access_token da conta dona de cada anúncio (tabela user_tokens);
+- grava cada lote com um único `UPDATE sales ... FROM (VALUES ...)` e faz
+  commit, guardando o último par processado na tabela `app_state` (ver
+  estado.py), que não descarta entradas como o cache LRU.
+
+Se o processo cair, a próxima execução continua do último lote gravado.
+"""
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from catalogo import obter_itens
+from db import get_engine
+from estado import carregar_estado, remover_estado, salvar_estado
+from versions import publicar_alteracao
+
+LOTE_ITENS = 200
+CHAVE_CURSOR = "sku:backfill:cursor"
+
+
+def _proximo_lote(ultimo: Optional[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    item_id, uid = ultimo or (None, None)
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT DISTINCT item_id, ml_user_id FROM sales
+            WHERE seller_sku IS NULL
+              AND item_id IS NOT NULL
+              AND (CAST(:item_id AS VARCHAR) IS NULL OR (item_id, ml_user_id) > (:item_id, :uid))
+            ORDER BY item_id, ml_user_id
+            LIMIT :limite
+        """), {"item_id": item_id, "uid": uid, "limite": LOTE_ITENS}).fetchall()
+    return [(r[0], int(r[1])) for r in rows]
+
+
+def _tokens(contas: Set[int]) -> Dict[int, str]:
+    with get_engine().connect() as conn:
+        rows = conn.execute(
+            text("SELECT ml_user_id, access_token FROM user_tokens WHERE ml_user_id = ANY(:contas)"),
+            {"contas": list(contas)},
+        ).fetchall()
+    return {int(uid): token for uid, token in rows}
+
+
+def _resolver(lote: List[Tuple[str, int]]) -> Dict[str, str]:
+    """SKU de cada anúncio do lote, consultando o cache de anúncios com o token da conta dona."""
+    por_conta: Dict[int, List[str]] = defaultdict(list)
+    for item_id, uid in lote:
+        por_conta[uid].append(item_id)
+    tokens = _tokens(set(por_conta))
+
+    skus: Dict[str, str] = {}
+    for uid, item_ids in por_conta.items():
+        token = tokens.get(uid)
+        if token is None:
+            print(f"⚠️ Conta {uid} sem access_token: {len(item_ids)} anúncio(s) buscados sem autenticação")
+        itens = obter_itens(item_ids, token, str(uid))
+        skus.update(
+            (item_id, meta["seller_sku"])
+            for item_id, meta in itens.items()
+            if meta.get("seller_sku")
+        )
+    return skus
+
+
+def _aplicar(skus: Dict[str, str]) -> List[int]:
+    """Grava os SKUs do lote nas vendas sem SKU; devolve a conta de cada venda alterada."""
+    valores = ", ".join(f"(:item_{i}, :sku_{i})" for i in range(len(skus)))
+    params = {}
+    for i, (item_id, sku) in enumerate(skus.items()):
+        params[f"item_{i}"] = item_id
+        params[f"sku_{i}"] = sku
+    with get_engine().begin() as conn:
+        rows = conn.execute(text(f"""
+            UPDATE sales AS s
+               SET seller_sku = v.sku
+              FROM (VALUES {valores}) AS v(item_id, sku)
+             WHERE s.item_id = v.item_id
+               AND s.seller_sku IS NULL
+            RETURNING s.ml_user_id
+        """), params).fetchall()
+    return [int(r[0]) for r in rows]
+
+
+def atualizar_skus_antigos(recomecar: bool = False) -> Dict[str, float]:
+    """
+    Preenche o seller_sku das vendas sem SKU. Com `recomecar`, ignora o
+    cursor salvo e percorre todos os anúncios desde o início.
+    """
+    ultimo = None if recomecar else carregar_estado(CHAVE_CURSOR)
+    if ultimo:
+        print(f"↪️ Retomando backfill de SKUs após o anúncio {ultimo[0]} (conta {ultimo[1]})")
+
+    inicio = time.perf_counter()
+    itens_lidos = com_sku = vendas = 0
+    contas: Set[int] = set()
+    while True:
+        lote = _proximo_lote(ultimo)
+        if not lote:
+            break
+
+        skus = _resolver(lote)
+        if skus:
+            alteradas = _aplicar(skus)
+            vendas += len(alteradas)
+            contas.update(alteradas)
+
+        ultimo = lote[-1]
+        salvar_estado(CHAVE_CURSOR, ultimo)
+        itens_lidos += len(lote)
+        com_sku += len(skus)
+        decorrido = time.perf_counter() - inicio
+        print(
+            f"🔄 {itens_lidos} anúncios processados ({com_sku} com SKU, {vendas} vendas) · "
+            f"{itens_lidos / decorrido:.1f} anúncios/s · {vendas / decorrido:.0f} vendas/s"
+        )
+
+    # Terminou: a próxima execução começa do início
+    remover_estado(CHAVE_CURSOR)
+    for conta in contas:
+        publicar_alteracao(conta)
+
+    decorrido = time.perf_counter() - inicio
+    print(
+        f"✅ Backfill de SKUs concluído: {com_sku}/{itens_lidos} anúncios com SKU, "
+        f"{vendas} vendas atualizadas em {decorrido:.1f}s"
+    )
+    return {"anuncios": itens_lidos, "com_sku": com_sku, "vendas": vendas, "segundos": decorrido}
+
+
+# Executa
 if __name__ == "__main__":
     atualizar_skus_antigos()
@@ -0,0 +1,411 @@
+# snapshot.py
+"""
+Snapshot de vendas compartilhado por todas as sessões do Streamlit.
+
+`st.cache_data` devolve uma cópia (pickle/unpickle) do DataFrame a cada
+chamada, então cada rerun de cada sessão duplicava o histórico inteiro em
+memória. Aqui o frame é carregado uma única vez por processo via
+`st.cache_resource` e as páginas recebem visões baratas dele.
+
+As visões dependem do Copy-on-Write do pandas: uma página pode criar ou
+sobrescrever colunas na visão que recebeu sem tocar no snapshot original.
+No pandas 3 ele é o padrão; no 2.x quem liga é o app (ver app.py).
+
+O snapshot guarda as versões de dados (ver `versions.py`) com que foi
+montado e a marca d'água de `sales.updated_at` até onde já leu. A cada
+mudança de versão, ou a cada `DELTA_INTERVALO` segundos, só as linhas
+alteradas desde a marca d'água são buscadas e mescladas por `order_id`.
+
+O custo, a quantidade por SKU e os níveis não vêm de `sales`: são
+resolvidos pela versão do cadastro vigente na data de cada venda
+(`custos.py`). Quando o cadastro muda, o frame inteiro é resolvido de novo,
+em memória, sem reler as vendas.
+
+O snapshot também é gravado no cache persistente (`cache_store.py`): um
+processo que acabou de subir restaura a última cópia gravada por qualquer
+réplica e só busca o delta a partir dela.
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from cache_store import obter_cache
+from custos import Marca, custos_vigentes, resolver_custos
+from indice import IndiceFiltros
+from schema import SCHEMA_VENDAS, aplicar_schema, concatenar, memoria_por_coluna
+from db import get_engine
+from versions import registro_versoes
+
+# Intervalo mínimo entre duas buscas de delta sem mudança de versão
+DELTA_INTERVALO = 10
+
+# Folga aplicada à marca d'água: transações de sincronização que ainda não
+# tinham feito commit na leitura anterior gravaram updated_at menor que ela
+MARGEM_WATERMARK = pd.Timedelta(minutes=10)
+
+# Intervalo mínimo entre duas gravações do snapshot no cache persistente
+PERSISTIR_INTERVALO = 300
+
+COLUNAS_VENDAS = [
+    "s.order_id",
+    "s.date_adjusted",
+    "s.item_id",
+    "s.item_title",
+    "s.status",
+    "s.quantity",
+    "s.unit_price",
+    "s.total_amount",
+    "s.ml_user_id",
+    "s.buyer_nickname",
+    "s.seller_sku",
+    "s.ml_fee",
+    "s.ads",
+    "s.payment_id",
+    "s.shipment_status",
+    "s.shipment_substatus",
+    "s.shipment_last_updated",
+    "s.shipment_first_printed",
+    "s.shipment_mode",
+    "s.shipment_logistic_type",
+    "s.shipment_list_cost",
+    "s.shipment_delivery_type",
+    "s.shipment_delivery_limit",
+    "s.shipment_delivery_final",
+    "s.shipment_receiver_name",
+    "s.shipment_delivery_sla",
+    "s.updated_at",
+    "s.sale_day",
+    "s.sale_hour",
+    "s.sale_weekday",
+    "s.sla_day",
+    "u.nickname",
+]
+
+SQL_VENDAS = f"""
+    SELECT {", ".join(COLUNAS_VENDAS)}
+      FROM sales s
+      LEFT JOIN user_tokens u ON s.ml_user_id = u.ml_user_id
+"""
+
+# A chave muda junto com a consulta ou o esquema, invalidando cópias antigas
+CHAVE_CACHE = "snapshot:vendas:" + hashlib.sha1(
+    (SQL_VENDAS + repr(sorted(SCHEMA_VENDAS.items()))).encode()
+).hexdigest()[:12]
+
+
+def ler_vendas(
+    contas: Optional[List[int]] = None,
+    desde: Optional[pd.Timestamp] = None,
+    custos: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Lê as vendas já com os tipos compactos: todas, só das contas informadas
+    e/ou só as alteradas a partir de `desde`. As colunas de custo vêm das
+    versões do cadastro em `custos` (por padrão, as atuais).
+    """
+    filtros, params = [], {}
+    if contas is not None:
+        filtros.append("s.ml_user_id = ANY(:uids)")
+        params["uids"] = [int(c) for c in contas]
+    if desde is not None:
+        filtros.append("s.updated_at > :desde")
+        params["desde"] = desde.to_pydatetime()
+
+    sql = SQL_VENDAS
+    if filtros:
+        sql += " WHERE " + " AND ".join(filtros)
+    df = pd.read_sql(text(sql), get_engine(), params=params)
+
+    bytes_antes = df.memory_usage(deep=True).sum()
+    df = aplicar_schema(df)
+    df = resolver_custos(df, custos if custos is not None else custos_vigentes()[1])
+    bytes_depois = memoria_por_coluna(df)["bytes"].sum()
+    print(f"🧮 Vendas carregadas: {len(df)} linhas | {bytes_antes / 1024**2:.1f} MB → {bytes_depois / 1024**2:.1f} MB")
+
+    return df
+
+
+def contar_vendas(contas: List[int]) -> Dict[int, int]:
+    """Quantidade de vendas no banco por conta."""
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT ml_user_id, COUNT(*) FROM sales
+             WHERE ml_user_id = ANY(:uids)
+             GROUP BY ml_user_id
+        """), {"uids": [int(c) for c in contas]}).fetchall()
+    return {int(uid): int(n) for uid, n in rows}
+
+
+def _watermark(df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    valor = df["updated_at"].max() if not df.empty else pd.NaT
+    return None if pd.isna(valor) else valor
+
+
+def contas_alteradas(antes: Dict[int, int], depois: Dict[int, int]) -> List[int]:
+    """Contas cuja versão difere entre dois mapas de versões."""
+    return sorted(uid for uid in set(antes) | set(depois) if antes.get(uid) != depois.get(uid))
+
+
+def novas_ou_alteradas(frame: pd.DataFrame, delta: pd.DataFrame, pedidos: pd.Index) -> pd.DataFrame:
+    """
+    Linhas do delta que ainda não estão no frame com o mesmo `updated_at`.
+    A folga da marca d'água relê as linhas dos últimos minutos a cada ciclo;
+    sem este filtro o frame inteiro seria remontado só para trocá-las por
+    cópias iguais. `pedidos` é o índice de `order_id` do frame.
+    """
+    if delta.empty:
+        return delta
+    posicoes = pedidos.get_indexer(delta["order_id"])
+    conhecidas = posicoes >= 0
+    iguais = np.zeros(len(delta), dtype=bool)
+    if conhecidas.any():
+        antes = frame["updated_at"].iloc[posicoes[conhecidas]].reset_index(drop=True)
+        depois = delta["updated_at"][conhecidas].reset_index(drop=True)
+        iguais[conhecidas] = (antes == depois).to_numpy()
+    return delta[~iguais]
+
+
+def mesclar_delta(frame: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Substitui no frame as linhas cujo `order_id` veio no delta e acrescenta as novas."""
+    if delta.empty:
+        return frame
+    manter = ~np.isin(frame["order_id"].to_numpy(), delta["order_id"].to_numpy())
+    return concatenar([frame[manter], delta])
+
+
+@dataclass
+class SnapshotVendas:
+    """
+    Frame de vendas somente-leitura, as versões que ele reflete, a marca
+    d'água de `updated_at`, a marca do cadastro de custos usada e quando foi
+    atualizado pela última vez.
+    """
+    frame: pd.DataFrame
+    versoes: Dict[int, int] = field(default_factory=dict)
+    watermark: Optional[pd.Timestamp] = None
+    carregado_em: float = field(default_factory=time.time)
+    marca_custos: Optional[Marca] = None
+    _indice: Optional[IndiceFiltros] = field(default=None, init=False, repr=False, compare=False)
+    _indice_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+    _pedidos: Optional[pd.Index] = field(default=None, init=False, repr=False, compare=False)
+
+    def vendas(
+        self,
+        conta_id: Optional[str] = None,
+        colunas: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Devolve uma visão do snapshot, opcionalmente restrita a uma conta e a
+        um subconjunto de colunas. Sem filtro de linhas a visão não copia
+        nenhum dado; alterações feitas nela não afetam o snapshot.
+        """
+        df = self.frame
+        if colunas is not None:
+            df = df[list(colunas)]
+        if conta_id:
+            df = df[self.frame["ml_user_id"].to_numpy() == int(conta_id)]
+        return df.copy(deep=False)
+
+    def indice(self) -> IndiceFiltros:
+        """Índice de filtros do frame, montado no primeiro uso e reaproveitado até o próximo snapshot."""
+        with self._indice_lock:
+            if self._indice is None:
+                self._indice = IndiceFiltros(self.frame)
+        return self._indice
+
+    def renovado(self, versoes: Dict[int, int], watermark: Optional[pd.Timestamp]) -> "SnapshotVendas":
+        """Mesmo frame com versões e marca d'água novas; reaproveita os índices já montados."""
+        novo = SnapshotVendas(self.frame, versoes, watermark, marca_custos=self.marca_custos)
+        with self._indice_lock:
+            novo._indice = self._indice
+        novo._pedidos = self._pedidos
+        return novo
+
+    def pedidos(self) -> pd.Index:
+        """Índice de `order_id` -> posição no frame, montado uma vez por frame."""
+        if self._pedidos is None:
+            self._pedidos = pd.Index(self.frame["order_id"].to_numpy())
+        return self._pedidos
+
+    @property
+    def idade(self) -> float:
+        """Segundos desde a última atualização."""
+        return time.time() - self.carregado_em
+
+
+def montar_snapshot(versoes: Dict[int, int]) -> SnapshotVendas:
+    """Lê todas as vendas do banco; `versoes` devem ter sido lidas antes da consulta."""
+    marca, custos = custos_vigentes()
+    frame = ler_vendas(custos=custos)
+    return SnapshotVendas(frame, versoes, _watermark(frame), marca_custos=marca)
+
+
+def gravar_snapshot(snapshot: SnapshotVendas) -> None:
+    """Grava o snapshot no cache persistente."""
+    cache = obter_cache()
+    # O frame vai antes dos metadados: quem ler os metadados novos já encontra o frame novo
+    cache.salvar(CHAVE_CACHE, snapshot.frame)
+    cache.salvar(CHAVE_CACHE + ":meta", {
+        "versoes": snapshot.versoes,
+        "watermark": snapshot.watermark,
+        "carregado_em": snapshot.carregado_em,
+        "marca_custos": snapshot.marca_custos,
+    })
+
+
+class GerenciadorSnapshot:
+    """
+    Mantém o snapshot do processo alinhado às versões de dados publicadas,
+    no modelo stale-while-revalidate: quem pede o snapshot recebe na hora o
+    último carregado com sucesso, e a atualização roda numa thread à parte.
+    Só a primeira carga do processo, sem nada para servir, bloqueia.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._atual: Optional[SnapshotVendas] = None
+        self._persistido_em = 0.0
+        self._revalidacao: Optional[threading.Thread] = None
+        self._tentativa_em = 0.0
+        self.ultimo_erro: Optional[str] = None
+
+    def obter(self, aguardar: bool = False) -> SnapshotVendas:
+        """
+        Devolve o snapshot atual e, se ele estiver desatualizado, dispara a
+        revalidação em segundo plano. Com `aguardar=True` espera a
+        revalidação terminar e devolve o resultado dela.
+        """
+        versoes = registro_versoes().versoes()
+        with self._lock:
+            if self._atual is None:
+                self._atual = self._carregar_inicial(versoes)
+                self._persistir(self._atual)
+
+            atual = self._atual
+            desatualizado = contas_alteradas(atual.versoes, versoes) or atual.idade >= DELTA_INTERVALO
+            em_andamento = self._revalidacao is not None and self._revalidacao.is_alive()
+            if desatualizado and not em_andamento and (aguardar or time.time() - self._tentativa_em >= DELTA_INTERVALO):
+                self._tentativa_em = time.time()
+                self._revalidacao = threading.Thread(
+                    target=self._revalidar, args=(versoes,), name="snapshot-revalidate", daemon=True
+                )
+                self._revalidacao.start()
+            revalidacao = self._revalidacao
+
+        if aguardar and revalidacao is not None:
+            revalidacao.join()
+            return self._atual
+        return atual
+
+    @property
+    def atual(self) -> Optional[SnapshotVendas]:
+        return self._atual
+
+    @property
+    def atualizando(self) -> bool:
+        return self._revalidacao is not None and self._revalidacao.is_alive()
+
+    def _revalidar(self, versoes: Dict[int, int]) -> None:
+        atual = self._atual
+        try:
+            novo = self._atualizar(atual, versoes, contas_alteradas(atual.versoes, versoes))
+        except Exception as e:
+            # Mantém o último snapshot bom; nova tentativa após DELTA_INTERVALO
+            self.ultimo_erro = str(e)
+            print(f"⚠️ Falha ao revalidar snapshot de vendas: {e}")
+            return
+        self.ultimo_erro = None
+        if novo.frame is not atual.frame:
+            # Frame novo: o índice de filtros é montado aqui, fora da thread de quem pede a página
+            try:
+                novo.indice()
+            except Exception as e:
+                print(f"⚠️ Falha ao montar índice de filtros: {e}")
+        with self._lock:
+            self._atual = novo
+        if novo.frame is not atual.frame:
+            self._persistir(novo)
+
+    def _carregar_inicial(self, versoes: Dict[int, int]) -> SnapshotVendas:
+        cache = obter_cache()
+        meta = cache.carregar(CHAVE_CACHE + ":meta")
+        frame = cache.carregar(CHAVE_CACHE) if meta is not None else None
+        if frame is not None:
+            # Serve a cópia gravada como está; a revalidação busca o delta
+            print(f"♻️ Snapshot restaurado do cache persistente ({len(frame)} linhas, watermark {meta['watermark']})")
+            return SnapshotVendas(
+                frame, meta["versoes"], meta["watermark"], meta["carregado_em"], meta.get("marca_custos")
+            )
+
+        return montar_snapshot(versoes)
+
+    def _atualizar(self, atual: SnapshotVendas, versoes: Dict[int, int], mudaram: List[int]) -> SnapshotVendas:
+        if atual.watermark is None:
+            return montar_snapshot(versoes)
+
+        marca, custos = custos_vigentes()
+        frame = atual.frame
+        if marca != atual.marca_custos:
+            # Cadastro de SKU mudou: resolve o custo de todas as vendas de novo
+            print("🏷️ Cadastro de SKU alterado; recalculando custos do snapshot")
+            frame = resolver_custos(frame, custos)
+
+        delta = ler_vendas(desde=atual.watermark - MARGEM_WATERMARK, custos=custos)
+        # resolver_custos preserva a ordem das linhas: as posições de atual.pedidos() valem para `frame`
+        alteradas = novas_ou_alteradas(frame, delta, atual.pedidos())
+        frame = mesclar_delta(frame, alteradas)
+
+        # Exclusões não aparecem no delta: se a contagem de uma conta que mudou
+        # de versão não bate com a do banco, relê essa conta inteira
+        if mudaram:
+            no_banco = contar_vendas(mudaram)
+            locais = frame["ml_user_id"].value_counts()
+            divergentes = [uid for uid in mudaram if no_banco.get(uid, 0) != locais.get(uid, 0)]
+            if divergentes:
+                print(f"🔁 Recarregando vendas das contas {divergentes}")
+                manter = ~frame["ml_user_id"].isin(divergentes).to_numpy()
+                frame = concatenar([frame[manter], ler_vendas(divergentes, custos=custos)])
+
+        candidatos = [w for w in (atual.watermark, _watermark(delta)) if w is not None]
+        if frame is atual.frame:
+            # Nada mudou: mantém o frame e os índices, só renova versões e idade
+            return atual.renovado(versoes, max(candidatos))
+        if not alteradas.empty:
+            print(f"🔄 Delta de vendas aplicado: {len(alteradas)} linhas desde {atual.watermark}")
+        return SnapshotVendas(frame, versoes, max(candidatos), marca_custos=marca)
+
+    def _persistir(self, snapshot: SnapshotVendas) -> None:
+        """Grava o snapshot no cache persistente em segundo plano, no máximo a cada PERSISTIR_INTERVALO."""
+        if time.time() - self._persistido_em < PERSISTIR_INTERVALO:
+            return
+        self._persistido_em = time.time()
+        threading.Thread(target=gravar_snapshot, args=(snapshot,), name="snapshot-persist", daemon=True).start()
+
+
+@st.cache_resource
+def _gerenciador() -> GerenciadorSnapshot:
+    return GerenciadorSnapshot()
+
+
+def obter_snapshot(aguardar: bool = False) -> SnapshotVendas:
+    """Snapshot único por processo, compartilhado entre sessões sem cópia."""
+    return _gerenciador().obter(aguardar)
+
+
+def estado_snapshot() -> Dict[str, object]:
+    """Idade do snapshot servido e se há revalidação em andamento, para exibir na UI."""
+    gerenciador = _gerenciador()
+    atual = gerenciador.atual
+    return {
+        "idade": atual.idade if atual is not None else None,
+        "atualizando": gerenciador.atualizando,
+        "erro": gerenciador.ultimo_erro,
+    }
@@ -1,8 +1,14 @@
 #!/bin/bash
 
+# Aplica as migrações pendentes do schema antes de subir os serviços
+python migrations.py || exit 1
+
 # Inicia FastAPI na porta 8501 (em segundo plano)
 uvicorn api:app --host 0.0.0.0 --port 8501 &
 
+# Aquece o cache persistente (snapshot de vendas, SKUs, contas) antes do primeiro acesso
+python prewarm.py
+
 # Inicia Streamlit na porta 8000 (será a pública)
 streamlit run app.py --server.port 8000 --server.address=0.0.0.0 --server.enableXsrfProtection false
 
@@ -0,0 +1,85 @@
+import pandas as pd
+
+from cadastro_sku import _numero, alteracoes, salvar_skus
+
+
+def _grade(*linhas):
+    return pd.DataFrame(linhas, columns=["seller_sku", "level1", "level2", "custo_unitario", "quantity_sku"])
+
+
+def test_numero_formatos_da_planilha():
+    serie = pd.Series(["1.234,56", "1.234", "", "12.5", " 3,5 ", "abc", None])
+    resultado = _numero(serie)
+    assert resultado[[0, 1, 3, 4]].tolist() == [1234.56, 1234, 12.5, 3.5]
+    assert resultado[[2, 5, 6]].isna().all()
+
+
+def test_numero_mantem_valores_numericos():
+    assert _numero(pd.Series([7.25, 10])).tolist() == [7.25, 10]
+
+
+def test_alteracoes_so_novos_e_diferentes():
+    original = _grade(
+        ("A", "Casa", "Mesa", 10.0, 1),
+        ("B", "Casa", None, 5.0, None),
+        ("C", "Casa", "Mesa", 1.0, 1),
+    )
+    editado = _grade(
+        ("A", "Casa", "Mesa", 10.001, 1),   # mesmo custo em NUMERIC(10, 2)
+        ("B", "Casa", None, 5.0, None),     # nulos iguais entre si
+        ("C", "Casa", "Cozinha", 1.0, 1),   # level2 alterado
+        ("D", None, None, 2.0, 3),          # SKU novo
+    )
+    assert alteracoes(original, editado)["seller_sku"].tolist() == ["C", "D"]
+
+
+def test_alteracoes_ignora_sku_vazio():
+    editado = _grade(("", "Casa", "Mesa", 1.0, 1), ("  ", None, None, None, None))
+    assert alteracoes(_grade(), editado).empty
+
+
+class _Resultado(list):
+    def fetchall(self):
+        return list(self)
+
+
+class _Conexao:
+    """Registra os comandos; o UPDATE devolve como corrigidos os SKUs em `corrigiveis`."""
+
+    def __init__(self, corrigiveis=()):
+        self.corrigiveis = set(corrigiveis)
+        self.comandos = []
+
+    def execute(self, sql, params):
+        sql = str(sql)
+        self.comandos.append((sql, params))
+        if sql.lstrip().startswith("UPDATE"):
+            return _Resultado((s,) for s in params["skus"] if s in self.corrigiveis)
+        if "FROM sales" in sql:
+            return _Resultado([(42,)])
+        return _Resultado()
+
+
+def test_salvar_skus_insere_versao_nova_dos_nao_corrigidos():
+    conn = _Conexao(corrigiveis={"A"})
+    contas = salvar_skus(conn, _grade(("A", "Casa", "Mesa", 10.0, 1), ("B", "Casa", "Mesa", 2.0, 2)))
+
+    (update, p_update), (insert, p_insert), _ = conn.comandos
+    assert update.lstrip().startswith("UPDATE") and insert.lstrip().startswith("INSERT")
+    assert p_update["corrigir"] is False
+    assert p_insert["corrigidos"] == ["A"]
+    assert p_insert["quantidade"] == [1, 2]
+    assert contas == {42}
+
+
+def test_salvar_skus_repassa_corrigir():
+    conn = _Conexao(corrigiveis={"A"})
+    salvar_skus(conn, _grade(("A", "Casa", "Mesa", 10.0, None)), corrigir=True)
+    assert conn.comandos[0][1]["corrigir"] is True
+    assert conn.comandos[0][1]["quantidade"] == [None]
+
+
+def test_salvar_skus_vazio_nao_executa_nada():
+    conn = _Conexao()
+    assert salvar_skus(conn, _grade()) == set()
+    assert conn.comandos == []
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from custos import _DESDE_SEMPRE, resolver_custos
+from schema import aplicar_schema
+
+
+def _custos(*versoes):
+    """Versões do cadastro no formato de `ler_custos`."""
+    df = pd.DataFrame(
+        versoes,
+        columns=["seller_sku", "valido_desde", "custo_unitario", "quantity_sku", "level1", "level2"],
+    )
+    df = aplicar_schema(df)
+    df["seller_sku"] = df["seller_sku"].astype(str)
+    df["valido_desde"] = pd.to_datetime(df["valido_desde"]).astype("datetime64[ns]").fillna(_DESDE_SEMPRE)
+    return df.sort_values("valido_desde", kind="stable").reset_index(drop=True)
+
+
+def _vendas(*linhas):
+    return pd.DataFrame(linhas, columns=["seller_sku", "date_adjusted"]).astype(
+        {"date_adjusted": "datetime64[ns]"}
+    )
+
+
+CUSTOS = _custos(
+    ("A", None, 10.0, 1, "Casa", "Cozinha"),
+    ("A", "2024-03-01", 12.5, 2, "Casa", "Mesa"),
+)
+
+
+def test_primeira_versao_vale_desde_sempre():
+    vendas = _vendas(("A", "2020-01-01"), ("A", "2024-02-29 23:59"), ("A", "2024-03-01"))
+    resolvido = resolver_custos(vendas, CUSTOS)
+    assert resolvido["custo_unitario"].tolist() == [10.0, 10.0, 12.5]
+    assert resolvido["quantity_sku"].tolist() == [1, 1, 2]
+    assert resolvido["level2"].tolist() == ["Cozinha", "Cozinha", "Mesa"]
+
+
+def test_sku_sem_versao_fica_nulo():
+    resolvido = resolver_custos(_vendas(("B", "2024-05-01"), ("A", "2024-05-01")), CUSTOS)
+    assert np.isnan(resolvido["custo_unitario"].iloc[0])
+    assert resolvido["custo_unitario"].iloc[1] == 12.5
+    assert pd.isna(resolvido["quantity_sku"].iloc[0])
+    assert pd.isna(resolvido["level1"].iloc[0])
+
+
+def test_venda_sem_data_ou_sem_sku_fica_nula():
+    resolvido = resolver_custos(_vendas(("A", None), (None, "2024-05-01"), ("A", "2024-05-01")), CUSTOS)
+    assert resolvido["custo_unitario"].isna().tolist() == [True, True, False]
+    assert resolvido["level1"].isna().tolist() == [True, True, False]
+
+
+def test_mantem_indice_e_tipos_do_cadastro():
+    vendas = _vendas(("A", "2024-05-01"), ("A", "2020-01-01"))
+    vendas.index = [7, 3]
+    resolvido = resolver_custos(vendas, CUSTOS)
+    assert resolvido.index.tolist() == [7, 3]
+    assert resolvido["custo_unitario"].tolist() == [12.5, 10.0]
+    for coluna in ("custo_unitario", "quantity_sku", "level1", "level2"):
+        assert resolvido[coluna].dtype == CUSTOS[coluna].dtype
@@ -0,0 +1,125 @@
+# titulos.py
+"""
+Análise de palavras dos títulos dos anúncios.
+
+O mesmo título se repete em milhares de pedidos do mesmo anúncio, então o
+trabalho é feito por título único, nunca por pedido:
+
+1. o faturamento é somado por título (um groupby);
+2. cada título é tokenizado uma única vez por processo (cache por título,
+   com vocabulário compartilhado);
+3. os títulos viram uma matriz esparsa títulos × palavras (CSR, contagem de
+   cada palavra no título);
+4. o faturamento por palavra é um único produto matriz-vetor
+   `matriz.T @ faturamento_por_titulo`.
+"""
+import threading
+from typing import TYPE_CHECKING, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+
+class VocabularioTitulos:
+    """Tokens de cada título já visto e o vocabulário (palavra -> coluna da matriz)."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.palavras: List[str] = []
+        self._tokens: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _tokenizar(self, titulo: str) -> np.ndarray:
+        ids = []
+        for palavra in titulo.lower().split():
+            i = self._ids.get(palavra)
+            if i is None:
+                i = self._ids[palavra] = len(self.palavras)
+                self.palavras.append(palavra)
+            ids.append(i)
+        return np.array(ids, dtype="int32")
+
+    def tokens(self, titulos: Sequence[str]) -> List[np.ndarray]:
+        """Ids das palavras de cada título (títulos novos são tokenizados e guardados)."""
+        with self._lock:
+            resultado = []
+            for titulo in titulos:
+                ids = self._tokens.get(titulo)
+                if ids is None:
+                    ids = self._tokens[titulo] = self._tokenizar(titulo)
+                resultado.append(ids)
+            return resultado
+
+    def matriz(self, titulos: Sequence[str]) -> "sparse.csr_matrix":
+        """Matriz esparsa (títulos × vocabulário) com a contagem de cada palavra."""
+        from scipy import sparse
+
+        tokens = self.tokens(titulos)
+        indptr = np.zeros(len(tokens) + 1, dtype="int64")
+        np.cumsum([len(t) for t in tokens], out=indptr[1:])
+        indices = np.concatenate(tokens) if tokens else np.empty(0, dtype="int32")
+        dados = np.ones(len(indices), dtype="float64")
+        return sparse.csr_matrix((dados, indices, indptr), shape=(len(tokens), len(self.palavras)))
+
+
+_vocabulario = VocabularioTitulos()
+
+
+def _faturamento_por_titulo(df: pd.DataFrame, coluna_titulo: str, coluna_valor: str) -> pd.Series:
+    titulos = df[coluna_titulo].dropna().astype(str)
+    return df.loc[titulos.index, coluna_valor].groupby(titulos, observed=True).sum()
+
+
+def faturamento_por_palavra(
+    df: pd.DataFrame,
+    coluna_titulo: str = "item_title",
+    coluna_valor: str = "total_amount",
+    top: int = 15,
+) -> pd.DataFrame:
+    """As `top` palavras de título com maior faturamento (uma palavra repetida no título conta em dobro)."""
+    por_titulo = _faturamento_por_titulo(df, coluna_titulo, coluna_valor)
+    if por_titulo.empty:
+        return pd.DataFrame(columns=["palavra", "faturamento"])
+
+    matriz = _vocabulario.matriz(por_titulo.index.tolist())
+    por_palavra = matriz.T @ np.nan_to_num(por_titulo.to_numpy(dtype="float64"))
+
+    top = min(top, int(np.count_nonzero(por_palavra)))
+    melhores = np.argpartition(-por_palavra, top - 1)[:top] if top else np.empty(0, dtype="int64")
+    melhores = melhores[np.argsort(-por_palavra[melhores], kind="stable")]
+    palavras = _vocabulario.palavras
+    return pd.DataFrame({
+        "palavra": [palavras[i] for i in melhores],
+        "faturamento": por_palavra[melhores],
+    })
+
+
+def frequencia_palavras(df: pd.DataFrame, coluna_titulo: str = "item_title") -> Dict[str, float]:
+    """Quantas vezes cada palavra aparece nos títulos de `df` (uma ocorrência por pedido)."""
+    titulos = df[coluna_titulo].dropna().astype(str)
+    pedidos = titulos.groupby(titulos, observed=True).size()
+    if pedidos.empty:
+        return {}
+    por_palavra = _vocabulario.matriz(pedidos.index.tolist()).T @ pedidos.to_numpy(dtype="float64")
+    presentes = np.flatnonzero(por_palavra)
+    palavras = _vocabulario.palavras
+    return {palavras[i]: float(por_palavra[i]) for i in presentes}
+
+
+def faturamento_por_comprimento(
+    df: pd.DataFrame,
+    coluna_titulo: str = "item_title",
+    coluna_valor: str = "total_amount",
+) -> pd.DataFrame:
+    """Faturamento somado por número de palavras do título."""
+    por_titulo = _faturamento_por_titulo(df, coluna_titulo, coluna_valor)
+    comprimentos = np.array([len(t) for t in _vocabulario.tokens(por_titulo.index.tolist())], dtype="int64")
+    return (
+        por_titulo.groupby(comprimentos).sum()
+        .rename_axis("title_len")
+        .reset_index(name=coluna_valor)
+        .sort_values("title_len")
+    )
@@ -1,21 +1,6 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from datetime import datetime
 import requests
 
-# Carregar variáveis de ambiente
-load_dotenv()
-DB_URL = os.getenv("DB_URL")
-
-# Criar engine do banco de dados com parâmetros personalizados
-engine = create_engine(
-    DB_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30
-)
-
 # Data de corte para busca de vendas ou taxas
 DATA_INICIO = datetime(2024, 5, 16)
 
@@ -0,0 +1,151 @@
+# versions.py
+"""
+Versão de dados por conta, publicada via Postgres LISTEN/NOTIFY.
+
+Toda ingestão que altera vendas incrementa a versão da conta em
+`data_versions` e emite um NOTIFY no canal `sales_changed`. Cada processo
+mantém um registro em memória dessas versões, atualizado por uma thread
+que escuta o canal. Os caches usam as versões das contas de que dependem
+como chave e só são recalculados quando alguma delas muda.
+"""
+import json
+import select
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+from db import get_engine
+from settings import get_settings
+
+CANAL = "sales_changed"
+HEARTBEAT = 60      # segundos sem notificação antes de testar a conexão
+RECONEXAO = 5       # espera antes de reconectar o listener
+
+
+def incrementar_versao(conn, ml_user_id: Optional[int] = None) -> Dict[int, int]:
+    """
+    Incrementa a versão de uma conta (ou de todas, se `ml_user_id` for None)
+    na transação de `conn` e agenda o NOTIFY, entregue no commit.
+    Retorna as novas versões.
+    """
+    if ml_user_id is None:
+        conn.execute(text("""
+            INSERT INTO data_versions (ml_user_id, version, updated_at)
+            SELECT ml_user_id, 0, NOW() FROM user_tokens
+            ON CONFLICT (ml_user_id) DO NOTHING
+        """))
+        rows = conn.execute(text("""
+            UPDATE data_versions
+               SET version = version + 1, updated_at = NOW()
+            RETURNING ml_user_id, version
+        """)).fetchall()
+    else:
+        rows = conn.execute(text("""
+            INSERT INTO data_versions (ml_user_id, version, updated_at)
+            VALUES (:uid, 1, NOW())
+            ON CONFLICT (ml_user_id) DO UPDATE
+              SET version = data_versions.version + 1,
+                  updated_at = NOW()
+            RETURNING ml_user_id, version
+        """), {"uid": int(ml_user_id)}).fetchall()
+
+    versoes = {int(uid): int(v) for uid, v in rows}
+    conn.execute(
+        text("SELECT pg_notify(:canal, :payload)"),
+        {"canal": CANAL, "payload": json.dumps(versoes)},
+    )
+    return versoes
+
+
+def publicar_alteracao(ml_user_id: Optional[int] = None) -> Dict[int, int]:
+    """Incrementa a versão em uma transação própria."""
+    with get_engine().begin() as conn:
+        versoes = incrementar_versao(conn, ml_user_id)
+    print(f"🔖 Versão de dados publicada: {versoes}")
+    return versoes
+
+
+class RegistroVersoes:
+    """Versões conhecidas pelo processo, mantidas em dia pelo listener."""
+
+    def __init__(self):
+        self._versoes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def recarregar(self) -> None:
+        """Relê todas as versões do banco (cobre notificações perdidas)."""
+        with get_engine().connect() as conn:
+            rows = conn.execute(text("SELECT ml_user_id, version FROM data_versions")).fetchall()
+        with self._lock:
+            self._versoes = {int(uid): int(v) for uid, v in rows}
+
+    def aplicar(self, versoes: Dict[int, int]) -> None:
+        with self._lock:
+            for uid, v in versoes.items():
+                if v > self._versoes.get(uid, -1):
+                    self._versoes[uid] = v
+
+    def versoes(self, contas: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        with self._lock:
+            if contas is None:
+                return dict(self._versoes)
+            return {int(uid): self._versoes.get(int(uid), 0) for uid in contas}
+
+    def chave(self, contas: Optional[Iterable[int]] = None) -> Tuple[Tuple[int, int], ...]:
+        """Chave de cache hashable com as versões das contas informadas."""
+        return tuple(sorted(self.versoes(contas).items()))
+
+    def iniciar_listener(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._escutar, name="versions-listener", daemon=True)
+        self._thread.start()
+
+    def _escutar(self) -> None:
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(get_settings().db_url)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CANAL}")
+                self.recarregar()
+                print(f"👂 Escutando '{CANAL}'")
+
+                while True:
+                    if not select.select([conn], [], [], HEARTBEAT)[0]:
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notificacao = conn.notifies.pop(0)
+                        payload = json.loads(notificacao.payload)
+                        self.aplicar({int(uid): int(v) for uid, v in payload.items()})
+            except Exception as e:
+                print(f"⚠️ Listener de versões caiu: {e}. Reconectando em {RECONEXAO}s...")
+                time.sleep(RECONEXAO)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+_registro: Optional[RegistroVersoes] = None
+_registro_lock = threading.Lock()
+
+
+def registro_versoes() -> RegistroVersoes:
+    """Registro único do processo; carrega as versões e inicia o listener no primeiro uso."""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroVersoes()
+            _registro.recarregar()
+            _registro.iniciar_listener()
+    return _registro